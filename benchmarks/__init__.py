@@ -0,0 +1,4 @@
+"""
+Benchmarks for the Star Wars REST API.
+Run them from the project root, e.g. `python -m benchmarks.bench_renderers`.
+"""
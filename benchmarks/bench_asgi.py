@@ -0,0 +1,95 @@
+"""
+Load test of the WSGI deployment (gunicorn sync workers, sync views) against the ASGI one
+(uvicorn workers, ASYNC_VIEWS=1), with the same number of worker processes. Concurrent
+clients GET the list, retrieve and search endpoints while `--slow` clients trickle their
+request headers, holding a connection (and a gunicorn worker) for `--slow-seconds`.
+Every request has a unique query string, so that it misses the cache middleware.
+
+Starts the servers on 127.0.0.1:8101 and 8102 with the environment of the benchmark.
+
+Usage: python -m benchmarks.bench_asgi [--workers 2] [--clients 50] [--requests 2000] [--slow 0]
+"""
+import argparse
+import asyncio
+import itertools
+import time
+
+from benchmarks.loadgen import HOST, get, running_server
+from benchmarks.utils import setup_django, percentile, print_row
+
+setup_django()
+
+from starwarsrest.models import Character  # noqa: E402
+
+SERVERS = {
+    'WSGI gunicorn sync': ('gunicorn', 8101, {'ASYNC_VIEWS': '0'}),
+    'ASGI uvicorn': ('uvicorn', 8102, {'ASYNC_VIEWS': '1'}),
+}
+
+
+async def slow_client(port, seconds, stop):
+    """Send the headers of a request one line at a time over `seconds`, until stopped"""
+    lines = [f'X-Slow-{i}: 1\r\n'.encode() for i in range(10)]
+    while not stop.is_set():
+        reader, writer = await asyncio.open_connection(HOST, port)
+        writer.write(b'GET /api/films/ HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n')
+        for line in lines:
+            await asyncio.sleep(seconds / len(lines))
+            writer.write(line)
+        writer.write(b'\r\n')
+        await writer.drain()
+        await reader.read()
+        writer.close()
+
+
+async def load(port, paths, clients, requests, slow, slow_seconds):
+    counter = itertools.count()
+    durations, errors = [], 0
+    stop = asyncio.Event()
+    slow_tasks = [asyncio.create_task(slow_client(port, slow_seconds, stop)) for _ in range(slow)]
+
+    async def client():
+        nonlocal errors
+        while (n := next(counter)) < requests:
+            path = paths[n % len(paths)]
+            separator = '&' if '?' in path else '?'
+            status, duration = await get(port, f'{path}{separator}_={n}')
+            if status != 200:
+                errors += 1
+            durations.append(duration)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*slow_tasks, return_exceptions=True)
+    return elapsed, durations, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--slow', type=int, default=0, help='number of slow clients')
+    parser.add_argument('--slow-seconds', type=float, default=2.0)
+    args = parser.parse_args()
+
+    character = Character.objects.order_by('id').first()
+    paths = ['/api/characters/', '/api/films/', '/api/starships/search/?name=star']
+    if character:
+        paths.append(f'/api/characters/{character.id}/')
+
+    print_row('deployment', 'requests/s', 'p50 ms', 'p95 ms', 'errors', widths=(24, 12, 10, 10, 8))
+    for name, (server, port, env) in SERVERS.items():
+        with running_server(server, port, args.workers, env):
+            # Warm up the workers and their database connections
+            asyncio.run(load(port, paths, args.clients, args.clients * 2, 0, 0))
+            elapsed, durations, errors = asyncio.run(
+                load(port, paths, args.clients, args.requests, args.slow, args.slow_seconds))
+        print_row(name, f'{len(durations) / elapsed:.0f}', f'{percentile(durations, 50) * 1000:.1f}',
+                  f'{percentile(durations, 95) * 1000:.1f}', errors, widths=(24, 12, 10, 10, 8))
+
+
+if __name__ == '__main__':
+    main()
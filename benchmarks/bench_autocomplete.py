@@ -0,0 +1,57 @@
+"""
+Autocomplete as the UI did it (the characters search endpoint, an icontains scan with the
+nested serialization) vs the /api/autocomplete/ endpoint vs the in-memory index lookup
+alone, for the prefixes typed letter by letter. Also times the index build.
+The search endpoint is not paginated, on a large database its short prefixes return
+most of the table.
+
+Usage: python -m benchmarks.bench_autocomplete [--iterations 20] [--word skywalker]
+"""
+import argparse
+import time
+
+from benchmarks.utils import setup_django, time_call, print_row
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+from django.test import override_settings  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+from starwarsrest.autocomplete import AutocompleteIndex, get_autocomplete_index  # noqa: E402
+
+CACHE_MIDDLEWARE = 'starwarsrest.cache_middleware.RedisCacheMiddleware'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--word', default='skywalker')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = AutocompleteIndex.from_database()
+    build = time.perf_counter() - start
+    get_autocomplete_index()
+    client = APIClient(SERVER_NAME='localhost')
+    prefixes = [args.word[:length] for length in range(1, len(args.word) + 1)]
+
+    def keystrokes(func):
+        return lambda: [func(prefix) for prefix in prefixes]
+
+    variants = [
+        ('characters search endpoint', keystrokes(lambda prefix: client.get(f'/api/characters/search/?name={prefix}'))),
+        ('autocomplete endpoint', keystrokes(lambda prefix: client.get(f'/api/autocomplete/?q={prefix}'))),
+        ('index lookup', keystrokes(lambda prefix: index.search(prefix))),
+    ]
+    # Without the response cache, which would serve the repeated requests
+    middleware = [m for m in settings.MIDDLEWARE if m != CACHE_MIDDLEWARE]
+    print_row('autocomplete', 'ms/keystroke')
+    with override_settings(MIDDLEWARE=middleware):
+        for name, func in variants:
+            elapsed = time_call(func, args.iterations) / args.iterations / len(prefixes)
+            print_row(name, f'{elapsed * 1000:.3f}')
+    print_row('index build', f'{build * 1000:.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Cache hit latency through the whole Django stack with RedisCacheMiddleware last in
+MIDDLEWARE (after sessions and authentication) and right after SecurityMiddleware,
+compared with a raw GET of the cached entry from the configured cache (Redis).
+
+Usage: python -m benchmarks.bench_cache_hits [--iterations 2000]
+"""
+import argparse
+
+from benchmarks.utils import setup_django, time_call, print_row
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.core.handlers.wsgi import WSGIHandler  # noqa: E402
+from django.test import RequestFactory, override_settings  # noqa: E402
+from starwarsrest.cache_middleware import RedisCacheMiddleware  # noqa: E402
+
+CACHE_MIDDLEWARE = 'starwarsrest.cache_middleware.RedisCacheMiddleware'
+PATHS = ('/api/films/', '/api/characters/?page=2')
+
+
+def start_response(status, headers):
+    start_response.headers = dict(headers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    others = [middleware for middleware in settings.MIDDLEWARE if middleware != CACHE_MIDDLEWARE]
+    layouts = {
+        'middleware last': others + [CACHE_MIDDLEWARE],
+        'middleware first': others[:2] + [CACHE_MIDDLEWARE] + others[2:],
+    }
+
+    factory = RequestFactory(SERVER_NAME='localhost')
+    print_row('path / layout', 'hits/s', 'us/hit')
+    for path in PATHS:
+        request = factory.get(path)
+        for name, middleware in layouts.items():
+            with override_settings(MIDDLEWARE=middleware):
+                handler = WSGIHandler()
+
+                def hit():
+                    # The WSGI environ is consumed by the request, copy it every time
+                    return b''.join(handler(dict(request.environ), start_response))
+
+                hit()
+                hit()
+                assert 'cache;desc="hit"' in start_response.headers['Server-Timing']
+                elapsed = time_call(hit, args.iterations)
+            print_row(f'{path} {name}', f'{args.iterations / elapsed:.0f}',
+                      f'{elapsed / args.iterations * 1e6:.0f}')
+
+        key = RedisCacheMiddleware(lambda request: None)._generate_cache_key(request)
+        elapsed = time_call(lambda: cache.get(key), args.iterations)
+        print_row(f'{path} raw cache.get', f'{args.iterations / elapsed:.0f}',
+                  f'{elapsed / args.iterations * 1e6:.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Per hit overhead of RedisCacheMiddleware.process_request: the previous version
+(f-string logger.info calls and a print() per request) against the current one
+(counters, sampled lazy DEBUG lines through the queue handler).
+
+Runs against an in-memory cache so that only the middleware itself is measured.
+The previous version prints to a line buffered /dev/null, one write per line as
+with PYTHONUNBUFFERED=1 in the Docker image, a real pipe is slower.
+
+Usage: python -m benchmarks.bench_cache_middleware [--iterations 100000]
+"""
+import argparse
+import contextlib
+import logging
+import os
+
+from benchmarks.utils import setup_django, time_call, print_row
+
+setup_django()
+
+from django.core.cache import cache  # noqa: E402
+from django.http import HttpResponse  # noqa: E402
+from django.test import RequestFactory, override_settings  # noqa: E402
+from starwarsrest.cache_middleware import RedisCacheMiddleware, logger  # noqa: E402
+from starwarsrest.metrics import CACHE_EVENTS  # noqa: E402
+
+
+class PreviousRedisCacheMiddleware(RedisCacheMiddleware):
+    """process_request as it was before the logging changes"""
+
+    def process_request(self, request):
+        if request.method != 'GET':
+            return None
+        if not (self.LIST_PATTERN.match(request.path) or self.RETRIEVE_PATTERN.match(request.path)):
+            return None
+        cache_key = self._generate_cache_key(request)
+        cached_response = cache.get(cache_key)
+        logger.info(f"Checking cache for key: {cache_key}")
+        if cached_response:
+            request._cache_status = 'hit'
+            CACHE_EVENTS.labels('hit').inc()
+            logger.info(f"Cache HIT for key: {cache_key}")
+            print(f"Cache HIT for key: {cache_key}")
+            return HttpResponse(
+                content=cached_response['content'],
+                status=cached_response['status'],
+                content_type=cached_response['content_type']
+            )
+        request._cache_status = 'miss'
+        CACHE_EVENTS.labels('miss').inc()
+        logger.info(f"Cache MISS for key: {cache_key}")
+        print(f"Cache MISS for key: {cache_key}")
+        request._cache_key = cache_key
+        return None
+
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=100000)
+    args = parser.parse_args()
+
+    factory = RequestFactory(SERVER_NAME='localhost')
+    request = factory.get('/api/starships/', {'fields': 'id,name', 'page': 2})
+
+    with override_settings(CACHES=LOCMEM_CACHE), open(os.devnull, 'w', buffering=1) as devnull:
+        variants = [
+            ('previous (f-strings + print)', PreviousRedisCacheMiddleware, logging.INFO),
+            ('current, INFO', RedisCacheMiddleware, logging.INFO),
+            ('current, DEBUG sampled', RedisCacheMiddleware, logging.DEBUG),
+        ]
+        print_row('middleware', 'hits/s', 'us/hit')
+        level = logger.level
+        for name, middleware_class, log_level in variants:
+            middleware = middleware_class(lambda request: None)
+            cache.set(middleware._generate_cache_key(request), {
+                'content': '{"results": []}', 'status': 200, 'content_type': 'application/json',
+            })
+            logger.setLevel(log_level)
+            with contextlib.redirect_stdout(devnull):
+                elapsed = time_call(lambda: middleware.process_request(request), args.iterations)
+            print_row(name, f'{args.iterations / elapsed:.0f}', f'{elapsed / args.iterations * 1e6:.2f}')
+        logger.setLevel(level)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+Following the changes with `--clients` open /api/changes/stream/ connections vs the same
+number of clients polling the character every `--interval` seconds, on one uvicorn
+worker. Updates a character `--writes` times, every two intervals, and reports the delay
+until every client saw the change, the CPU used by the server over that time and its
+memory with the clients connected.
+
+Starts the server on 127.0.0.1:8103 with the environment of the benchmark.
+
+Usage: python -m benchmarks.bench_change_stream [--clients 1000] [--writes 10] [--interval 1.0]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.loadgen import HOST, request, running_server
+from benchmarks.utils import setup_django, percentile, print_row
+
+setup_django()
+
+from asgiref.sync import sync_to_async  # noqa: E402
+from starwarsrest.models import Character  # noqa: E402
+
+PORT = 8103
+WIDTHS = (12, 10, 10, 10, 12, 12, 10, 10)
+
+
+def cpu_seconds(pid):
+    with open(f'/proc/{pid}/stat') as stat:
+        fields = stat.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def rss_mb(pid):
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+
+
+async def write(character, height):
+    character.height = height
+    await sync_to_async(character.save)(update_fields=['height'])
+
+
+async def stream_client(ready, seen, character_id):
+    """Keep a stream open, record when each update of the character arrives"""
+    reader, writer = await asyncio.open_connection(HOST, PORT)
+    writer.write(b'GET /api/changes/stream/?type=characters HTTP/1.1\r\nHost: localhost\r\n'
+                 b'Accept: text/event-stream\r\n\r\n')
+    await writer.drain()
+    await reader.readuntil(b': live')
+    ready.release()
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            if b'"id": %d,' % character_id in line:
+                seen.append(time.perf_counter())
+    finally:
+        writer.close()
+
+
+async def poll_client(interval, offset, seen, character_id, stop, errors):
+    """GET the character every interval from offset on, record when its height changed"""
+    path = f'/api/characters/{character_id}/?fields=id,height&_={offset}'
+    last = None
+    await asyncio.sleep(offset)
+    while not stop.is_set():
+        try:
+            result = await request(PORT, 'GET', path)
+        except OSError:
+            result = None
+        if result is None or result.status != 200:
+            errors.append(1)
+        elif result.body.rsplit(b'"height":', 1)[-1] != last:
+            if last is not None:
+                seen.append(time.perf_counter())
+            last = result.body.rsplit(b'"height":', 1)[-1]
+        await asyncio.sleep(interval)
+
+
+async def run(mode, clients, writes, interval, pid):
+    character = await sync_to_async(Character.objects.order_by('-id').first)()
+    seen = [[] for _ in range(clients)]
+    stop = asyncio.Event()
+    errors = []
+    ready = asyncio.Semaphore(0)
+    rss_before = rss_mb(pid)
+    if mode == 'stream':
+        tasks = [asyncio.create_task(stream_client(ready, seen[i], character.id)) for i in range(clients)]
+        for _ in range(clients):
+            await ready.acquire()
+    else:
+        tasks = [asyncio.create_task(poll_client(interval, interval * i / clients, seen[i], character.id, stop, errors))
+                 for i in range(clients)]
+        await asyncio.sleep(interval * 2)
+    rss = rss_mb(pid) - rss_before
+
+    start_cpu, start = cpu_seconds(pid), time.perf_counter()
+    written = []
+    for n in range(writes):
+        written.append(time.perf_counter())
+        await write(character, 1000 + n + int(start) % 1000 * 100)
+        await asyncio.sleep(interval * 2)
+    await asyncio.sleep(max(interval, 1.0) + 1)
+    cpu = (cpu_seconds(pid) - start_cpu) / (time.perf_counter() - start)
+    stop.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    # Delay of every client for every write: first time it saw a change after the write
+    delays, missed = [], 0
+    for times in seen:
+        for n, at in enumerate(written):
+            following = [t for t in times if t >= at and (n + 1 == len(written) or t < written[n + 1])]
+            if following:
+                delays.append(following[0] - at)
+            else:
+                missed += 1
+    return delays, missed, len(errors), cpu, rss
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--writes', type=int, default=10)
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between two polls of a client')
+    args = parser.parse_args()
+
+    print_row('mode', 'clients', 'p50 ms', 'p95 ms', 'server CPU', 'clients MB', 'missed', 'errors', widths=WIDTHS)
+    for mode in ('stream', 'poll'):
+        with running_server('uvicorn', PORT, 1, {'DB_CONN_MAX_AGE': '0'}) as process:
+            delays, missed, errors, cpu, rss = asyncio.run(run(mode, args.clients, args.writes, args.interval, process.pid))
+        print_row(mode, args.clients,
+                  f'{percentile(delays, 50) * 1000:.0f}' if delays else '-',
+                  f'{percentile(delays, 95) * 1000:.0f}' if delays else '-',
+                  f'{cpu * 100:.0f}%', f'{rss:.0f}', missed, errors, widths=WIDTHS)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Catching up a client copy of the data after some writes: a full re-download (the NDJSON
+exports of the three tables) vs following /api/changes/ from the cursor of the previous
+sync. Updates --changes random characters and relates some of them to a film first,
+these writes are committed. Run it on a large database, e.g. after
+generate_synthetic_data.
+
+Usage: python -m benchmarks.bench_changes [--changes 1000] [--limit 1000] [--skip-full]
+"""
+import argparse
+import random
+import time
+
+from benchmarks.utils import setup_django, print_row
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+from django.db import transaction  # noqa: E402
+from django.test import override_settings  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+from starwarsrest.models import Character, Film  # noqa: E402
+
+CACHE_MIDDLEWARE = 'starwarsrest.cache_middleware.RedisCacheMiddleware'
+
+
+def write(count):
+    """Update count random characters, a tenth of them through a new film relation"""
+    last_id = Character.objects.order_by('-id').values_list('id', flat=True).first()
+    film = Film.objects.order_by('id').first()
+    ids = random.sample(range(1, last_id + 1), count)
+    with transaction.atomic():
+        Character.objects.filter(id__in=ids[count // 10:]).update(height=random.randint(100, 250))
+        film.characters.add(*Character.objects.filter(id__in=ids[:count // 10]))
+
+
+def full_download(client):
+    """Bytes of the exports of the three tables"""
+    size = 0
+    for name in ('films', 'characters', 'starships'):
+        response = client.get(f'/api/{name}/export/')
+        size += sum(len(chunk) for chunk in response.streaming_content)
+    return size
+
+
+def sync(client, cursor, limit):
+    """(changes, bytes, requests) of following the feed from cursor to its end"""
+    changes = size = requests = 0
+    while True:
+        response = client.get('/api/changes/', {'since': cursor, 'limit': limit})
+        data = response.json()
+        changes += len(data['changes'])
+        size += len(response.content)
+        requests += 1
+        cursor = data['cursor']
+        if not data['has_more']:
+            return changes, size, requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--changes', type=int, default=1000)
+    parser.add_argument('--limit', type=int, default=1000)
+    parser.add_argument('--skip-full', action='store_true', help='Skip the full re-download, slow on large tables')
+    args = parser.parse_args()
+
+    client = APIClient(SERVER_NAME='localhost')
+    middleware = [m for m in settings.MIDDLEWARE if m != CACHE_MIDDLEWARE]
+    with override_settings(MIDDLEWARE=middleware):
+        cursor = client.get('/api/changes/').json()['cursor']
+        start = time.perf_counter()
+        write(args.changes)
+        write_time = time.perf_counter() - start
+
+        print_row('catch up', 'ms', 'MB', 'requests', 'changes', widths=(30, 12, 12, 10, 10))
+        if not args.skip_full:
+            start = time.perf_counter()
+            size = full_download(client)
+            elapsed = time.perf_counter() - start
+            print_row('full re-download', f'{elapsed * 1000:.0f}', f'{size / 1e6:.2f}', 3, '',
+                      widths=(30, 12, 12, 10, 10))
+        start = time.perf_counter()
+        changes, size, requests = sync(client, cursor, args.limit)
+        elapsed = time.perf_counter() - start
+        print_row('changes feed', f'{elapsed * 1000:.0f}', f'{size / 1e6:.2f}', requests, changes,
+                  widths=(30, 12, 12, 10, 10))
+    print_row(f'writes of {args.changes} rows, ms', f'{write_time * 1000:.0f}', widths=(30, 12))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Sorting and filtering on relation sizes with annotate(Count()) over the through tables
+vs the indexed counter columns kept by the triggers, plus the cost of the triggers on
+the writes to the through tables. Run it on a large database, e.g. after
+generate_synthetic_data.
+
+Usage: python -m benchmarks.bench_counters [--iterations 5]
+"""
+import argparse
+
+from benchmarks.utils import setup_django, time_call, print_row
+
+setup_django()
+
+from django.db import connection, transaction  # noqa: E402
+from django.db.models import Count  # noqa: E402
+from starwarsrest.models import Character, Film, Starship  # noqa: E402
+
+THROUGH_TABLES = [Character.films.through, Starship.films.through, Starship.pilots.through]
+
+
+class Rollback(Exception):
+    pass
+
+
+def queries():
+    """(name, annotate(Count()) query, counter column query), both lists of ids"""
+    return [
+        ('top 20 characters by films',
+         lambda: list(Character.objects.annotate(n=Count('films')).order_by('-n', 'id').values_list('id')[:20]),
+         lambda: list(Character.objects.order_by('-film_count', 'id').values_list('id')[:20])),
+        ('top 20 characters by starships',
+         lambda: list(Character.objects.annotate(n=Count('starships')).order_by('-n', 'id').values_list('id')[:20]),
+         lambda: list(Character.objects.order_by('-starship_count', 'id').values_list('id')[:20])),
+        ('starships with 3+ pilots, first 20',
+         lambda: list(Starship.objects.annotate(n=Count('pilots')).filter(n__gte=3).order_by('id')
+                      .values_list('id')[:20]),
+         lambda: list(Starship.objects.filter(pilot_count__gte=3).order_by('id').values_list('id')[:20])),
+        ('films by characters',
+         lambda: list(Film.objects.annotate(n=Count('characters')).order_by('-n', 'id').values_list('id')),
+         lambda: list(Film.objects.order_by('-character_count', 'id').values_list('id'))),
+    ]
+
+
+def relate(count, triggers):
+    """Insert count film rows of characters in one statement, rolled back"""
+    table = Character.films.through._meta.db_table
+    character_ids = list(Character.objects.order_by('id').values_list('id', flat=True)[:count])
+    film_ids = list(Film.objects.order_by('-id').values_list('id', flat=True)[:1])
+    try:
+        with transaction.atomic():
+            if not triggers:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'ALTER TABLE {table} DISABLE TRIGGER {table}_count_insert')
+            Character.films.through.objects.bulk_create(
+                [Character.films.through(character_id=character_id, film_id=film_ids[0])
+                 for character_id in character_ids],
+                ignore_conflicts=True,
+            )
+            raise Rollback
+    except Rollback:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=5)
+    args = parser.parse_args()
+
+    print_row('query', 'count ms', 'column ms', 'same', widths=(40, 12, 12, 10))
+    for name, count_query, column_query in queries():
+        same = count_query() == column_query()
+        count_time = time_call(count_query, args.iterations) / args.iterations
+        column_time = time_call(column_query, args.iterations) / args.iterations
+        print_row(name, f'{count_time * 1000:.2f}', f'{column_time * 1000:.2f}', same, widths=(40, 12, 12, 10))
+
+    print()
+    print_row('insert into the through table', 'no trigger', 'trigger', widths=(40, 12, 12))
+    for count in (1, 100, 10000):
+        without = time_call(lambda: relate(count, False), args.iterations) / args.iterations
+        with_triggers = time_call(lambda: relate(count, True), args.iterations) / args.iterations
+        print_row(f'{count} rows, ms', f'{without * 1000:.2f}', f'{with_triggers * 1000:.2f}', widths=(40, 12, 12))
+
+
+if __name__ == '__main__':
+    main()
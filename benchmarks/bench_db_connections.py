@@ -0,0 +1,65 @@
+"""
+Request latency with a new database connection per request (CONN_MAX_AGE=0, the
+previous behaviour) and with persistent connections (CONN_MAX_AGE=60), through the
+whole Django stack without the cache middleware, plus the cost of opening a connection.
+
+Usage: python -m benchmarks.bench_db_connections [--iterations 500]
+"""
+import argparse
+
+from benchmarks.utils import setup_django, time_each, percentile, print_row
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+from django.core.handlers.wsgi import WSGIHandler  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import RequestFactory, override_settings  # noqa: E402
+from starwarsrest.models import Film  # noqa: E402
+
+CACHE_MIDDLEWARE = 'starwarsrest.cache_middleware.RedisCacheMiddleware'
+
+
+def start_response(status, headers):
+    pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=500)
+    args = parser.parse_args()
+
+    def connect():
+        connection.close()
+        connection.ensure_connection()
+
+    durations = time_each(connect, args.iterations)
+    print_row('', 'p50 ms', 'p95 ms')
+    print_row('open a connection', f'{percentile(durations, 50) * 1000:.2f}', f'{percentile(durations, 95) * 1000:.2f}')
+
+    film = Film.objects.order_by('id').first()
+    path = f'/api/films/{film.id}/' if film else '/api/films/'
+    request = RequestFactory(SERVER_NAME='localhost').get(path)
+    middleware = [m for m in settings.MIDDLEWARE if m != CACHE_MIDDLEWARE]
+
+    with override_settings(MIDDLEWARE=middleware):
+        handler = WSGIHandler()
+
+        def get():
+            response = handler(dict(request.environ), start_response)
+            b''.join(response)
+            # Sends request_finished, which closes the connection when it is too old
+            response.close()
+
+        for conn_max_age in (0, 60):
+            connection.close()
+            # Read when the connection is opened
+            connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+            get()
+            durations = time_each(get, args.iterations)
+            print_row(f'GET {path} CONN_MAX_AGE={conn_max_age}',
+                      f'{percentile(durations, 50) * 1000:.2f}', f'{percentile(durations, 95) * 1000:.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Co-appearance queries answered by walking the Character.films through table with SQL,
+one query per character (neighbors) or per BFS level (shortest path), compared with the
+precomputed CSR graph of graph.py, plus the time to build the graph.
+
+Usage: python -m benchmarks.bench_graph [--iterations 200]
+"""
+import argparse
+import random
+from collections import Counter
+
+from benchmarks.utils import setup_django, time_call, print_row
+
+setup_django()
+
+from django.db.models import Count  # noqa: E402
+from starwarsrest.graph import CoAppearanceGraph  # noqa: E402
+from starwarsrest.models import Character  # noqa: E402
+
+through = Character.films.through
+
+
+def sql_neighbors(character_id):
+    films = through.objects.filter(character_id=character_id).values('film_id')
+    return list(
+        through.objects.filter(film_id__in=films).exclude(character_id=character_id)
+        .values('character_id').annotate(shared=Count('film_id')).order_by('-shared', 'character_id')
+        .values_list('character_id', 'shared')
+    )
+
+
+def sql_shortest_path(source_id, target_id):
+    if source_id == target_id:
+        return [source_id]
+    parents = {source_id: None}
+    frontier = [source_id]
+    while frontier:
+        films = through.objects.filter(character_id__in=frontier).values('film_id')
+        edges = through.objects.filter(film_id__in=films).values_list('film_id', 'character_id')
+        film_members, character_films = {}, {}
+        for film_id, character_id in edges:
+            film_members.setdefault(film_id, []).append(character_id)
+            character_films.setdefault(character_id, []).append(film_id)
+        next_frontier = []
+        for character_id in frontier:
+            for film_id in character_films.get(character_id, ()):
+                for other_id in film_members[film_id]:
+                    if other_id not in parents:
+                        parents[other_id] = character_id
+                        next_frontier.append(other_id)
+                        if other_id == target_id:
+                            path = [target_id]
+                            while parents[path[-1]] is not None:
+                                path.append(parents[path[-1]])
+                            return path[::-1]
+        frontier = next_frontier
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    build_time = time_call(CoAppearanceGraph.from_database, 5) / 5
+    graph = CoAppearanceGraph.from_database()
+    films = Counter(character_id for members in graph.memberships.values() for character_id in members)
+    if len(films) < 2:
+        print('Populate the database first')
+        return
+    print(f'{len(films)} characters, {len(graph.indices)} links, {len(graph.large_films)} films walked at query time, '
+          f'built in {build_time * 1000:.1f} ms\n')
+
+    # The character in the most films and the farthest of a sample of the others
+    source = max(films, key=films.get)
+    sample = random.sample(sorted(films), min(len(films), 20))
+    target = max(sample, key=lambda character_id: len(graph.shortest_path(source, character_id) or ()))
+    # Both find a shortest path, not necessarily the same one
+    assert len(graph.shortest_path(source, target)) == len(sql_shortest_path(source, target))
+
+    print_row('query', 'SQL ms', 'graph ms', 'speedup')
+    queries = [
+        ('neighbors', lambda: sql_neighbors(source), lambda: graph.neighbors(source)),
+        ('top 5 co-stars', lambda: sql_neighbors(source)[:5], lambda: graph.neighbors(source, 5)),
+        ('shortest path', lambda: sql_shortest_path(source, target), lambda: graph.shortest_path(source, target)),
+    ]
+    for name, sql, csr in queries:
+        sql_time = time_call(sql, args.iterations) / args.iterations
+        csr_time = time_call(csr, args.iterations) / args.iterations
+        print_row(name, f'{sql_time * 1000:.3f}', f'{csr_time * 1000:.3f}', f'{sql_time / csr_time:.0f}x')
+
+
+if __name__ == '__main__':
+    main()
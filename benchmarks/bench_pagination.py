@@ -0,0 +1,67 @@
+"""
+COUNT(*) of the paginated lists with the stock Django Paginator vs EstimatedCountPaginator
+(planner estimate for the unfiltered lists, cached exact count for the filtered ones), and
+the first page of the characters list endpoint with both. Run it on a large database,
+e.g. after generate_synthetic_data.
+
+Usage: python -m benchmarks.bench_pagination [--iterations 10]
+"""
+import argparse
+
+from benchmarks.utils import setup_django, time_call, print_row
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+from django.core.paginator import Paginator  # noqa: E402
+from django.test import override_settings  # noqa: E402
+from rest_framework.pagination import PageNumberPagination  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+from starwarsrest.models import Character, Starship  # noqa: E402
+from starwarsrest.pagination import EstimatedCountPagination, EstimatedCountPaginator  # noqa: E402
+from starwarsrest.views import CharacterViewSet  # noqa: E402
+
+CACHE_MIDDLEWARE = 'starwarsrest.cache_middleware.RedisCacheMiddleware'
+
+QUERYSETS = [
+    ('characters', lambda: Character.objects.all()),
+    ('characters, mass >= 150', lambda: Character.objects.filter(mass_numeric__gte=150)),
+    ('characters, name contains "sky"', lambda: Character.objects.filter(name__icontains='sky')),
+    ('starships', lambda: Starship.objects.all()),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=10)
+    args = parser.parse_args()
+
+    widths = (46, 14, 14, 12, 10)
+    print_row('count', 'Paginator ms', 'estimate ms', 'count', 'exact', widths=widths)
+    for name, queryset in QUERYSETS:
+        stock = time_call(lambda: Paginator(queryset(), 20).count, args.iterations) / args.iterations
+        paginator = EstimatedCountPaginator(queryset(), 20)
+        count = paginator.count
+        # The first call of a filtered list counts and caches, the following ones hit the cache
+        estimated = time_call(lambda: EstimatedCountPaginator(queryset(), 20).count, args.iterations) / args.iterations
+        print_row(name, f'{stock * 1000:.2f}', f'{estimated * 1000:.2f}', count, paginator.count_exact,
+                  widths=widths)
+
+    print()
+    client = APIClient(SERVER_NAME='localhost')
+    # Without the response cache, which would serve the repeated requests
+    middleware = [m for m in settings.MIDDLEWARE if m != CACHE_MIDDLEWARE]
+    print_row('/api/characters/', 'ms/request', widths=widths)
+    with override_settings(MIDDLEWARE=middleware):
+        for pagination in (PageNumberPagination, EstimatedCountPagination):
+            # Bound when the viewset class is created, the setting can't switch it
+            CharacterViewSet.pagination_class = pagination
+            for params in ('page=2', 'page=2&mass__gte=150'):
+                url = f'/api/characters/?{params}'
+                client.get(url)
+                elapsed = time_call(lambda: client.get(url), args.iterations) / args.iterations
+                print_row(f'{pagination.__name__} {params}', f'{elapsed * 1000:.2f}', widths=widths)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Compare the stock DRF JSON renderer with the orjson backed FastJSONRenderer
+on the characters, films and starships list endpoints.
+
+Uses the data of the configured database, so populate it first
+(`python manage.py populate_swapi_data --force true`).
+
+Usage: python -m benchmarks.bench_renderers [--iterations 200]
+"""
+import argparse
+
+from benchmarks.utils import setup_django, time_call, print_row
+
+setup_django()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+from starwarsrest.renderers import FastJSONRenderer, orjson  # noqa: E402
+from starwarsrest.views import CharacterViewSet, FilmViewSet, StarshipViewSet  # noqa: E402
+
+ENDPOINTS = {
+    '/api/characters/': CharacterViewSet,
+    '/api/films/': FilmViewSet,
+    '/api/starships/': StarshipViewSet,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    if orjson is None:
+        print('orjson is not installed, FastJSONRenderer falls back to the stdlib json module')
+
+    factory = APIRequestFactory(SERVER_NAME='localhost')
+    print_row('endpoint / renderer', 'render/s', 'requests/s', 'bytes')
+
+    for path, viewset in ENDPOINTS.items():
+        for renderer_class in (JSONRenderer, FastJSONRenderer):
+            view = viewset.as_view({'get': 'list'}, renderer_classes=[renderer_class])
+
+            def full_request():
+                response = view(factory.get(path))
+                response.render()
+                return response
+
+            response = full_request()
+            renderer = renderer_class()
+            data = response.data
+
+            render_time = time_call(lambda: renderer.render(data), args.iterations)
+            request_time = time_call(full_request, args.iterations)
+
+            print_row(
+                f'{path} {renderer_class.__name__}',
+                f'{args.iterations / render_time:.0f}',
+                f'{args.iterations / request_time:.0f}',
+                len(response.content),
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Text search over the characters, films and starships with icontains on every text field
+(sequential scans) vs the full-text search over the GIN indexed search vectors, for rare
+and common words. Run it on a large database, e.g. after generate_synthetic_data.
+
+Usage: python -m benchmarks.bench_search [--iterations 10]
+"""
+import argparse
+import operator
+from functools import reduce
+
+from benchmarks.utils import setup_django, time_call, print_row
+
+setup_django()
+
+from django.db.models import Q  # noqa: E402
+from starwarsrest.dao import SearchDAO  # noqa: E402
+from starwarsrest.models import Character, Film, Starship  # noqa: E402
+
+TEXT_FIELDS = {
+    Film: ['name', 'opening_crawl', 'director', 'producer'],
+    Character: ['name', 'homeworld', 'gender', 'eye_color', 'hair_color', 'skin_color'],
+    Starship: ['name', 'model', 'manufacturer', 'starship_class', 'consumables'],
+}
+WORDS = ['skywalker', 'tatooine', 'corellian', 'zzzz']
+
+
+def icontains(word, limit=20):
+    results = []
+    for model, fields in TEXT_FIELDS.items():
+        match = reduce(operator.or_, (Q(**{f'{field}__icontains': word}) for field in fields))
+        results += list(model.objects.filter(match).values('id', 'name')[:limit])
+    return results[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=10)
+    args = parser.parse_args()
+
+    print_row('search', 'ms/call', 'results', widths=(40, 12, 10))
+    for word in WORDS:
+        for name, func in ((f'icontains "{word}" (unranked)', icontains), (f'full-text "{word}"', SearchDAO.search)):
+            results = func(word)
+            elapsed = time_call(lambda: func(word), args.iterations) / args.iterations
+            print_row(name, f'{elapsed * 1000:.2f}', len(results), widths=(40, 12, 10))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Per starship class and per film statistics computed the way clients did (downloading
+every page of the list endpoints and aggregating in Python), with annotate/aggregate
+in SQL on every request, and read from the materialized views.
+
+Usage: python -m benchmarks.bench_stats [--iterations 20]
+"""
+import argparse
+from collections import defaultdict
+
+from benchmarks.utils import setup_django, time_call, print_row
+
+setup_django()
+
+from django.db.models import Avg, Count, Max  # noqa: E402
+from django.db.models.functions import Lower  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.test import override_settings  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+from starwarsrest.dao import StatsDAO  # noqa: E402
+from starwarsrest.models import Film, Starship  # noqa: E402
+
+CACHE_MIDDLEWARE = 'starwarsrest.cache_middleware.RedisCacheMiddleware'
+
+
+def download(client, path):
+    rows = []
+    url = path
+    while url:
+        page = client.get(url).json()
+        rows.extend(page['results'])
+        url = page['next']
+    return rows
+
+
+def client_side(client):
+    classes = defaultdict(list)
+    for starship in download(client, '/api/starships/?fields=starship_class,crew,cost_in_credits'):
+        classes[(starship['starship_class'] or 'unknown').lower()].append(starship)
+    films = defaultdict(int)
+    for character in download(client, '/api/characters/?fields=films&expand='):
+        for film_id in character['films']:
+            films[film_id] += 1
+    return classes, films
+
+
+def live_sql():
+    classes = list(
+        Starship.objects.annotate(klass=Lower('starship_class')).values('klass')
+        .annotate(starships=Count('id'), avg_crew=Avg('crew_numeric'),
+                  avg_cost=Avg('cost_in_credits_numeric'), max_cost=Max('cost_in_credits_numeric'))
+    )
+    # One query per relation, joining both multiplies the rows
+    films = list(Film.objects.annotate(live_characters=Count('characters')).values('id', 'name', 'live_characters'))
+    films += list(Film.objects.annotate(live_starships=Count('starships')).values('id', 'live_starships'))
+    return classes, films
+
+
+def materialized():
+    return list(StatsDAO.list_starship_class_stats()), list(StatsDAO.list_film_stats())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    StatsDAO.refresh_materialized_views()
+    client = APIClient(SERVER_NAME='localhost')
+    variants = [
+        ('client side, list endpoints', lambda: client_side(client)),
+        ('annotate/aggregate per request', live_sql),
+        ('materialized views', materialized),
+    ]
+    # Without the response cache, which would serve every variant the same way
+    middleware = [m for m in settings.MIDDLEWARE if m != CACHE_MIDDLEWARE]
+    print_row('statistics', 'ms/call')
+    with override_settings(MIDDLEWARE=middleware):
+        for name, func in variants:
+            print_row(name, f'{time_call(func, args.iterations) / args.iterations * 1000:.2f}')
+    refresh = time_call(StatsDAO.refresh_materialized_views, args.iterations) / args.iterations
+    print_row('REFRESH CONCURRENTLY (both views)', f'{refresh * 1000:.2f}')
+
+
+if __name__ == '__main__':
+    main()
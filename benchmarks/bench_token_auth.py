@@ -0,0 +1,58 @@
+"""
+Compare the stock DRF TokenAuthentication with CachedTokenAuthentication, with and
+without its per process cache: token resolution alone, and a full authenticated write
+through the starships batch endpoint (rejected, so that the database isn't modified).
+
+Creates a `benchmark` user and token in the configured database.
+
+Usage: python -m benchmarks.bench_token_auth [--iterations 2000]
+"""
+import argparse
+
+from benchmarks.utils import setup_django, time_call, print_row
+
+setup_django()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.test import override_settings  # noqa: E402
+from rest_framework.authentication import TokenAuthentication  # noqa: E402
+from rest_framework.authtoken.models import Token  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+from starwarsrest.authentication import CachedTokenAuthentication  # noqa: E402
+from starwarsrest.views import StarshipViewSet  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    user, _ = User.objects.get_or_create(username='benchmark')
+    token, _ = Token.objects.get_or_create(user=user)
+    factory = APIRequestFactory(SERVER_NAME='localhost')
+    headers = {'HTTP_AUTHORIZATION': f'Token {token.key}'}
+
+    variants = [
+        ('TokenAuthentication', TokenAuthentication, {}),
+        ('Cached, shared cache only', CachedTokenAuthentication, {'TOKEN_LOCAL_CACHE_TTL': 0}),
+        ('Cached, local + shared cache', CachedTokenAuthentication, {}),
+    ]
+    print_row('authentication', 'auth/s', 'requests/s')
+    for name, auth_class, overrides in variants:
+        auth = auth_class()
+        request = factory.get('/api/starships/', **headers)
+        view = StarshipViewSet.as_view({'post': 'batch'}, authentication_classes=[auth_class])
+
+        def write():
+            # An empty batch is rejected with a 400 after authentication
+            response = view(factory.post('/api/starships/batch/', [], format='json', **headers))
+            assert response.status_code == 400, response.status_code
+
+        with override_settings(**overrides):
+            auth_time = time_call(lambda: auth.authenticate(request), args.iterations)
+            request_time = time_call(write, args.iterations)
+        print_row(name, f'{args.iterations / auth_time:.0f}', f'{args.iterations / request_time:.0f}')
+
+
+if __name__ == '__main__':
+    main()
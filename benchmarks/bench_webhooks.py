@@ -0,0 +1,104 @@
+"""
+Webhooks sent synchronously from a post_save receiver vs the change log outbox drained
+by deliver_webhooks_task: latency of the writes with each, then the drain of a backlog
+of --updates updates spread over --rows characters (batches, coalesced events and
+events/s). The receiver is a local HTTP server answering after --receiver-ms.
+These writes are committed.
+
+Usage: python -m benchmarks.bench_webhooks [--writes 200] [--updates 20000] [--rows 2000] [--receiver-ms 20]
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.utils import setup_django, time_call, print_row
+
+setup_django()
+
+import requests  # noqa: E402
+from django.db import transaction  # noqa: E402
+from django.db.models.signals import post_save  # noqa: E402
+from django.test import override_settings  # noqa: E402
+from starwarsrest.models import Character, WebhookCursor  # noqa: E402
+from starwarsrest.webhooks import deliver_endpoint  # noqa: E402
+
+WIDTHS = (36, 14, 14)
+
+
+class Receiver(BaseHTTPRequestHandler):
+    delay = 0.02
+    requests = 0
+    events = 0
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        time.sleep(self.delay)
+        Receiver.requests += 1
+        Receiver.events += len(json.loads(body).get('events', [1]))
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--writes', type=int, default=200)
+    parser.add_argument('--updates', type=int, default=20000)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--receiver-ms', type=float, default=20)
+    args = parser.parse_args()
+
+    Receiver.delay = args.receiver_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Receiver)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/hook'
+    session = requests.Session()
+    characters = list(Character.objects.order_by('-id')[:args.rows])
+
+    def write():
+        character = random.choice(characters)
+        character.height = random.randint(100, 250)
+        character.save(update_fields=['height'])
+
+    def synchronous_webhook(sender, instance, **kwargs):
+        session.post(url, json={'type': 'characters', 'id': instance.id}, timeout=10)
+
+    print_row('write path', 'ms/write', widths=WIDTHS)
+    print_row('change log outbox', f'{time_call(write, args.writes) / args.writes * 1000:.2f}', widths=WIDTHS)
+    post_save.connect(synchronous_webhook, sender=Character)
+    try:
+        elapsed = time_call(write, args.writes)
+    finally:
+        post_save.disconnect(synchronous_webhook, sender=Character)
+    print_row('synchronous webhook in post_save', f'{elapsed / args.writes * 1000:.2f}', widths=WIDTHS)
+
+    with override_settings(WEBHOOK_SECRET='bench', WEBHOOK_URLS=[url]):
+        WebhookCursor.objects.filter(url=url).delete()
+        deliver_endpoint(url)
+        Receiver.requests = Receiver.events = 0
+        with transaction.atomic():
+            for _ in range(args.updates // 100):
+                Character.objects.filter(id__in=[c.id for c in random.sample(characters, 100)]).update(
+                    height=random.randint(100, 250))
+        start = time.perf_counter()
+        while deliver_endpoint(url):
+            pass
+        elapsed = time.perf_counter() - start
+        WebhookCursor.objects.filter(url=url).delete()
+    server.shutdown()
+
+    print()
+    print_row(f'drain of {args.updates} updates', 'value', widths=WIDTHS)
+    print_row('requests', Receiver.requests, widths=WIDTHS)
+    print_row('events after coalescing', Receiver.events, widths=WIDTHS)
+    print_row('seconds', f'{elapsed:.2f}', widths=WIDTHS)
+    print_row('log entries/s', f'{args.updates / elapsed:.0f}', widths=WIDTHS)
+
+
+if __name__ == '__main__':
+    main()
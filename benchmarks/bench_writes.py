@@ -0,0 +1,93 @@
+"""
+Single object updates and deletes: get() and a save() of every column / get() and
+delete() through Django's collector vs the DAO's single UPDATE ... RETURNING and
+DELETE ... RETURNING, the database deleting the through table rows. Reports the SQL
+statements (round trips) and the time per write. Every write is rolled back.
+
+Usage: python -m benchmarks.bench_writes [--iterations 200]
+"""
+import argparse
+import random
+
+from benchmarks.utils import setup_django, print_row, percentile, time_each
+
+setup_django()
+
+from django.db import connection, transaction  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from starwarsrest.dao import CharacterDAO, FilmDAO, StarshipDAO  # noqa: E402
+from starwarsrest.models import Character, Film, Starship  # noqa: E402
+
+WIDTHS = (34, 16, 12, 12)
+
+
+class Rollback(Exception):
+    pass
+
+
+def get_and_save(model, object_id, data):
+    obj = model.objects.get(id=object_id)
+    for key, value in data.items():
+        setattr(obj, key, value)
+    obj.save()
+
+
+def get_and_delete(model, object_id):
+    model.objects.get(id=object_id).delete()
+
+
+def rolled_back(func, *args):
+    try:
+        with transaction.atomic():
+            func(*args)
+            raise Rollback
+    except Rollback:
+        pass
+
+
+def statements(func, *args):
+    """SQL statements run by func, without the transaction control"""
+    with CaptureQueriesContext(connection) as queries:
+        rolled_back(func, *args)
+    return sum(1 for query in queries if 'SAVEPOINT' not in query['sql'] and query['sql'] not in ('BEGIN', 'ROLLBACK'))
+
+
+def cases():
+    """(name, ORM path, before, after), each a function of the id of a row with relations"""
+    return [
+        ('update character', 'get + save()', lambda i: get_and_save(Character, i, {'height': 180, 'mass': '80'}),
+         lambda i: CharacterDAO.update_character(i, {'height': 180, 'mass': '80'})),
+        ('update starship', 'get + save()', lambda i: get_and_save(Starship, i, {'crew': '4'}),
+         lambda i: StarshipDAO.update_starship(i, {'crew': '4'})),
+        ('update film', 'get + save()', lambda i: get_and_save(Film, i, {'director': 'George Lucas'}),
+         lambda i: FilmDAO.update_film(i, {'director': 'George Lucas'})),
+        ('delete character', 'get + delete()', lambda i: get_and_delete(Character, i), CharacterDAO.delete_character),
+        ('delete starship', 'get + delete()', lambda i: get_and_delete(Starship, i), StarshipDAO.delete_starship),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    ids = {
+        'character': list(Character.objects.filter(film_count__gt=0, starship_count__gt=0)
+                          .order_by('-id').values_list('id', flat=True)[:1000]),
+        'starship': list(Starship.objects.filter(pilot_count__gt=0).order_by('-id').values_list('id', flat=True)[:1000]),
+        'film': list(Film.objects.order_by('-id').values_list('id', flat=True)[:1000]),
+    }
+
+    print_row('write', 'path', 'statements', 'p50 ms', widths=WIDTHS)
+    for name, orm, before, after in cases():
+        pool = ids[name.split()[1]]
+        if not pool:
+            continue
+        for path, func in ((orm, before), ('DAO', after)):
+            count = statements(func, pool[0])
+            durations = time_each(lambda: rolled_back(func, random.choice(pool)), args.iterations)
+            print_row(name, path, count, f'{percentile(durations, 50) * 1000:.2f}', widths=WIDTHS)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""
+Synthetic datasets of the load tests, added to the configured database with the
+generate_synthetic_data management command (COPY, deterministic for a given seed).
+
+The fan-out follows the SWAPI data: characters appear in 1 to 5 films, starships in
+1 to 3 films and have 0 to 2 pilots. Names combine skewed first and last names plus
+the id, so that the searches match many rows.
+"""
+from django.core.management import call_command
+
+from starwarsrest.models import Character, Film, Starship
+
+DATASETS = {
+    '1k': {'characters': 1_000, 'films': 20, 'starships': 100},
+    '100k': {'characters': 100_000, 'films': 200, 'starships': 10_000},
+    '10m': {'characters': 10_000_000, 'films': 20_000, 'starships': 1_000_000},
+}
+
+
+def dataset_counts():
+    """Number of films, characters and starships in the database"""
+    return {
+        'films': Film.objects.count(),
+        'characters': Character.objects.count(),
+        'starships': Starship.objects.count(),
+    }
+
+
+def ensure_dataset(name, seed=42):
+    """Add rows until the database holds at least the sizes of the dataset `name`"""
+    counts = dataset_counts()
+    missing = {model: max(0, size - counts[model]) for model, size in DATASETS[name].items()}
+    if any(missing.values()):
+        call_command('generate_synthetic_data', seed=seed, **missing)
+    return dataset_counts()
@@ -0,0 +1,219 @@
+"""
+End to end load test: starts a local gunicorn (WSGI) or uvicorn (ASGI) server and drives
+a mix of list, retrieve, search, create and batch create requests from concurrent clients
+for a fixed duration. Reports p50/p95/p99 latency, requests/s, SQL queries per request
+(Server-Timing) and the cache hit rate per scenario, and writes them as JSON so that runs
+can be compared across commits.
+
+Reads are anonymous and go through the response cache (Redis), the ids follow a skewed
+distribution so that popular rows are hit again. Writes authenticate with the token of a
+`loadtest` user and create new characters, every write clears the response cache.
+
+--dataset first tops the configured database up to the sizes of a synthetic dataset (see
+datasets.py and the generate_synthetic_data command), use a dedicated database.
+
+Usage: python -m benchmarks.load_test [--dataset 1k|100k|10m] [--server gunicorn|uvicorn]
+       [--workers 4] [--clients 32] [--duration 30] [--mix list=40,retrieve=30,search=15,create=10,batch=5]
+       [--output results.json] [--compare previous.json]
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import random
+import subprocess
+import time
+import uuid
+
+from benchmarks.loadgen import request, running_server
+from benchmarks.utils import setup_django, percentile, print_row
+
+setup_django()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db.models import Max, Min  # noqa: E402
+from rest_framework.authtoken.models import Token  # noqa: E402
+from benchmarks.datasets import DATASETS, ensure_dataset  # noqa: E402
+from starwarsrest.management.commands.generate_synthetic_data import FIRST_NAMES, LAST_NAMES  # noqa: E402
+from starwarsrest.models import Character, Film, Starship  # noqa: E402
+
+DEFAULT_MIX = 'list=40,retrieve=30,search=15,create=10,batch=5'
+MODELS = {'characters': Character, 'films': Film, 'starships': Starship}
+BATCH_SIZE = 10
+PAGE_SIZE = 20
+WIDTHS = (12, 10, 10, 10, 10, 10, 10, 10)
+
+
+class Scenarios:
+    """Builds the requests of every scenario: (method, path, body, headers)"""
+
+    def __init__(self, token, seed):
+        self.rng = random.Random(seed)
+        self.run = uuid.uuid4().hex[:8]
+        self.created = 0
+        self.write_headers = {'Authorization': f'Token {token}', 'Content-Type': 'application/json'}
+        self.ranges = {}
+        for name, model in MODELS.items():
+            bounds = model.objects.aggregate(low=Min('id'), high=Max('id'))
+            if bounds['low'] is not None:
+                self.ranges[name] = (bounds['low'], bounds['high'], model.objects.count())
+
+    def _model(self):
+        return self.rng.choice(list(self.ranges))
+
+    def _skewed(self, count):
+        """Index in [0, count), small values being much more frequent"""
+        return min(int(self.rng.paretovariate(1.2)) - 1, count - 1)
+
+    def list(self):
+        name = self._model()
+        pages = max(1, self.ranges[name][2] // PAGE_SIZE)
+        return 'GET', f'/api/{name}/?page={self._skewed(min(pages, 500)) + 1}', b'', {}
+
+    def retrieve(self):
+        name = self._model()
+        low, high, count = self.ranges[name]
+        # Ids may have holes, the missing ones answer 404
+        return 'GET', f'/api/{name}/{low + self._skewed(high - low + 1)}/', b'', {}
+
+    def search(self):
+        name = self.rng.choice([name for name in ('characters', 'starships') if name in self.ranges])
+        term = self.rng.choice(FIRST_NAMES + LAST_NAMES).lower()[:4]
+        return 'GET', f'/api/{name}/search/?name={term}', b'', {}
+
+    def _character(self):
+        self.created += 1
+        return {'name': f'Load test {self.run} {self.created}', 'height': self.rng.randint(60, 260)}
+
+    def create(self):
+        return 'POST', '/api/characters/', json.dumps(self._character()).encode(), self.write_headers
+
+    def batch(self):
+        body = json.dumps([self._character() for _ in range(BATCH_SIZE)]).encode()
+        return 'POST', '/api/characters/batch/', body, self.write_headers
+
+
+async def run_load(port, scenarios, mix, clients, duration):
+    names, weights = zip(*mix.items())
+    results = {name: [] for name in names}
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        while time.perf_counter() < deadline:
+            name = scenarios.rng.choices(names, weights)[0]
+            method, path, body, headers = getattr(scenarios, name)()
+            results[name].append(await request(port, method, path, body, headers))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return results, time.perf_counter() - start
+
+
+def summarize(results, elapsed):
+    """Statistics of a list of loadgen.Result"""
+    if not results:
+        return None
+    durations = [result.duration for result in results]
+    queries = [result.queries for result in results if result.queries is not None]
+    cached = [result.cache for result in results if result.cache is not None]
+    return {
+        'requests': len(results),
+        'rps': round(len(results) / elapsed, 1),
+        'p50_ms': round(percentile(durations, 50) * 1000, 2),
+        'p95_ms': round(percentile(durations, 95) * 1000, 2),
+        'p99_ms': round(percentile(durations, 99) * 1000, 2),
+        'errors': sum(1 for result in results if result.status >= 500),
+        'client_errors': sum(1 for result in results if 400 <= result.status < 500),
+        # Cache hits run no query but still count in the average
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        'cache_hit_rate': round(cached.count('hit') / len(cached), 3) if cached else None,
+    }
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit.strip(), bool(dirty.strip())
+
+
+def print_report(report, previous=None):
+    print_row('scenario', 'requests', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'hit rate', widths=WIDTHS)
+    rows = {**report['scenarios'], 'total': report['total']}
+    for name, stats in rows.items():
+        if stats is None:
+            continue
+        print_row(name, stats['requests'], stats['rps'], stats['p50_ms'], stats['p95_ms'], stats['p99_ms'],
+                  stats['queries_per_request'], stats['cache_hit_rate'], widths=WIDTHS)
+        before = previous and {**previous['scenarios'], 'total': previous['total']}.get(name)
+        if before:
+            print_row('  vs before', '', _delta(stats['rps'], before['rps']),
+                      *(_delta(stats[key], before[key]) for key in ('p50_ms', 'p95_ms', 'p99_ms')), widths=WIDTHS)
+
+
+def _delta(value, before):
+    if not before:
+        return ''
+    return f'{(value - before) / before * 100:+.0f}%'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dataset', choices=sorted(DATASETS), help='synthetic dataset to add first')
+    parser.add_argument('--server', choices=('gunicorn', 'uvicorn'), default='gunicorn')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--port', type=int, default=8103)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=30, help='seconds of load after the warm up')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='scenario=weight list')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the report to this JSON file')
+    parser.add_argument('--compare', help='previous JSON report to compare with')
+    args = parser.parse_args()
+
+    mix = {name: float(weight) for name, weight in (item.split('=') for item in args.mix.split(','))}
+    unknown = set(mix) - {'list', 'retrieve', 'search', 'create', 'batch'}
+    if unknown:
+        parser.error(f'Unknown scenarios: {", ".join(sorted(unknown))}')
+
+    if args.dataset:
+        ensure_dataset(args.dataset, seed=args.seed)
+    user, _ = User.objects.get_or_create(username='loadtest')
+    token, _ = Token.objects.get_or_create(user=user)
+    scenarios = Scenarios(token.key, args.seed)
+    if not scenarios.ranges:
+        parser.error('The database is empty, populate it or use --dataset')
+
+    env = {'ASYNC_VIEWS': '1' if args.server == 'uvicorn' else '0'}
+    with running_server(args.server, args.port, args.workers, env):
+        # Warm up the workers, their connections and the cache
+        asyncio.run(run_load(args.port, scenarios, {'list': 1, 'retrieve': 1}, args.clients, 2))
+        results, elapsed = asyncio.run(run_load(args.port, scenarios, mix, args.clients, args.duration))
+
+    commit, dirty = git_revision()
+    report = {
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'config': {key: getattr(args, key) for key in ('dataset', 'server', 'workers', 'clients', 'duration', 'seed')},
+        'mix': mix,
+        'rows': {name: bounds[2] for name, bounds in scenarios.ranges.items()},
+        'scenarios': {name: summarize(scenario_results, elapsed) for name, scenario_results in results.items()},
+        'total': summarize([result for scenario_results in results.values() for result in scenario_results], elapsed),
+    }
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)
+    print_report(report, previous)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
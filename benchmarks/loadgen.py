@@ -0,0 +1,97 @@
+"""
+Helpers of the load benchmarks: starting a local gunicorn or uvicorn server and a
+minimal asyncio HTTP/1.1 client (one connection per request) reading the
+Server-Timing header set by InstrumentationMiddleware.
+"""
+import asyncio
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+HOST = '127.0.0.1'
+
+QUERIES_PATTERN = re.compile(r'desc="(\d+) queries"')
+CACHE_PATTERN = re.compile(r'cache;desc="(\w+)"')
+
+
+def server_command(server, port, workers):
+    """Command line of a gunicorn (WSGI) or uvicorn (ASGI) server of the project"""
+    if server == 'gunicorn':
+        return ['gunicorn', 'starwarsrest.wsgi:application', '--bind', f'{HOST}:{port}',
+                '--workers', str(workers), '--log-level', 'warning']
+    if server == 'uvicorn':
+        return [sys.executable, '-m', 'uvicorn', 'starwarsrest.asgi:application', '--host', HOST,
+                '--port', str(port), '--workers', str(workers), '--log-level', 'warning']
+    raise ValueError(f'Unknown server {server}')
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((HOST, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Server on port {port} did not start')
+
+
+@contextmanager
+def running_server(server, port, workers, env=None):
+    """Run a server with the environment of the benchmark plus env until the block exits"""
+    process = subprocess.Popen(server_command(server, port, workers), env={**os.environ, **(env or {})})
+    try:
+        wait_for_port(port)
+        yield process
+    finally:
+        process.terminate()
+        process.wait()
+
+
+class Result:
+    """Outcome of one request"""
+    __slots__ = ('status', 'duration', 'queries', 'cache', 'body')
+
+    def __init__(self, status, duration, queries, cache, body):
+        self.status = status
+        self.duration = duration
+        self.queries = queries
+        self.cache = cache
+        self.body = body
+
+
+async def request(port, method, path, body=b'', headers=None):
+    """Send a request on a new connection and read the whole response"""
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection(HOST, port)
+    lines = [f'{method} {path} HTTP/1.1', 'Host: localhost', 'Connection: close']
+    lines += [f'{name}: {value}' for name, value in (headers or {}).items()]
+    if body:
+        lines.append(f'Content-Length: {len(body)}')
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    duration = time.perf_counter() - start
+
+    head, _, content = response.partition(b'\r\n\r\n')
+    head = head.decode('latin-1')
+    timing = ''
+    for line in head.split('\r\n')[1:]:
+        name, _, value = line.partition(':')
+        if name.lower() == 'server-timing':
+            timing = value
+    queries = QUERIES_PATTERN.search(timing)
+    cache = CACHE_PATTERN.search(timing)
+    return Result(int(head[9:12]), duration, int(queries.group(1)) if queries else None,
+                  cache.group(1) if cache else None, content)
+
+
+async def get(port, path):
+    """GET path on a new connection, return the status code and the duration in seconds"""
+    result = await request(port, 'GET', path)
+    return result.status, result.duration
@@ -0,0 +1,40 @@
+import os
+import time
+
+import django
+
+
+def setup_django():
+    """Configure Django so the benchmarks can use the ORM and DRF"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'starwarsrest.settings')
+    django.setup()
+
+
+def time_call(func, iterations):
+    """Call func `iterations` times and return the elapsed time in seconds"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return time.perf_counter() - start
+
+
+def print_row(*columns, widths=(40, 12, 12, 10)):
+    """Print a row of a fixed width results table"""
+    print(''.join(str(column).ljust(width) for column, width in zip(columns, widths)))
+
+
+def time_each(func, iterations):
+    """Call func `iterations` times and return the duration of every call in seconds"""
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def percentile(samples, p):
+    """p-th percentile (0-100) of the samples, nearest rank"""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
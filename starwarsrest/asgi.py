@@ -12,5 +12,12 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'starwarsrest.settings')
+# Persistent connections are disabled in async mode: the ORM calls of the async views and
+# the sync views run in threads, each one would keep its own connection open
+os.environ['DB_CONN_MAX_AGE'] = '0'
 
-application = get_asgi_application()
\ No newline at end of file
+application = get_asgi_application()
+
+# Build the autocomplete index of this worker before it serves requests
+from starwarsrest.autocomplete import warm_up_autocomplete  # noqa: E402
+warm_up_autocomplete()
@@ -0,0 +1,88 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from django.contrib.auth import get_user_model
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+TOKEN_CACHE_ALIAS = 'tokens'
+# Fields of the user kept in the shared cache: what the authentication and request.user
+# need, never the password hash
+CACHED_USER_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+
+# Per process token cache: cache key -> (expiry, token)
+_local_cache = {}
+
+
+def _cache_key(key):
+    # The token keys are secrets, don't write them in clear in Redis
+    return 'token-user:' + hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def _cache_entry(token):
+    """(token key, created, user field values) stored in the shared cache instead of the pickled Token and User"""
+    return (token.key, token.created, tuple(getattr(token.user, field) for field in CACHED_USER_FIELDS))
+
+
+def _token_from_entry(entry):
+    """Token of a shared cache entry, its user only has the CACHED_USER_FIELDS and must not be saved"""
+    key, created, user_values = entry
+    user = get_user_model()(**dict(zip(CACHED_USER_FIELDS, user_values)))
+    user._state.adding = False
+    # No password: check_password() and friends fail instead of using a blank hash
+    user.set_unusable_password()
+    token = Token(key=key, created=created, user=user)
+    token._state.adding = False
+    return token
+
+
+def invalidate_token(key):
+    """
+    Evict a token from the local and the shared cache.
+    Other processes keep their local entry until TOKEN_LOCAL_CACHE_TTL expires.
+    """
+    cache_key = _cache_key(key)
+    _local_cache.pop(cache_key, None)
+    caches[TOKEN_CACHE_ALIAS].delete(cache_key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication caching the token -> user resolution, so that an authenticated
+    request doesn't cost a database query. Tokens are looked up in a per process dict
+    (TOKEN_LOCAL_CACHE_TTL seconds), then in the `tokens` cache (TOKEN_CACHE_TTL seconds)
+    and finally in the database. Unknown tokens are not cached. The shared cache only
+    holds the token and the CACHED_USER_FIELDS of its user, not the password hash.
+    Tokens are evicted when they are deleted or regenerated and when their user changes,
+    see signals.py.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = _cache_key(key)
+        now = time.monotonic()
+
+        entry = _local_cache.get(cache_key)
+        if entry is not None and entry[0] > now:
+            token = entry[1]
+        else:
+            entry = caches[TOKEN_CACHE_ALIAS].get(cache_key)
+            if entry is None:
+                user, token = super().authenticate_credentials(key)
+                caches[TOKEN_CACHE_ALIAS].set(cache_key, _cache_entry(token), settings.TOKEN_CACHE_TTL)
+            else:
+                token = _token_from_entry(entry)
+            self._cache_locally(cache_key, token, now)
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return (token.user, token)
+
+    def _cache_locally(self, cache_key, token, now):
+        if settings.TOKEN_LOCAL_CACHE_TTL <= 0:
+            return
+        if len(_local_cache) >= settings.TOKEN_LOCAL_CACHE_SIZE:
+            _local_cache.clear()
+        _local_cache[cache_key] = (now + settings.TOKEN_LOCAL_CACHE_TTL, token)
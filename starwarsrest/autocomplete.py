@@ -0,0 +1,321 @@
+"""
+Autocomplete index of the character, film and starship names.
+
+Every process keeps, per type, an immutable sorted array of normalized keys (the whole
+name and each word of it, casefolded and without accents) packed in one UTF-8 blob with
+an offsets array, so that the names starting with a prefix are found by binary search
+without touching the database. Changes committed since the array was built are kept in
+a small sorted overlay, the array is rebuilt from the database once the overlay grows
+past a tenth of it.
+
+The index is built from the database on startup (see wsgi.py and asgi.py) or on the
+first query. post_save and post_delete publish the committed changes through the
+`autocomplete` cache under an increasing version number, the other processes replay
+them. Writes bypassing the signals call update_autocomplete() or, when they don't know
+the names, invalidate_autocomplete() and every process rebuilds its index. The rebuilds
+of an index already built run in a background thread, the requests are served from the
+previous index and its overlay until the new one is swapped in.
+"""
+import logging
+import os
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left, insort
+from heapq import merge
+from itertools import accumulate
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connections
+from .models import Character, Film, Starship
+
+logger = logging.getLogger(__name__)
+
+AUTOCOMPLETE_CACHE_ALIAS = 'autocomplete'
+VERSION_KEY = 'version'
+# Past this many versions behind, a process rebuilds its index instead of replaying the changes
+MAX_REPLAY = 1000
+# Changes are kept long enough for every process to replay them
+CHANGE_TIMEOUT = 3600
+
+MODELS = {'characters': Character, 'films': Film, 'starships': Starship}
+TYPE_NAMES = {model: name for name, model in MODELS.items()}
+
+# (index, version, time of the last version check) of this process
+_state = (None, None, 0.0)
+_lock = threading.Lock()
+# Thread rebuilding the index of this process, if any
+_rebuilding = None
+
+
+def _reset_after_fork():
+    """
+    gunicorn --preload forks the workers after the index is built: a lock held by a thread
+    of the master at the fork would never be released in the worker, which has no rebuild
+    thread of its own either.
+    """
+    global _lock, _rebuilding
+    _lock = threading.Lock()
+    _rebuilding = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def normalize(text):
+    """Casefolded text without accents and with single spaces, the form of the keys and prefixes"""
+    if text.isascii():
+        return ' '.join(text.lower().split())
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ' '.join(''.join(char for char in decomposed if not unicodedata.combining(char)).casefold().split())
+
+
+def name_keys(name):
+    """Keys of a name: the whole name and the rest of it from every word on, numbers excepted"""
+    words = normalize(name).split(' ')
+    return [' '.join(words[i:]) for i, word in enumerate(words) if word and (i == 0 or not word.isdigit())]
+
+
+class PrefixArray:
+    """
+    Immutable sorted array of (key, id, name) built from [(id, name)]. The key i is
+    keys[key_offsets[i]:key_offsets[i + 1]] and belongs to the entry key_entries[i],
+    whose name is names[name_offsets[entry]:name_offsets[entry + 1]]. UTF-8 keeps the
+    order of the code points, so byte prefixes are text prefixes.
+    """
+
+    def __init__(self, rows):
+        ids, names, pairs = [], [], []
+        for entry, (object_id, name) in enumerate(rows):
+            ids.append(object_id)
+            names.append(name.encode())
+            pairs += [(key.encode(), entry) for key in name_keys(name)]
+        pairs.sort()
+        keys = [key for key, _ in pairs]
+        self.ids = array('q', ids)
+        self.names = b''.join(names)
+        self.name_offsets = array('q', accumulate(map(len, names), initial=0))
+        self.keys = b''.join(keys)
+        self.key_offsets = array('q', accumulate(map(len, keys), initial=0))
+        self.key_entries = array('q', [entry for _, entry in pairs])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def key(self, i):
+        return self.keys[self.key_offsets[i]:self.key_offsets[i + 1]]
+
+    def name(self, entry):
+        return self.names[self.name_offsets[entry]:self.name_offsets[entry + 1]].decode()
+
+    def matches(self, prefix):
+        """(key, id, name) of the keys starting with the encoded prefix, in key order"""
+        low, high = 0, len(self.key_entries)
+        while low < high:
+            middle = (low + high) // 2
+            if self.key(middle) < prefix:
+                low = middle + 1
+            else:
+                high = middle
+        for i in range(low, len(self.key_entries)):
+            key = self.key(i)
+            if not key.startswith(prefix):
+                return
+            entry = self.key_entries[i]
+            yield key, self.ids[entry], self.name(entry)
+
+
+class AutocompleteIndex:
+    """Per type PrefixArray plus the overlay of the changes made since it was built"""
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        # Per type: {id: name, None when deleted} of the changes, and their sorted (key, id, name)
+        self.changed = {name: {} for name in arrays}
+        self.overlay = {name: [] for name in arrays}
+
+    @classmethod
+    def from_database(cls):
+        return cls({
+            name: PrefixArray(model.objects.order_by('name').values_list('id', 'name').iterator(chunk_size=10000))
+            for name, model in MODELS.items()
+        })
+
+    def apply(self, changes):
+        """Apply [(type, id, name or None when deleted)] changes"""
+        for type_name, object_id, name in changes:
+            changed, overlay = self.changed[type_name], self.overlay[type_name]
+            previous = changed.get(object_id)
+            if previous is not None:
+                for key in name_keys(previous):
+                    del overlay[bisect_left(overlay, (key.encode(), object_id))]
+            changed[object_id] = name
+            if name is not None:
+                for key in name_keys(name):
+                    insort(overlay, (key.encode(), object_id, name))
+
+    def is_outgrown(self):
+        """True when the overlay holds more than a tenth of the arrays"""
+        changes = sum(len(changed) for changed in self.changed.values())
+        return changes > max(1000, sum(len(prefix_array) for prefix_array in self.arrays.values()) // 10)
+
+    def _matches(self, type_name, prefix):
+        changed, overlay = self.changed[type_name], self.overlay[type_name]
+        # The array entries changed since it was built are served by the overlay
+        base = (match for match in self.arrays[type_name].matches(prefix) if match[1] not in changed)
+        extra = []
+        for i in range(bisect_left(overlay, (prefix,)), len(overlay)):
+            if not overlay[i][0].startswith(prefix):
+                break
+            extra.append(overlay[i])
+        return ((key, type_name, object_id, name) for key, object_id, name in merge(base, extra))
+
+    def search(self, text, types=None, limit=10):
+        """[{type, id, name}] of the names with a word starting with text, in key order"""
+        prefix = normalize(text).encode()
+        if not prefix:
+            return []
+        results, seen = [], set()
+        streams = [self._matches(type_name, prefix) for type_name in types or self.arrays]
+        for _, type_name, object_id, name in merge(*streams):
+            if (type_name, object_id) in seen:
+                continue
+            seen.add((type_name, object_id))
+            results.append({'type': type_name, 'id': object_id, 'name': name})
+            if len(results) == limit:
+                break
+        return results
+
+
+def _bump_version():
+    """Increment the shared version, None when the cache can't count (e.g. DummyCache)"""
+    cache = caches[AUTOCOMPLETE_CACHE_ALIAS]
+    cache.add(VERSION_KEY, 0, timeout=None)
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        return None
+
+
+def _change_key(version):
+    return f'change:{version}'
+
+
+def _rebuild():
+    cache = caches[AUTOCOMPLETE_CACHE_ALIAS]
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = _bump_version()
+    # Read after the version, a concurrent change bumps it again and is replayed next time
+    return AutocompleteIndex.from_database(), version
+
+
+def _rebuild_and_swap():
+    """Rebuild the index and replace the one of this process, whose changes are replayed on the next query"""
+    global _state
+    try:
+        index, version = _rebuild()
+    except DatabaseError:
+        logger.exception("Autocomplete index not rebuilt, the previous one is still served")
+        return
+    with _lock:
+        _state = (index, version, 0.0)
+
+
+def _run_rebuild():
+    global _rebuilding
+    try:
+        _rebuild_and_swap()
+    finally:
+        _rebuilding = None
+        connections.close_all()
+
+
+def _start_rebuild():
+    """Rebuild the index in a background thread, unless a rebuild is already running"""
+    global _rebuilding
+    with _lock:
+        if _rebuilding is not None and _rebuilding.is_alive():
+            return
+        _rebuilding = threading.Thread(target=_run_rebuild, name='autocomplete-rebuild', daemon=True)
+        _rebuilding.start()
+
+
+def get_autocomplete_index():
+    """
+    The autocomplete index of this process, after replaying the changes of the other
+    processes. Only the first build blocks, the later rebuilds run in the background.
+    """
+    global _state
+    with _lock:
+        index, local_version, checked = _state
+        now = time.monotonic()
+        if index is None:
+            index, version = _rebuild()
+            _state = (index, version, now)
+            return index
+        if now - checked < settings.AUTOCOMPLETE_SYNC_INTERVAL or (_rebuilding is not None and _rebuilding.is_alive()):
+            return index
+        cache = caches[AUTOCOMPLETE_CACHE_ALIAS]
+        version = cache.get(VERSION_KEY)
+        if version is not None and local_version is not None and version > local_version:
+            keys = [_change_key(v) for v in range(local_version + 1, version + 1)]
+            changes = cache.get_many(keys) if len(keys) <= MAX_REPLAY else {}
+            # A missing change is an invalidation or an evicted entry, both need a rebuild
+            if len(changes) == len(keys):
+                for key in keys:
+                    index.apply(changes[key])
+                local_version = version
+        stale = version is None or version != local_version or index.is_outgrown()
+        _state = (index, local_version, now)
+    if stale:
+        _start_rebuild()
+    return index
+
+
+def update_autocomplete(changes):
+    """
+    Apply committed [(type, id, name or None when deleted)] changes to the index of this
+    process and publish them to the other processes.
+    """
+    global _state
+    changes = list(changes)
+    if not changes:
+        return
+    with _lock:
+        version = _bump_version()
+        if version is None:
+            _state = (None, None, 0.0)
+            return
+        caches[AUTOCOMPLETE_CACHE_ALIAS].set(_change_key(version), changes, timeout=CHANGE_TIMEOUT)
+        index, local_version, checked = _state
+        if index is not None and local_version == version - 1:
+            index.apply(changes)
+            _state = (index, version, checked)
+
+
+def invalidate_autocomplete():
+    """Make every process rebuild its index from the database, each one serves its current index meanwhile"""
+    global _state
+    with _lock:
+        # No change is stored under the new version, which forces the rebuild
+        if _bump_version() is None:
+            _state = (None, None, 0.0)
+        else:
+            _state = (_state[0], _state[1], 0.0)
+
+
+def warm_up_autocomplete():
+    """
+    Build the index on startup, the first query builds it when the database is not
+    reachable yet. With gunicorn --preload the index is built once in the master and
+    shared copy-on-write by the forked workers, so the connections are closed here
+    rather than inherited.
+    """
+    try:
+        get_autocomplete_index()
+    except DatabaseError:
+        logger.warning("Autocomplete index not built on startup, the database is not reachable")
+    finally:
+        connections.close_all()
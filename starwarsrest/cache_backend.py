@@ -0,0 +1,28 @@
+from django.core.cache.backends.redis import RedisCache, RedisCacheClient
+
+
+class PooledRedisCacheClient(RedisCacheClient):
+    """
+    Django's RedisCacheClient builds a new redis.Redis client around the connection pool
+    for every cache operation, which with redis-py 5 costs several times the GET itself.
+    redis.Redis clients are thread safe, keep one per connection pool instead.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._clients = {}
+
+    def get_client(self, key=None, *, write=False):
+        index = self._get_connection_pool_index(write)
+        client = self._clients.get(index)
+        if client is None:
+            client = self._clients[index] = self._client(connection_pool=self._get_connection_pool(write))
+        return client
+
+
+class PooledRedisCache(RedisCache):
+    """RedisCache backend using PooledRedisCacheClient"""
+
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        self._class = PooledRedisCacheClient
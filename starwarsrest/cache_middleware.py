@@ -1,21 +1,89 @@
 import hashlib
 import re
+import time
+from django.conf import settings
 from django.core.cache import cache
 from django.utils.deprecation import MiddlewareMixin
 from django.http import HttpResponse
 import logging
+from .logging_utils import Sampler
+from .metrics import CACHE_EVENTS
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+CACHE_HITS = CACHE_EVENTS.labels('hit')
+CACHE_MISSES = CACHE_EVENTS.labels('miss')
+CACHE_STORES = CACHE_EVENTS.labels('store')
+
+
+class CacheStats:
+    """
+    In-process hit/miss/store counters, logged as a single INFO summary line every
+    `interval` seconds instead of one line per request. The counts are approximate
+    under threads, CACHE_EVENTS holds the exact totals.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self._since = time.monotonic()
+
+    def hit(self):
+        self.hits += 1
+        self._maybe_flush()
+
+    def miss(self):
+        self.misses += 1
+        self._maybe_flush()
+
+    def store(self):
+        self.stores += 1
+
+    def _maybe_flush(self):
+        now = time.monotonic()
+        elapsed = now - self._since
+        if elapsed < self.interval:
+            return
+        hits, misses, stores = self.hits, self.misses, self.stores
+        self.hits = self.misses = self.stores = 0
+        self._since = now
+        logger.info("Cache stats: %d hits, %d misses, %d stores in the last %.0fs",
+                    hits, misses, stores, elapsed)
+
+
 class RedisCacheMiddleware(MiddlewareMixin):
     """
     Middleware to cache GET requests for list and retrieve operations using Redis.
+
+    It sits right after SecurityMiddleware, so a cache hit is answered before the session,
+    CSRF, authentication, messages and clickjacking middleware run. Only anonymous requests
+    (no Authorization header, no session cookie) are served from and stored in the cache,
+    the responses varying on Cookie or Authorization are then the anonymous variant.
+    The Accept header is part of the cache key (DRF responses vary on it), responses
+    varying on any other header, setting cookies or marked private/no-store are not cached.
     """
     
     # Regex patterns for list and retrieve operations
-    LIST_PATTERN = re.compile(r'/api/(characters|films|starships)/')
+    LIST_PATTERN = re.compile(r'/api/(characters|films|starships|stats|search)/')
     RETRIEVE_PATTERN = re.compile(r'/api/(characters|films|starships)/\d+/')
+
+    # Query parameters holding comma separated sets, see SparseFieldsetMixin
+    SET_PARAMS = ('fields', 'expand')
+
+    # Vary headers a cached response may have: Accept is part of the cache key,
+    # Cookie and Authorization are absent from every request using the cache
+    CACHEABLE_VARY = {'accept', 'cookie', 'authorization'}
+
+    # Headers not replayed on a cache hit
+    SKIPPED_HEADERS = {'content-type', 'content-length', 'server-timing'}
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.stats = CacheStats(getattr(settings, 'CACHE_STATS_LOG_INTERVAL', 60))
+        self.sample = Sampler(getattr(settings, 'CACHE_LOG_SAMPLE_RATE', 100))
     
     def process_request(self, request):
         # Only cache GET requests for list and retrieve operations
@@ -25,25 +93,35 @@ class RedisCacheMiddleware(MiddlewareMixin):
         # Check if this is a list or retrieve operation
         if not (self.LIST_PATTERN.match(request.path) or self.RETRIEVE_PATTERN.match(request.path)):
             return None
+
+        # Authenticated requests go through the whole stack, authentication included
+        if not self._is_anonymous(request):
+            return None
             
         # Generate cache key based on path and query parameters
         cache_key = self._generate_cache_key(request)
         
         # Try to get response from cache
         cached_response = cache.get(cache_key)
-        logger.info(f"Checking cache for key: {cache_key}")
         if cached_response:
-            logger.info(f"Cache HIT for key: {cache_key}")
-            print(f"Cache HIT for key: {cache_key}")
+            request._cache_status = 'hit'
+            CACHE_HITS.inc()
+            self.stats.hit()
+            if logger.isEnabledFor(logging.DEBUG) and self.sample():
+                logger.debug("Cache HIT for key: %s", cache_key)
             # Return cached response
             return HttpResponse(
                 content=cached_response['content'],
                 status=cached_response['status'],
-                content_type=cached_response['content_type']
+                content_type=cached_response['content_type'],
+                headers=cached_response.get('headers'),
             )
         else:
-            logger.info(f"Cache MISS for key: {cache_key}")
-            print(f"Cache MISS for key: {cache_key}")
+            request._cache_status = 'miss'
+            CACHE_MISSES.inc()
+            self.stats.miss()
+            if logger.isEnabledFor(logging.DEBUG) and self.sample():
+                logger.debug("Cache MISS for key: %s", cache_key)
         
         # Store cache key in request for later use in process_response
         request._cache_key = cache_key
@@ -51,32 +129,64 @@ class RedisCacheMiddleware(MiddlewareMixin):
     
     def process_response(self, request, response):
         # Only cache GET requests with successful responses for list and retrieve operations
+        # Streaming responses (exports) are never cached
         if (request.method == 'GET' and 
             response.status_code == 200 and 
+            not response.streaming and
             hasattr(request, '_cache_key')):
             
             # Check if this is a list or retrieve operation
             if not (self.LIST_PATTERN.match(request.path) or self.RETRIEVE_PATTERN.match(request.path)):
                 return response
+
+            if not self._is_cacheable(response):
+                return response
             
             # Cache the response for 5 minutes (300 seconds)
             cache.set(request._cache_key, {
                 'content': response.content.decode('utf-8'),
                 'status': response.status_code,
-                'content_type': response.get('Content-Type', 'application/json')
+                'content_type': response.get('Content-Type', 'application/json'),
+                'headers': {
+                    header: value for header, value in response.items()
+                    if header.lower() not in self.SKIPPED_HEADERS
+                },
             }, 300)  # 5 minutes cache timeout
-            logger.info(f"Cached response for key: {request._cache_key}")
-            print(f"Cached response for key: {request._cache_key}")
+            CACHE_STORES.inc()
+            self.stats.store()
+            if logger.isEnabledFor(logging.DEBUG) and self.sample():
+                logger.debug("Cached response for key: %s", request._cache_key)
             
         return response
     
+    def _is_anonymous(self, request):
+        return ('HTTP_AUTHORIZATION' not in request.META
+                and settings.SESSION_COOKIE_NAME not in request.COOKIES)
+
+    def _is_cacheable(self, response):
+        """Check that the response is the same for every anonymous request with the same key"""
+        if response.cookies:
+            return False
+        vary = {header.strip().lower() for header in response.get('Vary', '').split(',') if header.strip()}
+        if not vary <= self.CACHEABLE_VARY:
+            return False
+        cache_control = response.get('Cache-Control', '').lower()
+        return 'private' not in cache_control and 'no-store' not in cache_control
+
     def _generate_cache_key(self, request):
         """
-        Generate a unique cache key based on request path and query parameters.
+        Generate a unique cache key based on request path, query parameters and Accept header.
+        The values of the comma separated set parameters (fields, expand) are sorted,
+        so that ?fields=id,name and ?fields=name,id share the same cache entry.
         """
+        params = []
+        for k, v in sorted(request.GET.items()):
+            if k in self.SET_PARAMS:
+                v = ','.join(sorted(item.strip() for item in v.split(',') if item.strip()))
+            params.append(f"{k}={v}")
         # Create a string with path and sorted query parameters
-        query_params = '&'.join([f"{k}={v}" for k, v in sorted(request.GET.items())])
-        key_string = f"{request.path}?{query_params}"
+        query_params = '&'.join(params)
+        key_string = f"{request.path}?{query_params}|{request.META.get('HTTP_ACCEPT', '')}"
         
         # Hash the key string to create a consistent cache key
         return hashlib.md5(key_string.encode('utf-8')).hexdigest()
\ No newline at end of file
@@ -1,4 +1,10 @@
+import threading
+from contextlib import contextmanager
 from django.core.cache import cache
+from .metrics import CACHE_EVENTS
+
+
+_batch_state = threading.local()
 
 
 def invalidate_cache_for_model(model_name):
@@ -6,14 +12,37 @@ def invalidate_cache_for_model(model_name):
     Invalidate cache entries for a specific model.
     This is a placeholder implementation. In a production environment,
     you might want to use a more sophisticated cache tagging system.
+    Inside a batch_cache_invalidation() block the invalidation is postponed to the end of the block.
     """
+    if getattr(_batch_state, 'depth', 0):
+        _batch_state.pending = True
+        return
     # For now, we'll just clear the entire cache
     # A more advanced implementation might use cache tags
-    cache.clear()
+    invalidate_all_cache()
 
 
 def invalidate_all_cache():
     """
     Invalidate all cache entries.
     """
-    cache.clear()
\ No newline at end of file
+    CACHE_EVENTS.labels('evict').inc()
+    cache.clear()
+
+
+@contextmanager
+def batch_cache_invalidation():
+    """
+    Collapse every invalidation requested inside the block into a single one when the
+    outermost block exits. Used by the bulk DAO operations so that a batch of N writes
+    clears the cache once instead of N times.
+    """
+    depth = getattr(_batch_state, 'depth', 0)
+    _batch_state.depth = depth + 1
+    try:
+        yield
+    finally:
+        _batch_state.depth = depth
+        if depth == 0 and getattr(_batch_state, 'pending', False):
+            _batch_state.pending = False
+            invalidate_all_cache()
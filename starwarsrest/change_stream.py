@@ -0,0 +1,265 @@
+"""
+Server-Sent Events stream of the film, character and starship changes.
+
+The change log triggers (see Change) NOTIFY the `starwarsrest_changes` channel when
+their transaction commits. Every event loop of a process runs one ChangeBroker: a
+dedicated connection LISTENs on the channel from the event loop, without a thread, and
+on each notification (and every CHANGE_STREAM_POLL_INTERVAL seconds, for the entries
+withheld while an older transaction was running) the broker reads the new entries of
+the log in its own thread and fans the encoded events out to the in-memory queues of
+the subscribers. An idle subscriber is a coroutine waiting on its queue, so a process
+holds thousands of them while the database sees two connections.
+
+The event ids are the positions in the log: a client reconnecting with Last-Event-ID
+replays what it missed from the log. A subscriber whose queue fills up, a client not
+reading fast enough, is taken out of the fan-out and catches up from the log too.
+"""
+import asyncio
+import json
+import logging
+import re
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+from .dao import ChangesDAO
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'starwarsrest_changes'
+# Entries read from the log per query
+PAGE_SIZE = 1000
+KEEPALIVE = ': keepalive\n\n'
+# Sent once, when the replay is over and the stream follows the log
+LIVE = ': live\n\n'
+
+POSITION = re.compile(r'^(\d+)-(\d+)$')
+
+# Broker of each event loop
+_brokers = weakref.WeakKeyDictionary()
+
+
+def format_position(position):
+    """Cursor / event id of a (txid, id) position of the change log"""
+    return '%d-%d' % tuple(position)
+
+
+def parse_position(text):
+    """(txid, id) position of a cursor, None when it is not one"""
+    match = POSITION.match(text)
+    if match is None:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+def encode_event(entry):
+    """The SSE event of a change log entry"""
+    data = json.dumps({
+        'type': entry.object_type,
+        'id': entry.object_id,
+        'changed_at': entry.changed_at.isoformat(),
+    })
+    return f'id: {format_position((entry.txid, entry.id))}\nevent: {entry.operation}\ndata: {data}\n\n'
+
+
+class Subscription:
+    """Queue of the events of one client, position is the one of its last queued event"""
+
+    def __init__(self, position, types):
+        self.position = position
+        self.types = types
+        self.queue = asyncio.Queue(maxsize=settings.CHANGE_STREAM_QUEUE_SIZE)
+        self.dropped = False
+
+    def put(self, entry, event):
+        """Queue the event of an entry past the position, False when the queue is full"""
+        position = (entry.txid, entry.id)
+        if position <= self.position:
+            return True
+        if self.types is None or entry.object_type in self.types:
+            try:
+                self.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                return False
+        self.position = position
+        return True
+
+
+class ChangeBroker:
+    """
+    Follows the change log for the subscribers of one event loop, from the first
+    subscription on. position is the log position the subscribers were sent up to.
+    """
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+        self.position = None
+        self.subscriptions = set()
+        # Number of open streams, catching up or subscribed
+        self.streams = 0
+        self.lock = asyncio.Lock()
+        self.notified = asyncio.Event()
+        # The log is read from a single thread and database connection
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='change-stream')
+        self.listener = None
+        self.task = None
+
+    async def _run(self, func, *args):
+        def call():
+            close_old_connections()
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+
+    def _listen(self):
+        """New connection listening on the channel, notifications are read by _on_readable"""
+        wrapper = connections[self.using]
+        connection = wrapper.get_new_connection(wrapper.get_connection_params())
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {CHANNEL}')
+        return connection
+
+    async def _connect(self):
+        self.listener = await self._run(self._listen)
+        asyncio.get_running_loop().add_reader(self.listener.fileno(), self._on_readable)
+
+    def _disconnect(self):
+        if self.listener is None:
+            return
+        asyncio.get_running_loop().remove_reader(self.listener.fileno())
+        self.listener.close()
+        self.listener = None
+
+    def _on_readable(self):
+        try:
+            self.listener.poll()
+        except Exception:
+            logger.warning("Change stream: lost the LISTEN connection, reconnecting", exc_info=True)
+            self._disconnect()
+            self.notified.set()
+            return
+        if self.listener.notifies:
+            # The payloads don't matter, the log has the changes
+            self.listener.notifies.clear()
+            self.notified.set()
+
+    async def start(self):
+        async with self.lock:
+            if self.task is not None:
+                return
+            # Listening first: the changes committed from then on are notified
+            await self._connect()
+            self.position = await self._run(ChangesDAO.current_position, self.using)
+            self.task = asyncio.get_running_loop().create_task(self._follow())
+
+    async def close(self):
+        """Stop following the log and close the connections"""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        self._disconnect()
+        await self._run(connections.close_all)
+        self.executor.shutdown()
+
+    async def _follow(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.notified.wait(), settings.CHANGE_STREAM_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self.notified.clear()
+            try:
+                if self.listener is None:
+                    await self._connect()
+                async with self.lock:
+                    has_more = True
+                    while has_more:
+                        entries, self.position, has_more = await self._run(
+                            ChangesDAO.list_changes, self.position, PAGE_SIZE, self.using, False,
+                        )
+                        self._publish(entries)
+            except Exception:
+                logger.exception("Change stream: reading the change log failed, retrying")
+                self._disconnect()
+
+    def _publish(self, entries):
+        if not self.subscriptions:
+            return
+        for entry in entries:
+            event = encode_event(entry)
+            for subscription in list(self.subscriptions):
+                if not subscription.put(entry, event):
+                    # Catches up from the log once its queue is read
+                    subscription.dropped = True
+                    self.subscriptions.discard(subscription)
+
+    async def _read(self, position, types):
+        """(events, position) of the entries after position up to the end of the log"""
+        events = []
+        has_more = True
+        while has_more:
+            entries, position, has_more = await self._run(
+                ChangesDAO.list_changes, position, PAGE_SIZE, self.using, False,
+            )
+            events += [encode_event(entry) for entry in entries if types is None or entry.object_type in types]
+        return events, position
+
+    async def stream(self, position=None, types=None):
+        """
+        Encoded events of the changes of the types (every type when None) after the
+        position, from now on when None, with a keepalive comment when idle.
+        """
+        await self.start()
+        self.streams += 1
+        live = False
+        try:
+            if position is None:
+                position = self.position
+            while True:
+                # Catch up outside of the lock, a page at a time
+                while position < self.position:
+                    entries, position, has_more = await self._run(
+                        ChangesDAO.list_changes, position, PAGE_SIZE, self.using, False,
+                    )
+                    for entry in entries:
+                        if types is None or entry.object_type in types:
+                            yield encode_event(entry)
+                    if not has_more:
+                        break
+                async with self.lock:
+                    # The changes published while catching up
+                    backlog = []
+                    if position < self.position:
+                        backlog, position = await self._read(position, types)
+                    subscription = Subscription(position, types)
+                    self.subscriptions.add(subscription)
+                try:
+                    for event in backlog:
+                        yield event
+                    if not live:
+                        live = True
+                        yield LIVE
+                    while not (subscription.dropped and subscription.queue.empty()):
+                        try:
+                            event = await asyncio.wait_for(subscription.queue.get(), settings.CHANGE_STREAM_KEEPALIVE)
+                        except asyncio.TimeoutError:
+                            event = KEEPALIVE
+                        yield event
+                finally:
+                    self.subscriptions.discard(subscription)
+                position = subscription.position
+        finally:
+            self.streams -= 1
+
+
+def get_change_broker():
+    """The change broker of the running event loop"""
+    loop = asyncio.get_running_loop()
+    broker = _brokers.get(loop)
+    if broker is None:
+        broker = _brokers[loop] = ChangeBroker()
+    return broker
@@ -1,8 +1,247 @@
-from django.db import transaction
+from django.conf import settings
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db import connection, connections, router, transaction
+from django.db.models import Avg, Count, F, Min, Value
+from django.db.models.signals import post_delete, post_save
+from django.db.models.functions import Coalesce, Concat
 from django.core.exceptions import ValidationError
-from .models import Character, Film, Starship
+from django.utils import timezone
+from .models import (
+    Character, Film, Starship, Change, ChangeLogPruning, FilmStats, StarshipClassStats, NumericShadowFieldsMixin, SEARCH_CONFIG,
+)
+from .cache_utils import batch_cache_invalidation, invalidate_cache_for_model
+from .metrics import instrument_dao
+from .graph import update_graph
+from .autocomplete import TYPE_NAMES, update_autocomplete
 
 
+def _bulk_set_relation(objects, relation_name, related_lists, replace=False):
+    """
+    Set a many-to-many relation of several objects with one DELETE and one INSERT
+    on the through table. related_lists holds model instances or ids, aligned with objects.
+    """
+    if not objects:
+        return
+    field = type(objects[0])._meta.get_field(relation_name)
+    through = field.remote_field.through
+    source = f'{field.m2m_field_name()}_id'
+    target = f'{field.m2m_reverse_field_name()}_id'
+
+    if replace:
+        through.objects.filter(**{f'{source}__in': [obj.pk for obj in objects]}).delete()
+    pairs = [
+        (obj.pk, getattr(related, 'pk', related))
+        for obj, related_list in zip(objects, related_lists)
+        for related in related_list
+    ]
+    through.objects.bulk_create([through(**{source: pk, target: related_pk}) for pk, related_pk in pairs],
+                                ignore_conflicts=True)
+    # The through table is written directly, without m2m_changed: publish the (film, character) memberships
+    if through is Character.films.through:
+        cleared = [obj.pk for obj in objects] if replace else []
+        added = [(film_id, character_id) for character_id, film_id in pairs]
+        transaction.on_commit(lambda: update_graph(added=added, cleared_characters=cleared))
+
+
+def _refresh_relation_counters(objects, relation_names):
+    """
+    Read back the counters of the given relations, written by the through table triggers
+    after the objects were loaded (see RelationCountersMixin), with one SELECT.
+    """
+    counters = [type(objects[0]).relation_counters[name] for name in relation_names] if objects else []
+    if not counters:
+        return
+    model = type(objects[0])
+    rows = (model.objects.using(objects[0]._state.db).filter(pk__in=[obj.pk for obj in objects])
+            .values_list('pk', *counters))
+    values = {row[0]: row[1:] for row in rows}
+    for obj in objects:
+        for counter, value in zip(counters, values[obj.pk]):
+            setattr(obj, counter, value)
+
+
+def _publish_names(objects):
+    """bulk_create() and bulk_update() skip post_save, publish the names to the autocomplete indexes"""
+    changes = [(TYPE_NAMES[type(obj)], obj.pk, obj.name) for obj in objects]
+    transaction.on_commit(lambda: update_autocomplete(changes))
+
+
+def _bulk_create(model, data_list, relation_names=()):
+    """Create several objects with one INSERT, plus one INSERT per relation"""
+    with batch_cache_invalidation(), transaction.atomic():
+        relations = {
+            name: [data.pop(name, []) for data in data_list]
+            for name in relation_names
+        }
+        objects = [model(**data) for data in data_list]
+        # bulk_create() skips save(), refresh the numeric shadow columns here
+        for obj in objects:
+            if isinstance(obj, NumericShadowFieldsMixin):
+                obj.update_numeric_fields()
+        objects = model.objects.bulk_create(objects)
+        for name, related_lists in relations.items():
+            _bulk_set_relation(objects, name, related_lists)
+        _refresh_relation_counters(objects, relations)
+        invalidate_cache_for_model(model._meta.model_name)
+        _publish_names(objects)
+        return objects
+
+
+def _bulk_update(model, updates, relation_names=()):
+    """
+    Update several objects, updates is a list of (id, data) pairs.
+    Uses one UPDATE for the columns and replaces each given relation in bulk.
+    """
+    with batch_cache_invalidation(), transaction.atomic():
+        objects = model.objects.in_bulk([object_id for object_id, _ in updates])
+        missing = [object_id for object_id, _ in updates if object_id not in objects]
+        if missing:
+            raise ValidationError(f"{model.__name__} not found: {missing}")
+
+        # bulk_update() skips auto_now, so set edited explicitly
+        now = timezone.now()
+        columns = {'edited'}
+        relations = {}
+        for object_id, data in updates:
+            obj = objects[object_id]
+            for key, value in data.items():
+                if key in relation_names:
+                    relations.setdefault(key, {})[object_id] = value
+                else:
+                    setattr(obj, key, value)
+                    columns.add(key)
+            obj.edited = now
+            if isinstance(obj, NumericShadowFieldsMixin):
+                numeric_values = obj.parse_numeric_fields(data)
+                for key, value in numeric_values.items():
+                    setattr(obj, key, value)
+                columns.update(numeric_values)
+
+        updated = [objects[object_id] for object_id in dict(updates)]
+        model.objects.bulk_update(updated, sorted(columns))
+        for name, related_by_id in relations.items():
+            _bulk_set_relation(
+                [objects[object_id] for object_id in related_by_id],
+                name,
+                list(related_by_id.values()),
+                replace=True,
+            )
+        _refresh_relation_counters(updated, relations)
+        invalidate_cache_for_model(model._meta.model_name)
+        if 'name' in columns:
+            _publish_names(updated)
+        return updated
+
+
+def _bulk_delete(model, ids):
+    """
+    Delete several objects with one DELETE RETURNING their rows, their through table rows
+    are deleted by the database (migration 0010). post_delete is sent with each deleted
+    row, as by _delete(), the cache invalidations being coalesced into one.
+    Returns the set of ids that existed and were deleted.
+    """
+    ids = [model._meta.pk.to_python(object_id) for object_id in ids]
+    if not ids:
+        return set()
+    using = router.db_for_write(model)
+    db = connections[using]
+    fields = _returned_fields(model)
+    with batch_cache_invalidation(), transaction.atomic(using=using):
+        with db.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {model._meta.db_table} WHERE id = ANY(%s) '
+                f'RETURNING {", ".join(db.ops.quote_name(field.column) for field in fields)}',
+                [ids],
+            )
+            rows = cursor.fetchall()
+        attnames = [field.attname for field in fields]
+        for row in rows:
+            obj = model.from_db(using, attnames, row)
+            post_delete.send(sender=model, instance=obj, using=using, origin=obj)
+        return {row[attnames.index(model._meta.pk.attname)] for row in rows}
+
+
+def _returned_fields(model):
+    """Columns read back by the single statement writes, the generated search_vector is left deferred"""
+    return [field for field in model._meta.concrete_fields if not field.generated]
+
+
+def _update(model, object_id, data, relation_names=()):
+    """
+    Update one object with a single UPDATE of the given columns, edited and their numeric
+    shadows, RETURNING the row, instead of get() and a save() of every column. The given
+    relations are replaced with set() and their counters read back. post_save is sent
+    with update_fields, as by save(update_fields=...). Returns None when the object
+    does not exist.
+    """
+    data = dict(data)
+    relations = {name: data.pop(name) for name in relation_names if name in data}
+    values = {**data, 'edited': timezone.now()}
+    if issubclass(model, NumericShadowFieldsMixin):
+        values.update(model.parse_numeric_fields(data))
+
+    using = router.db_for_write(model)
+    db = connections[using]
+    columns, params = [], []
+    for name, value in values.items():
+        field = model._meta.get_field(name)
+        columns.append(f'{db.ops.quote_name(field.column)} = %s')
+        params.append(field.get_db_prep_save(value, db))
+    fields = _returned_fields(model)
+    with transaction.atomic(using=using):
+        with db.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {model._meta.db_table} SET {", ".join(columns)} WHERE id = %s '
+                f'RETURNING {", ".join(db.ops.quote_name(field.column) for field in fields)}',
+                params + [model._meta.pk.to_python(object_id)],
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        obj = model.from_db(using, [field.attname for field in fields], row)
+        for name, related in relations.items():
+            getattr(obj, name).set(related)
+        _refresh_relation_counters([obj], relations)
+        post_save.send(
+            sender=model, instance=obj, created=False, update_fields=frozenset(values), raw=False, using=using,
+        )
+        return obj
+
+
+def _delete(model, object_id):
+    """
+    Delete one object with a single DELETE RETURNING the row, instead of get() and
+    Django's collector: the through table rows are deleted by the database (migration
+    0010). post_delete is sent with the deleted row. Returns False when it did not exist.
+    """
+    using = router.db_for_write(model)
+    db = connections[using]
+    fields = _returned_fields(model)
+    with transaction.atomic(using=using):
+        with db.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {model._meta.db_table} WHERE id = %s '
+                f'RETURNING {", ".join(db.ops.quote_name(field.column) for field in fields)}',
+                [model._meta.pk.to_python(object_id)],
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return False
+        obj = model.from_db(using, [field.attname for field in fields], row)
+        post_delete.send(sender=model, instance=obj, using=using, origin=obj)
+        return True
+
+
+async def _afetch(queryset, start=0, stop=None):
+    """Read the rows start:stop of a queryset with the async ORM, prefetches included"""
+    if start or stop is not None:
+        queryset = queryset[start:stop]
+    # One chunk for a page, so that the prefetches run once
+    chunk_size = stop - start if stop is not None else 2000
+    return [obj async for obj in queryset.aiterator(chunk_size=max(chunk_size, 1))]
+
+
+@instrument_dao
 class CharacterDAO:
     """Data Access Object for Character model"""
     
@@ -35,11 +274,41 @@ class CharacterDAO:
         """List all characters"""
         return Character.objects.all()
     
+    @staticmethod
+    def get_character_names(character_ids):
+        """Map the given character ids to their names, missing ids are left out"""
+        return dict(Character.objects.filter(id__in=character_ids).values_list('id', 'name'))
+    
     @staticmethod
     def search_characters_by_name(name):
         """Search characters by name (case-insensitive partial match)"""
         return Character.objects.filter(name__icontains=name)
     
+    @staticmethod
+    async def aget_character_by_id(character_id, queryset=None):
+        """Get a character by ID with the async ORM, queryset restricts the columns and prefetches"""
+        queryset = Character.objects.all() if queryset is None else queryset
+        try:
+            return await queryset.aget(id=character_id)
+        except Character.DoesNotExist:
+            return None
+    
+    @staticmethod
+    async def alist_characters(queryset=None, start=0, stop=None):
+        """List the characters start:stop of queryset (all characters by default) with the async ORM"""
+        return await _afetch(Character.objects.all() if queryset is None else queryset, start, stop)
+    
+    @staticmethod
+    async def acount_characters(queryset=None):
+        """Count the characters of queryset (all characters by default) with the async ORM"""
+        return await (Character.objects.all() if queryset is None else queryset).acount()
+    
+    @staticmethod
+    async def asearch_characters_by_name(name, queryset=None):
+        """Search characters by name (case-insensitive partial match) with the async ORM"""
+        queryset = Character.objects.all() if queryset is None else queryset
+        return await _afetch(queryset.filter(name__icontains=name))
+    
     @staticmethod
     def create_character(data):
         """Create a new character"""
@@ -48,6 +317,7 @@ class CharacterDAO:
             character = Character.objects.create(**data)
             if films_data:
                 character.films.set(films_data)
+                _refresh_relation_counters([character], ['films'])
             return character
         except ValidationError as e:
             raise e
@@ -58,17 +328,34 @@ class CharacterDAO:
     def update_character(character_id, data):
         """Update an existing character"""
         try:
-            character = Character.objects.get(id=character_id)
-            for key, value in data.items():
-                setattr(character, key, value)
-            character.save()
-            return character
-        except Character.DoesNotExist:
-            raise ValidationError("Character not found")
+            character = _update(Character, character_id, data, relation_names=('films',))
         except ValidationError as e:
             raise e
         except Exception as e:
             raise ValidationError(f"Error updating character: {str(e)}")
+        if character is None:
+            raise ValidationError("Character not found")
+        return character
+    
+    @staticmethod
+    def bulk_create_characters(data_list):
+        """Create several characters and their films in one transaction"""
+        try:
+            return _bulk_create(Character, data_list, relation_names=('films',))
+        except ValidationError as e:
+            raise e
+        except Exception as e:
+            raise ValidationError(f"Error creating characters: {str(e)}")
+    
+    @staticmethod
+    def bulk_update_characters(updates):
+        """Update several characters in one transaction, updates is a list of (character_id, data)"""
+        try:
+            return _bulk_update(Character, updates, relation_names=('films',))
+        except ValidationError as e:
+            raise e
+        except Exception as e:
+            raise ValidationError(f"Error updating characters: {str(e)}")
     
     @staticmethod
     def set_character_films(character_id, films):
@@ -85,14 +372,15 @@ class CharacterDAO:
     @staticmethod
     def delete_character(character_id):
         """Delete a character"""
-        try:
-            character = Character.objects.get(id=character_id)
-            character.delete()
-            return True
-        except Character.DoesNotExist:
-            return False
+        return _delete(Character, character_id)
+    
+    @staticmethod
+    def bulk_delete_characters(character_ids):
+        """Delete several characters, returns the ids that were deleted"""
+        return _bulk_delete(Character, character_ids)
 
 
+@instrument_dao
 class FilmDAO:
     """Data Access Object for Film model"""
     
@@ -138,6 +426,31 @@ class FilmDAO:
         """Search films by name (case-insensitive partial match)"""
         return Film.objects.filter(name__icontains=name)
     
+    @staticmethod
+    async def aget_film_by_id(film_id, queryset=None):
+        """Get a film by ID with the async ORM, queryset restricts the columns and prefetches"""
+        queryset = Film.objects.all() if queryset is None else queryset
+        try:
+            return await queryset.aget(id=film_id)
+        except Film.DoesNotExist:
+            return None
+    
+    @staticmethod
+    async def alist_films(queryset=None, start=0, stop=None):
+        """List the films start:stop of queryset (all films by default) with the async ORM"""
+        return await _afetch(Film.objects.all() if queryset is None else queryset, start, stop)
+    
+    @staticmethod
+    async def acount_films(queryset=None):
+        """Count the films of queryset (all films by default) with the async ORM"""
+        return await (Film.objects.all() if queryset is None else queryset).acount()
+    
+    @staticmethod
+    async def asearch_films_by_name(name, queryset=None):
+        """Search films by name (case-insensitive partial match) with the async ORM"""
+        queryset = Film.objects.all() if queryset is None else queryset
+        return await _afetch(queryset.filter(name__icontains=name))
+    
     @staticmethod
     def create_film(data):
         """Create a new film"""
@@ -153,29 +466,47 @@ class FilmDAO:
     def update_film(film_id, data):
         """Update an existing film"""
         try:
-            film = Film.objects.get(id=film_id)
-            for key, value in data.items():
-                setattr(film, key, value)
-            film.save()
-            return film
-        except Film.DoesNotExist:
-            raise ValidationError("Film not found")
+            film = _update(Film, film_id, data)
         except ValidationError as e:
             raise e
         except Exception as e:
             raise ValidationError(f"Error updating film: {str(e)}")
+        if film is None:
+            raise ValidationError("Film not found")
+        return film
+    
+    @staticmethod
+    def bulk_create_films(data_list):
+        """Create several films in one transaction"""
+        try:
+            return _bulk_create(Film, data_list)
+        except ValidationError as e:
+            raise e
+        except Exception as e:
+            raise ValidationError(f"Error creating films: {str(e)}")
+    
+    @staticmethod
+    def bulk_update_films(updates):
+        """Update several films in one transaction, updates is a list of (film_id, data)"""
+        try:
+            return _bulk_update(Film, updates)
+        except ValidationError as e:
+            raise e
+        except Exception as e:
+            raise ValidationError(f"Error updating films: {str(e)}")
     
     @staticmethod
     def delete_film(film_id):
         """Delete a film"""
-        try:
-            film = Film.objects.get(id=film_id)
-            film.delete()
-            return True
-        except Film.DoesNotExist:
-            return False
+        return _delete(Film, film_id)
+    
+    @staticmethod
+    def bulk_delete_films(film_ids):
+        """Delete several films, returns the ids that were deleted"""
+        return _bulk_delete(Film, film_ids)
 
 
+@instrument_dao
 class StarshipDAO:
     """Data Access Object for Starship model"""
     
@@ -213,6 +544,31 @@ class StarshipDAO:
         """Search starships by name (case-insensitive partial match)"""
         return Starship.objects.filter(name__icontains=name)
     
+    @staticmethod
+    async def aget_starship_by_id(starship_id, queryset=None):
+        """Get a starship by ID with the async ORM, queryset restricts the columns and prefetches"""
+        queryset = Starship.objects.all() if queryset is None else queryset
+        try:
+            return await queryset.aget(id=starship_id)
+        except Starship.DoesNotExist:
+            return None
+    
+    @staticmethod
+    async def alist_starships(queryset=None, start=0, stop=None):
+        """List the starships start:stop of queryset (all starships by default) with the async ORM"""
+        return await _afetch(Starship.objects.all() if queryset is None else queryset, start, stop)
+    
+    @staticmethod
+    async def acount_starships(queryset=None):
+        """Count the starships of queryset (all starships by default) with the async ORM"""
+        return await (Starship.objects.all() if queryset is None else queryset).acount()
+    
+    @staticmethod
+    async def asearch_starships_by_name(name, queryset=None):
+        """Search starships by name (case-insensitive partial match) with the async ORM"""
+        queryset = Starship.objects.all() if queryset is None else queryset
+        return await _afetch(queryset.filter(name__icontains=name))
+    
     @staticmethod
     def create_starship(data):
         """Create a new starship"""
@@ -228,17 +584,34 @@ class StarshipDAO:
     def update_starship(starship_id, data):
         """Update an existing starship"""
         try:
-            starship = Starship.objects.get(id=starship_id)
-            for key, value in data.items():
-                setattr(starship, key, value)
-            starship.save()
-            return starship
-        except Starship.DoesNotExist:
-            raise ValidationError("Starship not found")
+            starship = _update(Starship, starship_id, data, relation_names=('films', 'pilots'))
         except ValidationError as e:
             raise e
         except Exception as e:
             raise ValidationError(f"Error updating starship: {str(e)}")
+        if starship is None:
+            raise ValidationError("Starship not found")
+        return starship
+    
+    @staticmethod
+    def bulk_create_starships(data_list):
+        """Create several starships and their films and pilots in one transaction"""
+        try:
+            return _bulk_create(Starship, data_list, relation_names=('films', 'pilots'))
+        except ValidationError as e:
+            raise e
+        except Exception as e:
+            raise ValidationError(f"Error creating starships: {str(e)}")
+    
+    @staticmethod
+    def bulk_update_starships(updates):
+        """Update several starships in one transaction, updates is a list of (starship_id, data)"""
+        try:
+            return _bulk_update(Starship, updates, relation_names=('films', 'pilots'))
+        except ValidationError as e:
+            raise e
+        except Exception as e:
+            raise ValidationError(f"Error updating starships: {str(e)}")
     
     @staticmethod
     def set_starship_films(starship_id, films):
@@ -267,9 +640,225 @@ class StarshipDAO:
     @staticmethod
     def delete_starship(starship_id):
         """Delete a starship"""
-        try:
-            starship = Starship.objects.get(id=starship_id)
-            starship.delete()
-            return True
-        except Starship.DoesNotExist:
-            return False
\ No newline at end of file
+        return _delete(Starship, starship_id)
+    
+    @staticmethod
+    def bulk_delete_starships(starship_ids):
+        """Delete several starships, returns the ids that were deleted"""
+        return _bulk_delete(Starship, starship_ids)
+
+
+
+@instrument_dao
+class StatsDAO:
+    """
+    Data Access Object for the aggregate statistics. The cheap ones are computed on
+    every call, the per film and per starship class ones are read from materialized
+    views (FilmStats, StarshipClassStats) refreshed after the data population.
+    """
+    
+    MATERIALIZED_VIEWS = (FilmStats._meta.db_table, StarshipClassStats._meta.db_table)
+    
+    @staticmethod
+    def get_overview():
+        """Totals of the three models and average relation sizes"""
+        pilots = Character.objects.filter(starship_count__gt=0)
+        return {
+            'characters': Character.objects.count(),
+            'films': Film.objects.count(),
+            'starships': Starship.objects.count(),
+            **Character.objects.aggregate(avg_films_per_character=Avg('film_count')),
+            **pilots.aggregate(pilots=Count('id'), avg_starships_per_pilot=Avg('starship_count')),
+        }
+    
+    @staticmethod
+    def list_pilot_stats():
+        """Number of starships of every pilot, most starships first"""
+        return (
+            Character.objects.filter(starship_count__gt=0)
+            .order_by('-starship_count', 'name')
+            .values('id', 'name', 'starship_count')
+        )
+    
+    @staticmethod
+    def list_film_stats():
+        """Characters, starships and pilots per film, as of the last refresh"""
+        return FilmStats.objects.values()
+    
+    @staticmethod
+    def list_starship_class_stats():
+        """Starship count and averages per starship class, as of the last refresh"""
+        return StarshipClassStats.objects.values()
+    
+    @staticmethod
+    def refresh_materialized_views(concurrently=True):
+        """
+        Recompute the materialized views. CONCURRENTLY keeps them readable during the
+        refresh, at the price of a slower refresh.
+        """
+        with connection.cursor() as cursor:
+            for view in StatsDAO.MATERIALIZED_VIEWS:
+                cursor.execute(f"REFRESH MATERIALIZED VIEW {'CONCURRENTLY ' if concurrently else ''}{view}")
+        invalidate_cache_for_model('stats')
+
+
+@instrument_dao
+class SearchDAO:
+    """
+    Data Access Object for the full-text search over the search_vector columns of the
+    films, characters and starships (GIN indexed). Queries use the websearch syntax:
+    "quoted phrases", OR and -excluded words.
+    """
+    
+    # Model and text fields shown, with the matches highlighted, in the headline of a result
+    MODELS = {
+        'films': (Film, ['name', 'opening_crawl']),
+        'characters': (Character, ['name', 'homeworld']),
+        'starships': (Starship, ['name', 'model', 'manufacturer', 'starship_class']),
+    }
+    
+    @staticmethod
+    def _headline_document(fields):
+        parts = []
+        for field in fields:
+            parts += [Coalesce(field, Value('')), Value(' ')]
+        return Concat(*parts[:-1]) if len(parts) > 2 else parts[0]
+    
+    @staticmethod
+    def search_model(name, text, limit):
+        """
+        Best matches of one model, as dicts with id, name, rank and headline. Only the first
+        SEARCH_MAX_CANDIDATES matches found by the index are ranked, so that very common words
+        do not rank millions of rows.
+        """
+        model, headline_fields = SearchDAO.MODELS[name]
+        query = SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+        # Without the default ordering, the scan stops after SEARCH_MAX_CANDIDATES matches
+        candidates = (
+            model.objects.filter(search_vector=query).order_by().values('pk')[:settings.SEARCH_MAX_CANDIDATES]
+        )
+        # The headlines are computed after the LIMIT, for the returned rows only
+        return list(
+            model.objects.filter(pk__in=candidates)
+            .annotate(
+                rank=SearchRank(F('search_vector'), query),
+                headline=SearchHeadline(
+                    SearchDAO._headline_document(headline_fields), query, config=SEARCH_CONFIG,
+                    start_sel='<mark>', stop_sel='</mark>', max_fragments=2,
+                ),
+            )
+            .order_by('-rank', 'pk')
+            .values('id', 'name', 'rank', 'headline')[:limit]
+        )
+    
+    @staticmethod
+    def search(text, names=None, limit=20):
+        """Best matches over the given models (all by default), best rank first"""
+        results = []
+        for name in names or SearchDAO.MODELS:
+            results += [{'type': name, **row} for row in SearchDAO.search_model(name, text, limit)]
+        results.sort(key=lambda result: -result['rank'])
+        return results[:limit]
+
+
+@instrument_dao
+class ChangesDAO:
+    """
+    Data Access Object for the change log (see Change). A position in the log is a
+    (txid, id) pair, the entries are read after one in that order. Only the entries of
+    the transactions older than the oldest one still running are read: they are all
+    finished, no entry can show up before a position once it has been returned.
+    Pass the same database alias to every call of a request, the replicas may lag
+    behind each other.
+    """
+    
+    @staticmethod
+    def horizon(using):
+        """Transaction id below which every transaction has finished"""
+        with connections[using].cursor() as cursor:
+            cursor.execute('SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint')
+            return cursor.fetchone()[0]
+    
+    @staticmethod
+    def current_position(using):
+        """Position of the end of the log, to follow it from now on"""
+        return ChangesDAO.horizon(using), 0
+    
+    @staticmethod
+    def pruning(using):
+        """ChangeLogPruning of the last pruning of the log, None when it was never pruned"""
+        return ChangeLogPruning.objects.using(using).first()
+    
+    @staticmethod
+    def is_pruned(using, position=None, timestamp=None):
+        """True when entries after position, or logged from timestamp on, were pruned from the log"""
+        pruning = ChangesDAO.pruning(using)
+        if pruning is None:
+            return False
+        if position is not None:
+            return tuple(position) < pruning.position
+        return timestamp < pruning.before
+    
+    @staticmethod
+    def prune_changes(before, batch_size=10000):
+        """
+        Delete the entries logged before `before`, batch_size per transaction so that the
+        table is not locked for long, and record the newest one deleted in ChangeLogPruning.
+        Returns the number of entries deleted.
+        """
+        table = Change._meta.db_table
+        deleted = 0
+        while True:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE id IN ('
+                    f'SELECT id FROM {table} WHERE changed_at < %s ORDER BY changed_at LIMIT %s'
+                    f') RETURNING txid, id',
+                    [before, batch_size],
+                )
+                rows = cursor.fetchall()
+                if rows:
+                    newest = max(rows)
+                    pruning = ChangeLogPruning.objects.select_for_update().first()
+                    if pruning is None:
+                        pruning = ChangeLogPruning(txid=newest[0], change_id=newest[1], before=before)
+                    elif newest > pruning.position:
+                        pruning.txid, pruning.change_id = newest
+                    pruning.before = max(pruning.before, before)
+                    pruning.save()
+            deleted += len(rows)
+            if len(rows) < batch_size:
+                return deleted
+    
+    @staticmethod
+    def position_at(timestamp, using):
+        """Position before the entries logged from timestamp on, and maybe some older ones"""
+        txid = Change.objects.using(using).filter(changed_at__gte=timestamp).aggregate(txid=Min('txid'))['txid']
+        if txid is None:
+            return ChangesDAO.current_position(using)
+        return txid, 0
+    
+    @staticmethod
+    def list_changes(after, limit, using, coalesce=True):
+        """
+        Up to limit entries after the position `after`, only the last entry of each row
+        with coalesce, and the position to continue from. Returns (entries, position, has_more).
+        """
+        txid, change_id = after
+        horizon = ChangesDAO.horizon(using)
+        entries = list(
+            Change.objects.using(using)
+            .filter(txid__gte=txid, txid__lt=horizon)
+            .exclude(txid=txid, id__lte=change_id)
+            .order_by('txid', 'id')[:limit]
+        )
+        has_more = len(entries) == limit
+        if has_more:
+            position = (entries[-1].txid, entries[-1].id)
+        else:
+            # Never backwards, another replica may be further behind
+            position = max((horizon, 0), tuple(after))
+        if not coalesce:
+            return entries, position, has_more
+        latest = {(entry.object_type, entry.object_id): entry for entry in entries}
+        return sorted(latest.values(), key=lambda entry: (entry.txid, entry.id)), position, has_more
@@ -0,0 +1,73 @@
+"""
+Primary/replica database routing.
+
+Reads go to one of the DATABASE_REPLICAS aliases only inside a read-only context, opened by
+ReplicaPinningMiddleware for the GET requests of clients that didn't write recently. The
+replica is picked once per context, so that the count, the page and the prefetches of a
+request read the same replica, whatever its lag.
+Everything else (writes, Celery tasks, management commands, requests after a write)
+uses the primary. The first write of a context switches its remaining reads to the
+primary too, so a request always reads its own writes.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+
+PRIMARY = 'default'
+
+# Replica the reads of the current context go to, None for the primary
+_replica = ContextVar('replica', default=None)
+# True once the current context wrote to the primary, None outside of replica_reads() blocks
+_wrote = ContextVar('wrote', default=None)
+
+
+def read_alias():
+    """Database alias the reads of the current context go to"""
+    return _replica.get() or PRIMARY
+
+
+def wrote():
+    """Whether the current replica_reads() block wrote to the database"""
+    return bool(_wrote.get())
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Allow (or forbid) the reads of the block to use one of the replicas"""
+    replicas = settings.DATABASE_REPLICAS
+    replica_token = _replica.set(random.choice(replicas) if enabled and replicas else None)
+    wrote_token = _wrote.set(False)
+    try:
+        yield
+    finally:
+        _wrote.reset(wrote_token)
+        _replica.reset(replica_token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Database router sending the reads to read_alias() and the writes to the primary.
+    The replicas are copies of the primary, relations between them are allowed and
+    migrations only run on the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        # Related objects are read from the database of the instance, like Django's default routing
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        if _wrote.get() is False:
+            _replica.set(None)
+            _wrote.set(True)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *settings.DATABASE_REPLICAS}
+        return obj1._state.db in databases and obj2._state.db in databases
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
@@ -0,0 +1,27 @@
+import csv
+from .renderers import FastJSONRenderer
+
+
+class _Echo:
+    """Pseudo buffer for csv.writer, returns the written line instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def ndjson_lines(rows):
+    """Yield each row as one line of JSON"""
+    renderer = FastJSONRenderer()
+    for row in rows:
+        yield renderer.render(row) + b'\n'
+
+
+def csv_lines(rows, header):
+    """Yield a CSV header line and then one line per row, lists are joined with commas"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([
+            ','.join(str(item) for item in row[column]) if isinstance(row[column], list) else row[column]
+            for column in header
+        ])
@@ -0,0 +1,58 @@
+from django_filters import rest_framework as filters
+from .models import Character, Film, Starship
+
+
+RANGE_LOOKUPS = ('gt', 'gte', 'lt', 'lte')
+
+
+class NumericRangeFilterSet(filters.FilterSet):
+    """
+    FilterSet adding <field>__gt/gte/lt/lte filters for the text quantities of the model,
+    e.g. ?cost_in_credits__gte=100000. The filters run on the indexed numeric shadow
+    columns (see NumericShadowFieldsMixin). The `ordering` parameter sorts on those
+    columns too, so ?ordering=-cost_in_credits is a numeric sort. The relation counters
+    (see RelationCountersMixin) get exact and range filters and are orderable as well,
+    e.g. ?film_count__gte=3&ordering=-pilot_count.
+    """
+    ordering_fields = ('name',)
+
+    @classmethod
+    def get_filters(cls):
+        filters_ = super().get_filters()
+        numeric_fields = getattr(cls._meta.model, 'numeric_fields', {})
+        for source, target in numeric_fields.items():
+            for lookup in RANGE_LOOKUPS:
+                filters_[f'{source}__{lookup}'] = filters.NumberFilter(field_name=target, lookup_expr=lookup)
+        counters = list(getattr(cls._meta.model, 'relation_counters', {}).values())
+        for counter in counters:
+            filters_[counter] = filters.NumberFilter(field_name=counter)
+            for lookup in RANGE_LOOKUPS:
+                filters_[f'{counter}__{lookup}'] = filters.NumberFilter(field_name=counter, lookup_expr=lookup)
+
+        ordering = [(field, field) for field in cls.ordering_fields]
+        ordering += [(target, source) for source, target in numeric_fields.items()]
+        ordering += [(counter, counter) for counter in counters]
+        filters_['ordering'] = filters.OrderingFilter(fields=ordering)
+        return filters_
+
+
+class CharacterFilter(NumericRangeFilterSet):
+    class Meta:
+        model = Character
+        fields = ['name']
+
+
+class FilmFilter(NumericRangeFilterSet):
+    ordering_fields = ('name', 'episode_id', 'release_date')
+
+    class Meta:
+        model = Film
+        fields = ['name']
+
+
+class StarshipFilter(NumericRangeFilterSet):
+    ordering_fields = ('name', 'model')
+
+    class Meta:
+        model = Starship
+        fields = ['name', 'model']
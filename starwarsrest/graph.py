@@ -0,0 +1,388 @@
+"""
+Character co-appearance graph: two characters are linked when they appear in the same
+film, the weight of the link being the number of films they share.
+
+The graph is kept in memory in CSR form (compressed sparse rows): the neighbours of the
+character at position i are indices[indptr[i]:indptr[i + 1]], sorted by decreasing
+weight, so that the neighbours, the top co-stars and the shortest paths are answered
+without touching the database. Films of more than GRAPH_MAX_FILM_SIZE characters would
+add the square of their size to the arrays, they are kept as sets of members instead and
+walked at query time.
+
+Every process builds its own copy from the Character.films through table. m2m_changed,
+the deletions and the bulk relation writes apply the film membership changes once the
+transaction commits: only the rows of the characters that joined or left a film are
+adjusted, against the other members of that film, and the change is published through
+the `graph` cache under an increasing version number, the other processes replay it.
+The graph is rebuilt once the adjustments outgrow a tenth of the arrays, or for every
+process after invalidate_graph() (synthetic data generation). Only the first build
+blocks, the rebuilds run in a background thread and the queries are answered from the
+previous graph until the new one is swapped in.
+"""
+import copy
+import heapq
+import logging
+import threading
+from array import array
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connections
+from .models import Character
+
+logger = logging.getLogger(__name__)
+
+GRAPH_CACHE_ALIAS = 'graph'
+VERSION_KEY = 'version'
+# Past this many versions behind, a process rebuilds its graph instead of replaying the changes
+MAX_REPLAY = 1000
+# Changes are kept long enough for every process to replay them
+CHANGE_TIMEOUT = 3600
+
+# (graph, version) of this process
+_state = (None, None)
+_lock = threading.Lock()
+# Thread rebuilding the graph of this process, if any
+_rebuilding = None
+
+
+def _ranked(link):
+    """Sort key of (character id, weight): heaviest links first, ties by id so that the order is stable"""
+    return -link[1], link[0]
+
+
+class CoAppearanceGraph:
+    """
+    Co-appearance graph built from {film_id: set of character ids}, immutable:
+    changed() returns a new graph sharing the CSR arrays.
+    """
+
+    def __init__(self, memberships, max_film_size=None):
+        if max_film_size is None:
+            max_film_size = settings.GRAPH_MAX_FILM_SIZE
+        self.memberships = {film_id: frozenset(members) for film_id, members in memberships.items() if members}
+        # Films walked at query time instead of being expanded into the arrays, and their ids per member
+        self.large_films = frozenset(
+            film_id for film_id, members in self.memberships.items() if len(members) > max_film_size
+        )
+        self.large_film_index = defaultdict(list)
+        for film_id in self.large_films:
+            for character_id in self.memberships[film_id]:
+                self.large_film_index[character_id].append(film_id)
+        self.large_film_index.default_factory = None
+
+        weights = defaultdict(Counter)
+        for film_id, members in self.memberships.items():
+            if film_id in self.large_films:
+                continue
+            for character_id in members:
+                row = weights[character_id]
+                for other_id in members:
+                    if other_id != character_id:
+                        row[other_id] += 1
+
+        self.ids = array('q', sorted(weights))
+        self.positions = {character_id: position for position, character_id in enumerate(self.ids)}
+        self.indptr = array('q', [0])
+        self.indices = array('q')
+        self.weights = array('l')
+        for character_id in self.ids:
+            for other_id, weight in sorted(weights[character_id].items(), key=_ranked):
+                self.indices.append(self.positions[other_id])
+                self.weights.append(weight)
+            self.indptr.append(len(self.indices))
+
+        # {character id: {co-star id: weight change}} and {character id: large film ids} of the
+        # changes made since the arrays and the index were built
+        self.adjustments = {}
+        self.large_film_changes = {}
+        self.adjusted_links = 0
+
+    @classmethod
+    def from_database(cls):
+        memberships = defaultdict(set)
+        through = Character.films.through
+        for film_id, character_id in through.objects.values_list('film_id', 'character_id').iterator():
+            memberships[film_id].add(character_id)
+        return cls(memberships)
+
+    def changed(self, added=(), removed=()):
+        """
+        New graph with the (film_id, character_id) memberships removed and added. Each
+        membership adjusts the rows of the character and of the other members of the film.
+        """
+        graph = copy.copy(self)
+        graph.memberships = dict(self.memberships)
+        graph.adjustments = dict(self.adjustments)
+        graph.large_film_changes = dict(self.large_film_changes)
+        copied = set()
+
+        def adjust(character_id, other_id, delta):
+            for row_id, link_id in ((character_id, other_id), (other_id, character_id)):
+                if row_id not in copied:
+                    graph.adjustments[row_id] = Counter(graph.adjustments.get(row_id, ()))
+                    copied.add(row_id)
+                row = graph.adjustments[row_id]
+                row[link_id] += delta
+                if not row[link_id]:
+                    del row[link_id]
+
+        changes = defaultdict(lambda: ([], []))
+        for film_id, character_id in removed:
+            changes[film_id][0].append(character_id)
+        for film_id, character_id in added:
+            changes[film_id][1].append(character_id)
+        for film_id, (removed_ids, added_ids) in changes.items():
+            members = set(graph.memberships.get(film_id, ()))
+            expanded = film_id not in self.large_films
+            for character_id in removed_ids:
+                if character_id in members:
+                    members.discard(character_id)
+                    if expanded:
+                        for other_id in members:
+                            adjust(character_id, other_id, -1)
+                    else:
+                        films = graph._large_films_of(character_id)
+                        graph.large_film_changes[character_id] = [f for f in films if f != film_id]
+            for character_id in added_ids:
+                if character_id not in members:
+                    if expanded:
+                        for other_id in members:
+                            adjust(character_id, other_id, 1)
+                    else:
+                        graph.large_film_changes[character_id] = graph._large_films_of(character_id) + [film_id]
+                    members.add(character_id)
+            graph.memberships[film_id] = frozenset(members)
+        graph.adjusted_links = (
+            sum(len(row) for row in graph.adjustments.values()) + len(graph.large_film_changes)
+        )
+        return graph
+
+    def is_outgrown(self):
+        """True when the adjustments hold more than a tenth of the links of the arrays"""
+        return self.adjusted_links > max(10000, (len(self.indices) + len(self.large_film_index)) // 10)
+
+    def films_of(self, character_id):
+        return [film_id for film_id, members in self.memberships.items() if character_id in members]
+
+    def _weights(self, character_id):
+        """{co-star id: shared films} of the expanded films, adjustments included"""
+        weights = Counter()
+        position = self.positions.get(character_id)
+        if position is not None:
+            for i in range(self.indptr[position], self.indptr[position + 1]):
+                weights[self.ids[self.indices[i]]] = self.weights[i]
+        weights.update(self.adjustments.get(character_id, {}))
+        return weights
+
+    def _large_films_of(self, character_id):
+        if character_id in self.large_film_changes:
+            return self.large_film_changes[character_id]
+        return self.large_film_index.get(character_id, [])
+
+    def neighbors(self, character_id, limit=None):
+        """[(character id, shared films)] of the co-stars of a character, most shared films first"""
+        position = self.positions.get(character_id)
+        large_films = self._large_films_of(character_id)
+        if not large_films and not self.adjustments.get(character_id):
+            # Straight from the arrays, already sorted
+            if position is None:
+                return []
+            start, stop = self.indptr[position], self.indptr[position + 1]
+            if limit is not None:
+                stop = min(stop, start + limit)
+            return [(self.ids[self.indices[i]], self.weights[i]) for i in range(start, stop)]
+
+        weights = self._weights(character_id)
+        for film_id in large_films:
+            weights.update(self.memberships[film_id])
+        weights.pop(character_id, None)
+        links = ((other_id, weight) for other_id, weight in weights.items() if weight > 0)
+        if limit is not None:
+            return heapq.nsmallest(limit, links, key=_ranked)
+        return sorted(links, key=_ranked)
+
+    def _links(self, character_id, walked):
+        """Ids of the co-stars of a character, each large film is only walked once per search (walked)"""
+        if self.adjustments.get(character_id):
+            yield from (other_id for other_id, weight in self._weights(character_id).items() if weight > 0)
+        else:
+            position = self.positions.get(character_id)
+            if position is not None:
+                for i in range(self.indptr[position], self.indptr[position + 1]):
+                    yield self.ids[self.indices[i]]
+        if len(walked) < len(self.large_films):
+            for film_id in self._large_films_of(character_id):
+                if film_id not in walked:
+                    walked.add(film_id)
+                    yield from self.memberships[film_id]
+
+    def shortest_path(self, source_id, target_id):
+        """Character ids of a shortest chain of co-stars from source to target, None if unconnected"""
+        if source_id == target_id:
+            return [source_id]
+
+        # Bidirectional BFS, expanding the smaller frontier first
+        parents = [{source_id: None}, {target_id: None}]
+        frontiers = [[source_id], [target_id]]
+        walked = [set(), set()]
+        while frontiers[0] and frontiers[1]:
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            seen, other = parents[side], parents[1 - side]
+            next_frontier = []
+            for character_id in frontiers[side]:
+                for neighbor in self._links(character_id, walked[side]):
+                    if neighbor in seen:
+                        continue
+                    seen[neighbor] = character_id
+                    if neighbor in other:
+                        return self._join(parents, neighbor)
+                    next_frontier.append(neighbor)
+            frontiers[side] = next_frontier
+        return None
+
+    def _join(self, parents, meeting):
+        path = []
+        character_id = meeting
+        while character_id is not None:
+            path.append(character_id)
+            character_id = parents[0][character_id]
+        path.reverse()
+        character_id = parents[1][meeting]
+        while character_id is not None:
+            path.append(character_id)
+            character_id = parents[1][character_id]
+        return path
+
+
+def _bump_version():
+    """Increment the shared version, None when the cache can't count (e.g. DummyCache)"""
+    cache = caches[GRAPH_CACHE_ALIAS]
+    cache.add(VERSION_KEY, 0, timeout=None)
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        return None
+
+
+def _change_key(version):
+    return f'change:{version}'
+
+
+def _apply(graph, change):
+    """Graph with a change published by update_graph() applied"""
+    removed = list(change.get('removed', ()))
+    cleared_characters, cleared_films = set(change.get('cleared_characters', ())), change.get('cleared_films', ())
+    if cleared_characters:
+        removed += [
+            (film_id, character_id)
+            for film_id, members in graph.memberships.items()
+            for character_id in members & cleared_characters
+        ]
+    for film_id in cleared_films:
+        removed += [(film_id, character_id) for character_id in graph.memberships.get(film_id, ())]
+    return graph.changed(change.get('added', ()), removed)
+
+
+def _rebuild():
+    cache = caches[GRAPH_CACHE_ALIAS]
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = _bump_version()
+    # Read after the version, a concurrent change bumps it again and is replayed next time
+    return CoAppearanceGraph.from_database(), version
+
+
+def _rebuild_and_swap():
+    """Rebuild the graph and replace the one of this process, whose changes are replayed on the next query"""
+    global _state
+    try:
+        graph, version = _rebuild()
+    except DatabaseError:
+        logger.exception("Co-appearance graph not rebuilt, the previous one is still served")
+        return
+    with _lock:
+        _state = (graph, version)
+
+
+def _run_rebuild():
+    global _rebuilding
+    try:
+        _rebuild_and_swap()
+    finally:
+        _rebuilding = None
+        connections.close_all()
+
+
+def _start_rebuild():
+    """Rebuild the graph in a background thread, unless a rebuild is already running"""
+    global _rebuilding
+    with _lock:
+        if _rebuilding is not None and _rebuilding.is_alive():
+            return
+        _rebuilding = threading.Thread(target=_run_rebuild, name='graph-rebuild', daemon=True)
+        _rebuilding.start()
+
+
+def get_graph():
+    """
+    The co-appearance graph of this process, after replaying the changes of the other
+    processes. Only the first build blocks, the later rebuilds run in the background.
+    """
+    global _state
+    with _lock:
+        graph, local_version = _state
+        if graph is not None and _rebuilding is not None and _rebuilding.is_alive():
+            return graph
+        cache = caches[GRAPH_CACHE_ALIAS]
+        version = cache.get(VERSION_KEY)
+        if graph is None or local_version is None or (version is None and _bump_version() is None):
+            # First query, or a cache that can't share the changes (e.g. DummyCache), whose
+            # graph is only valid for this query
+            graph, version = _rebuild()
+            _state = (graph, version)
+            return graph
+        if version is not None and version > local_version:
+            keys = [_change_key(v) for v in range(local_version + 1, version + 1)]
+            changes = cache.get_many(keys) if len(keys) <= MAX_REPLAY else {}
+            # A missing change is an invalidation or an evicted entry, both need a rebuild
+            if len(changes) == len(keys):
+                for key in keys:
+                    graph = _apply(graph, changes[key])
+                local_version = version
+        stale = version is None or version != local_version or graph.is_outgrown()
+        _state = (graph, local_version)
+    if stale:
+        _start_rebuild()
+    return graph
+
+
+def update_graph(added=(), removed=(), cleared_characters=(), cleared_films=()):
+    """
+    Apply committed membership changes to the graph of this process and publish them to
+    the other processes. cleared_characters / cleared_films remove all the memberships of
+    these characters / films, before the added ones.
+    """
+    global _state
+    change = {
+        'added': list(added), 'removed': list(removed),
+        'cleared_characters': list(cleared_characters), 'cleared_films': list(cleared_films),
+    }
+    with _lock:
+        version = _bump_version()
+        if version is None:
+            _state = (None, None)
+            return
+        caches[GRAPH_CACHE_ALIAS].set(_change_key(version), change, timeout=CHANGE_TIMEOUT)
+        graph, local_version = _state
+        if graph is not None and local_version == version - 1:
+            _state = (_apply(graph, change), version)
+
+
+def invalidate_graph():
+    """Make every process rebuild its graph from the database, each one serves its current graph meanwhile"""
+    global _state
+    with _lock:
+        # No change is stored under the new version, which forces the rebuild
+        if _bump_version() is None:
+            _state = (None, None)
@@ -0,0 +1,196 @@
+import functools
+import logging
+import time
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.urls import resolve, Resolver404
+from .metrics import REQUEST_LATENCY, RESPONSE_SIZE
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    """
+    Database execute wrapper counting the queries and summing their duration.
+    See https://docs.djangoproject.com/en/5.0/topics/db/instrumentation/
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+# QueryCounter of the current request. A context variable rather than a connection.execute_wrapper()
+# block, because under ASGI the queries run on the connections of the sync_to_async threads,
+# which are not those of the event loop thread, while the context follows the request there.
+_current_counter = ContextVar('query_counter', default=None)
+
+
+def _count_query(execute, sql, params, many, context):
+    counter = _current_counter.get()
+    if counter is None:
+        return execute(sql, params, many, context)
+    return counter(execute, sql, params, many, context)
+
+
+def _install_query_counter(connection):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+@receiver(connection_created)
+def _install_on_connect(sender, connection, **kwargs):
+    _install_query_counter(connection)
+
+
+class InstrumentationMiddleware:
+    """
+    Middleware measuring every request: number and total time of the SQL queries,
+    cache hit/miss (set by RedisCacheMiddleware), serialization (rendering) time and
+    total time. The numbers are sent back in a Server-Timing header and logged, requests
+    over QUERY_COUNT_BUDGET queries or LATENCY_BUDGET_MS milliseconds are logged as warnings.
+    Requests to the viewsets also feed the latency and response size Prometheus histograms.
+    Should be first in MIDDLEWARE so that it covers the whole stack.
+    Queries run while a streaming response is consumed are not counted.
+    Runs in sync and async mode.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        for connection in connections.all():
+            _install_query_counter(connection)
+        counter = QueryCounter()
+        token = _current_counter.set(counter)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_counter.reset(token)
+        return self._finish(request, response, counter, start)
+
+    async def __acall__(self, request):
+        # The connections of the threads running the queries get the counter when they connect
+        counter = QueryCounter()
+        token = _current_counter.set(counter)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_counter.reset(token)
+        return self._finish(request, response, counter, start)
+
+    def _finish(self, request, response, counter, start):
+        total_ms = (time.perf_counter() - start) * 1000
+
+        metrics = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': counter.count,
+            'db_ms': round(counter.duration * 1000, 2),
+            'serialize_ms': round(getattr(request, '_serialize_time', 0.0) * 1000, 2),
+            'total_ms': round(total_ms, 2),
+            'cache': getattr(request, '_cache_status', None),
+        }
+        response['Server-Timing'] = self._server_timing(metrics)
+        self._log(metrics)
+        self._observe(request, response, total_ms)
+        return response
+
+    def process_template_response(self, request, response):
+        """Time the rendering of DRF responses, which happens right after this hook"""
+        start = time.perf_counter()
+
+        def record_serialize_time(rendered_response):
+            request._serialize_time = time.perf_counter() - start
+
+        response.add_post_render_callback(record_serialize_time)
+        return response
+
+    def _observe(self, request, response, total_ms):
+        """Feed the Prometheus histograms, labelled with the viewset and its action"""
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            # Cache hits are answered before URL resolution
+            labels = _resolve_view_labels(request.path_info)
+        else:
+            labels = _view_labels(match)
+        if labels is None:
+            return
+        viewset, actions = labels
+        action = actions.get(request.method.lower(), request.method.lower())
+
+        REQUEST_LATENCY.labels(viewset, action, request.method, response.status_code).observe(total_ms / 1000)
+        if not response.streaming:
+            RESPONSE_SIZE.labels(viewset, action).observe(len(response.content))
+
+    def _server_timing(self, metrics):
+        timings = [
+            f'db;dur={metrics["db_ms"]};desc="{metrics["queries"]} queries"',
+            f'serialize;dur={metrics["serialize_ms"]}',
+            f'total;dur={metrics["total_ms"]}',
+        ]
+        if metrics['cache']:
+            timings.append(f'cache;desc="{metrics["cache"]}"')
+        return ', '.join(timings)
+
+    def _log(self, metrics):
+        over_budget = []
+        if metrics['queries'] > settings.QUERY_COUNT_BUDGET:
+            over_budget.append('queries')
+        if metrics['total_ms'] > settings.LATENCY_BUDGET_MS:
+            over_budget.append('latency')
+        metrics['over_budget'] = over_budget
+
+        if over_budget:
+            logger.warning(
+                "Request over budget (%s): %s %s queries=%d db_ms=%s total_ms=%s",
+                ','.join(over_budget), metrics['method'], metrics['path'],
+                metrics['queries'], metrics['db_ms'], metrics['total_ms'],
+                extra={'metrics': metrics},
+            )
+        elif logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "%s %s status=%s queries=%d db_ms=%s serialize_ms=%s total_ms=%s cache=%s",
+                metrics['method'], metrics['path'], metrics['status'], metrics['queries'],
+                metrics['db_ms'], metrics['serialize_ms'], metrics['total_ms'], metrics['cache'],
+                extra={'metrics': metrics},
+            )
+
+
+def _view_labels(match):
+    """(viewset name, method -> action mapping) of a resolved URL, None for other views"""
+    viewset = getattr(match.func, 'cls', None)
+    if viewset is None:
+        return None
+    return viewset.__name__, getattr(match.func, 'actions', None) or {}
+
+
+@functools.lru_cache(maxsize=1024)
+def _resolve_view_labels(path_info):
+    try:
+        return _view_labels(resolve(path_info))
+    except Resolver404:
+        return None
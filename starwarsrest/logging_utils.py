@@ -0,0 +1,87 @@
+"""
+Logging helpers for the request hot path, used from the LOGGING setting.
+
+QueueLogHandler only puts the records on an in-memory queue, a background thread
+formats them and writes them to the stream, so a request never waits on a slow
+stdout/stderr pipe. A process forked after the logging setup (Celery prefork children,
+gunicorn --preload workers) inherits the queue but not the thread, so the handler starts
+a new queue and listener in the child. Sampler keeps one call out of N for chatty per request lines.
+"""
+import atexit
+import itertools
+import logging
+import os
+import queue
+import weakref
+from logging.handlers import QueueHandler, QueueListener
+
+
+class QueueLogHandler(QueueHandler):
+    """
+    Non-blocking handler: records are queued as they are and formatted by a
+    QueueListener thread writing to `stream` (stderr by default). When the queue
+    is full the record is dropped and counted in `dropped` instead of blocking.
+    """
+
+    def __init__(self, stream=None, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.dropped = 0
+        self.target = logging.StreamHandler(stream)
+        self._start_listener()
+        atexit.register(self._stop_listener)
+        # Weak, the fork hooks can't be unregistered and would keep closed handlers alive
+        handler = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: handler() and handler()._restart_in_child())
+
+    def _start_listener(self):
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    def _restart_in_child(self):
+        # The records of the parent stay with the parent, whose listener writes them
+        if self.listener._thread is None:
+            return
+        self.queue = queue.Queue(self.queue.maxsize)
+        self.dropped = 0
+        self._start_listener()
+
+    def setFormatter(self, fmt):
+        # Formatting happens in the listener thread
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # The queue never leaves the process, so the message is formatted lazily by
+        # the listener instead of in the calling thread like QueueHandler does
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _stop_listener(self):
+        # Flushes the queued records, safe to call more than once
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def close(self):
+        self._stop_listener()
+        super().close()
+
+
+class Sampler:
+    """
+    Callable returning True once every `rate` calls. Checked before calling the logger,
+    so the sampled out calls don't even build a LogRecord:
+
+        if logger.isEnabledFor(logging.DEBUG) and sample():
+            logger.debug("Cache HIT for key: %s", key)
+    """
+
+    def __init__(self, rate=100):
+        self.rate = max(int(rate), 1)
+        self._counter = itertools.count()
+
+    def __call__(self):
+        return next(self._counter) % self.rate == 0
@@ -0,0 +1,351 @@
+import csv
+import io
+import random
+import time
+from collections import Counter
+from itertools import accumulate
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+from starwarsrest.models import Character, Film, Starship
+from starwarsrest.cache_utils import invalidate_all_cache
+from starwarsrest.dao import StatsDAO
+from starwarsrest.graph import invalidate_graph
+from starwarsrest.autocomplete import invalidate_autocomplete
+
+
+# Real SWAPI names, reused in a share of the generated names so that searches for them match
+SWAPI_CHARACTERS = [
+    'Luke Skywalker', 'C-3PO', 'R2-D2', 'Darth Vader', 'Leia Organa', 'Owen Lars', 'Obi-Wan Kenobi',
+    'Anakin Skywalker', 'Chewbacca', 'Han Solo', 'Greedo', 'Jabba Desilijic Tiure', 'Wedge Antilles',
+    'Yoda', 'Palpatine', 'Boba Fett', 'Lando Calrissian', 'Padmé Amidala', 'Qui-Gon Jinn', 'Mace Windu',
+]
+SWAPI_STARSHIPS = [
+    'Millennium Falcon', 'X-wing', 'TIE Advanced x1', 'Star Destroyer', 'Death Star', 'Y-wing',
+    'Slave 1', 'Imperial shuttle', 'A-wing', 'B-wing', 'Naboo fighter', 'Jedi starfighter',
+]
+SWAPI_FILMS = [
+    'A New Hope', 'The Empire Strikes Back', 'Return of the Jedi', 'The Phantom Menace',
+    'Attack of the Clones', 'Revenge of the Sith',
+]
+
+FIRST_NAMES = [
+    'Kel', 'Dar', 'Mira', 'Jax', 'Tova', 'Rin', 'Oma', 'Vex', 'Lira', 'Zeb', 'Nia', 'Cas', 'Tor', 'Ela',
+    'Bran', 'Sera', 'Quin', 'Hux', 'Ysa', 'Fenn', 'Kaia', 'Dex', 'Orla', 'Vito',
+]
+LAST_NAMES = [
+    'Sunrider', 'Vos', 'Tarkin', 'Ordo', 'Fett', 'Renn', 'Kast', 'Dorn', 'Syndulla', 'Bridger', 'Wren',
+    'Antilles', 'Solus', 'Mothma', 'Ventress', 'Drake', 'Korr', 'Tano', 'Vizsla', 'Marek',
+]
+GENDERS = ['male', 'female', 'n/a', 'hermaphrodite', 'none']
+HOMEWORLDS = ['Tatooine', 'Alderaan', 'Naboo', 'Coruscant', 'Kashyyyk', 'Corellia', 'Hoth', 'Endor', 'unknown']
+STARSHIP_CLASSES = [
+    'Starfighter', 'Light freighter', 'Star Destroyer', 'Transport', 'Corvette', 'Assault ship',
+    'Cruiser', 'Deep Space Mobile Battlestation', 'Patrol craft', 'Yacht',
+]
+MANUFACTURERS = ['Kuat Drive Yards', 'Incom Corporation', 'Sienar Fleet Systems', 'Corellian Engineering Corporation']
+
+
+def _zipf_cum_weights(count, skew):
+    """Cumulative weights of a Zipf distribution over count items, for random.choices()"""
+    return list(accumulate(1 / (rank + 1) ** skew for rank in range(count)))
+
+
+def _drop_indexes(tables):
+    """
+    Drop the secondary indexes and the unique and foreign key constraints of tables, return
+    the statements that recreate them. Building an index once is much cheaper than updating
+    it row by row, and the deferred foreign key checks would otherwise run one by one at commit.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = ANY(%s::regclass[]) AND contype IN ('f', 'u') ORDER BY contype",
+            [tables],
+        )
+        constraints = cursor.fetchall()
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = ANY(%s) "
+            "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE contype IN ('p', 'u'))",
+            [tables],
+        )
+        indexes = cursor.fetchall()
+        quote = connection.ops.quote_name
+        # Foreign keys first ('f' sorts before 'u'), recreated last
+        for table, name, _ in constraints:
+            cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT {quote(name)}')
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX {quote(name)}')
+    return [definition for _, definition in indexes] + [
+        f'ALTER TABLE {table} ADD CONSTRAINT {quote(name)} {definition}'
+        for table, name, definition in reversed(constraints)
+    ]
+
+
+def _set_counter_triggers(tables, enabled):
+    """
+    Enable or disable the relation counter triggers of the through tables (migration 0006).
+    The generator writes the counters of the new rows itself and recounts the related
+    rows once at the end, rather than updating them after every chunk.
+    """
+    with connection.cursor() as cursor:
+        for table in tables:
+            cursor.execute(f'ALTER TABLE {table} {"ENABLE" if enabled else "DISABLE"} TRIGGER {table}_count_insert')
+
+
+class _CopyWriter:
+    """Writes the rows of one table with PostgreSQL COPY, one COPY per chunk"""
+
+    def __init__(self, table, columns):
+        self.sql = f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)'
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def flush(self):
+        self.buffer.seek(0)
+        with connection.cursor() as cursor:
+            # psycopg2 cursor method, reached through Django's cursor wrapper
+            cursor.copy_expert(self.sql, self.buffer)
+        self.buffer.seek(0)
+        self.buffer.truncate()
+
+
+class _BulkWriter:
+    """Writes the rows of one model with bulk_create(), one INSERT per chunk"""
+
+    def __init__(self, model, columns):
+        self.model = model
+        self.columns = columns
+        self.objects = []
+
+    def write(self, rows):
+        self.objects.extend(self.model(**dict(zip(self.columns, row))) for row in rows)
+
+    def flush(self):
+        self.model.objects.bulk_create(self.objects, batch_size=5000)
+        self.objects = []
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic films, characters and starships for scale testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--films', type=int, default=100, help='Number of films to create')
+        parser.add_argument('--characters', type=int, default=10000, help='Number of characters to create')
+        parser.add_argument('--starships', type=int, default=1000, help='Number of starships to create')
+        parser.add_argument('--films-per-character', type=float, default=3.0,
+                            help='Average number of films of a character (at least 1)')
+        parser.add_argument('--films-per-starship', type=float, default=2.0,
+                            help='Average number of films of a starship (at least 1)')
+        parser.add_argument('--pilots-per-starship', type=float, default=1.0,
+                            help='Average number of pilots of a starship (may be 0)')
+        parser.add_argument('--film-skew', type=float, default=0.5,
+                            help='Zipf exponent of the film popularity, 0 for uniform')
+        parser.add_argument('--name-skew', type=float, default=1.0,
+                            help='Zipf exponent of the first and last name frequencies, 0 for uniform')
+        parser.add_argument('--swapi-names', type=float, default=0.05,
+                            help='Share of names built from real SWAPI names, e.g. "Luke Skywalker 1234"')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, the same seed generates the same data')
+        parser.add_argument('--chunk-size', type=int, default=100000, help='Rows per COPY or INSERT')
+        parser.add_argument('--method', choices=('copy', 'bulk'), default='copy',
+                            help='PostgreSQL COPY (fastest) or bulk_create()')
+        parser.add_argument('--keep-indexes', action='store_true',
+                            help='Keep the indexes and constraints during the load instead of rebuilding them '
+                                 'at the end, faster for small additions to large tables')
+
+    def handle(self, *args, **options):
+        if options['method'] == 'copy' and connection.vendor != 'postgresql':
+            raise CommandError('COPY needs PostgreSQL, use --method bulk')
+        if options['swapi_names'] < 0 or options['swapi_names'] > 1:
+            raise CommandError('--swapi-names is a share between 0 and 1')
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.now = timezone.now().isoformat()
+        self.first_names = _zipf_cum_weights(len(FIRST_NAMES), options['name_skew'])
+        self.last_names = _zipf_cum_weights(len(LAST_NAMES), options['name_skew'])
+        start = time.monotonic()
+
+        relations = [Character.films.through, Starship.films.through, Starship.pilots.through]
+        relation_tables = [model._meta.db_table for model in relations]
+        models = [Film, Character, Starship, *relations]
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                # Run the pending deferred checks, a table with pending trigger events cannot be altered
+                cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            _set_counter_triggers(relation_tables, enabled=False)
+            rebuild = []
+            if connection.vendor == 'postgresql' and not options['keep_indexes']:
+                # Locks the tables until the commit, like the explicit id allocation below
+                rebuild = _drop_indexes([model._meta.db_table for model in models])
+            # Explicit ids, allocated while the tables are locked, relate the rows without reading them back
+            film_ids = self._generate_films(options['films'])
+            if not film_ids and (options['characters'] or options['starships']):
+                film_ids = list(Film.objects.values_list('id', flat=True))
+                if not film_ids:
+                    raise CommandError('No films to relate the characters and starships to, use --films')
+            character_ids = self._generate_characters(options['characters'], film_ids)
+            if not character_ids and options['starships']:
+                character_ids = list(Character.objects.values_list('id', flat=True))
+            self._generate_starships(options['starships'], film_ids, character_ids)
+            _set_counter_triggers(relation_tables, enabled=True)
+            # The new rows were written with their counters, the rows they relate to were not.
+            # Recounted before the indexes are rebuilt, which leaves them out of the UPDATEs.
+            Film.recount_relation_counters()
+            if options['starships']:
+                Character.recount_relation_counters(['starships'])
+
+            with connection.cursor() as cursor:
+                if rebuild:
+                    cursor.execute("SET LOCAL maintenance_work_mem = '256MB'")
+                for sql in rebuild:
+                    cursor.execute(sql)
+                cursor.execute('SET CONSTRAINTS ALL DEFERRED')
+                for sql in connection.ops.sequence_reset_sql(no_style(), [Film, Character, Starship]):
+                    cursor.execute(sql)
+            transaction.on_commit(invalidate_graph)
+            transaction.on_commit(invalidate_autocomplete)
+
+        with connection.cursor() as cursor:
+            for model in models:
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+        StatsDAO.refresh_materialized_views()
+        invalidate_all_cache()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {options['films']} films, {options['characters']} characters and "
+            f"{options['starships']} starships in {time.monotonic() - start:.1f}s"
+        ))
+
+    def _writer(self, model, columns, table=None):
+        if self.options['method'] == 'copy':
+            return _CopyWriter(table or model._meta.db_table, columns)
+        return _BulkWriter(model, columns)
+
+    def _allocate_ids(self, model, count):
+        """First id of a block of count ids after the current rows, the table stays locked"""
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(f'LOCK TABLE {table} IN EXCLUSIVE MODE')
+            cursor.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}')
+            return cursor.fetchone()[0] + 1
+
+    def _chunks(self, first_id, count):
+        chunk_size = self.options['chunk_size']
+        for start in range(first_id, first_id + count, chunk_size):
+            yield range(start, min(start + chunk_size, first_id + count))
+
+    def _names(self, real_names, ids):
+        """Names from the skewed first and last names or from real_names, unique thanks to the id"""
+        rng, share = self.rng, self.options['swapi_names']
+        firsts = rng.choices(FIRST_NAMES, cum_weights=self.first_names, k=len(ids))
+        lasts = rng.choices(LAST_NAMES, cum_weights=self.last_names, k=len(ids))
+        return [
+            f'{rng.choice(real_names)} {index}' if rng.random() < share else f'{first} {last} {index}'
+            for index, first, last in zip(ids, firsts, lasts)
+        ]
+
+    def _related(self, owner_ids, related_ids, cum_weights, mean, minimum):
+        """(owner id, related id) pairs, without duplicates"""
+        rng = self.rng
+        limit = len(related_ids)
+        span = max(minimum, round(2 * mean) - minimum) - minimum + 1
+        # One choices() call for the whole chunk, the per owner calls dominate the generation otherwise
+        counts = [min(minimum + int(rng.random() * span), limit) for _ in owner_ids]
+        chosen = rng.choices(related_ids, cum_weights=cum_weights, k=sum(counts))
+        pairs = []
+        position = 0
+        for owner_id, count in zip(owner_ids, counts):
+            pairs.extend((owner_id, related_id) for related_id in dict.fromkeys(chosen[position:position + count]))
+            position += count
+        return pairs
+
+    def _generate_films(self, count):
+        if not count:
+            return []
+        first_id = self._allocate_ids(Film, count)
+        writer = self._writer(Film, [
+            'id', 'name', 'swapi_id', 'episode_id', 'director', 'created', 'edited', 'character_count', 'starship_count',
+        ])
+        for ids in self._chunks(first_id, count):
+            writer.write(
+                (film_id, f'{self.rng.choice(SWAPI_FILMS)} {film_id}' if self.rng.random() < self.options['swapi_names']
+                 else f'Film {film_id}', 0, film_id - first_id + 1, 'Synthetic', self.now, self.now, 0, 0)
+                for film_id in ids
+            )
+            writer.flush()
+        self.stdout.write(f'{count} films')
+        return list(range(first_id, first_id + count))
+
+    def _generate_characters(self, count, film_ids):
+        if not count:
+            return []
+        first_id = self._allocate_ids(Character, count)
+        rng = self.rng
+        film_weights = _zipf_cum_weights(len(film_ids), self.options['film_skew'])
+        writer = self._writer(Character, [
+            'id', 'name', 'swapi_id', 'gender', 'height', 'mass', 'mass_numeric', 'homeworld', 'created', 'edited',
+            'film_count', 'starship_count',
+        ])
+        films = self._writer(Character.films.through, ['character_id', 'film_id'])
+        for ids in self._chunks(first_id, count):
+            size = len(ids)
+            film_pairs = self._related(ids, film_ids, film_weights, self.options['films_per_character'], 1)
+            film_counts = Counter(character_id for character_id, _ in film_pairs)
+            masses = [20 + int(rng.random() * 181) if rng.random() < 0.8 else None for _ in ids]
+            writer.write(zip(
+                ids, self._names(SWAPI_CHARACTERS, ids), [0] * size, rng.choices(GENDERS, k=size),
+                [60 + int(rng.random() * 201) for _ in ids], ['unknown' if mass is None else mass for mass in masses],
+                masses, rng.choices(HOMEWORLDS, k=size), [self.now] * size, [self.now] * size,
+                [film_counts[character_id] for character_id in ids], [0] * size,
+            ))
+            writer.flush()
+            films.write(film_pairs)
+            films.flush()
+            self.stdout.write(f'{ids.stop - first_id} characters')
+        return range(first_id, first_id + count)
+
+    def _generate_starships(self, count, film_ids, character_ids):
+        if not count:
+            return
+        first_id = self._allocate_ids(Starship, count)
+        rng = self.rng
+        film_weights = _zipf_cum_weights(len(film_ids), self.options['film_skew'])
+        writer = self._writer(Starship, [
+            'id', 'name', 'model', 'swapi_id', 'starship_class', 'manufacturer',
+            'cost_in_credits', 'cost_in_credits_numeric', 'crew', 'crew_numeric',
+            'length', 'length_numeric', 'hyperdrive_rating', 'hyperdrive_rating_numeric', 'created', 'edited',
+            'film_count', 'pilot_count',
+        ])
+        films = self._writer(Starship.films.through, ['starship_id', 'film_id'])
+        pilots = self._writer(Starship.pilots.through, ['starship_id', 'character_id'])
+        for ids in self._chunks(first_id, count):
+            size = len(ids)
+            film_pairs = self._related(ids, film_ids, film_weights, self.options['films_per_starship'], 1)
+            pilot_pairs = []
+            if character_ids:
+                pilot_pairs = self._related(ids, character_ids, None, self.options['pilots_per_starship'], 0)
+            film_counts = Counter(starship_id for starship_id, _ in film_pairs)
+            pilot_counts = Counter(starship_id for starship_id, _ in pilot_pairs)
+            costs = [10_000 + int(rng.random() * 9_990_000) if rng.random() < 0.9 else None for _ in ids]
+            crews = [1 + int(rng.random() * 5000) for _ in ids]
+            lengths = [round(5 + rng.random() * 19995, 1) for _ in ids]
+            hyperdrives = rng.choices((0.5, 1.0, 1.5, 2.0, 3.0, 4.0), k=size)
+            writer.write(zip(
+                ids, self._names(SWAPI_STARSHIPS, ids), [f'Model {starship_id % 997}' for starship_id in ids],
+                [0] * size, rng.choices(STARSHIP_CLASSES, k=size), rng.choices(MANUFACTURERS, k=size),
+                ['unknown' if cost is None else cost for cost in costs], costs, crews, crews,
+                lengths, lengths, hyperdrives, hyperdrives, [self.now] * size, [self.now] * size,
+                [film_counts[starship_id] for starship_id in ids], [pilot_counts[starship_id] for starship_id in ids],
+            ))
+            writer.flush()
+            films.write(film_pairs)
+            films.flush()
+            if pilot_pairs:
+                pilots.write(pilot_pairs)
+                pilots.flush()
+            self.stdout.write(f'{ids.stop - first_id} starships')
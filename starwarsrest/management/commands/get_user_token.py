@@ -9,6 +9,11 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('username', type=str, help='Username to get token for')
+        parser.add_argument(
+            '--regenerate',
+            action='store_true',
+            help='Replace the existing token with a new one, the old token stops working'
+        )
 
     def handle(self, *args, **options):
         username = options['username']
@@ -25,11 +30,18 @@ class Command(BaseCommand):
             )
             return
 
+        # Deleting the token evicts it from the authentication cache (see signals.py)
+        regenerated = options['regenerate'] and Token.objects.filter(user=user).delete()[0] > 0
+
         # Get or create the token for the user
         token, created = Token.objects.get_or_create(user=user)
         self.stdout.write('')
         self.stdout.write('********')
-        if created:
+        if regenerated:
+            self.stdout.write(
+                self.style.SUCCESS(f'Regenerated token for {user.username}: {token.key}')
+            )
+        elif created:
             self.stdout.write(
                 self.style.SUCCESS(f'Created new token for {user.username}: {token.key}')
             )
@@ -3,7 +3,7 @@ from django.core.management.base import BaseCommand
 from django.core.exceptions import ValidationError
 from starwarsrest.models import Character, Film, Starship
 from starwarsrest.services import SwapiService
-from starwarsrest.dao import CharacterDAO, FilmDAO, StarshipDAO
+from starwarsrest.dao import CharacterDAO, FilmDAO, StarshipDAO, StatsDAO
 
 from celery import shared_task, chain
 from celery.exceptions import CeleryError
@@ -182,6 +182,13 @@ def populate_starships_task(*args, **kwargs):
     )
 
 
+@shared_task
+def refresh_stats_task(*args, **kwargs):
+    """Celery task to refresh the statistics materialized views"""
+    StatsDAO.refresh_materialized_views()
+    return "Refreshed statistics"
+
+
 class Command(BaseCommand):
     help = 'Populate the database with data from SWAPI'
     
@@ -206,7 +213,8 @@ class Command(BaseCommand):
                 task_chain = chain(
                     populate_films_task.s(),
                     populate_characters_task.s(),
-                    populate_starships_task.s()
+                    populate_starships_task.s(),
+                    refresh_stats_task.s()
                 )
                 result = task_chain.apply_async()
                 
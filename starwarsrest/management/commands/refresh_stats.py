@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from starwarsrest.dao import StatsDAO
+
+
+class Command(BaseCommand):
+    help = 'Refresh the materialized views behind the /api/stats/ endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--blocking',
+            action='store_true',
+            help='Refresh without CONCURRENTLY: faster, but the views are locked while refreshing'
+        )
+
+    def handle(self, *args, **options):
+        StatsDAO.refresh_materialized_views(concurrently=not options['blocking'])
+        self.stdout.write(
+            self.style.SUCCESS('Refreshed statistics: ' + ', '.join(StatsDAO.MATERIALIZED_VIEWS))
+        )
@@ -0,0 +1,137 @@
+"""
+Prometheus metrics for the API, the cache, the DAO layer, the SWAPI client, the Celery tasks
+and the webhooks.
+
+With several processes (gunicorn workers, Celery workers) set PROMETHEUS_MULTIPROC_DIR to a
+directory shared by all of them and emptied on startup, /metrics then aggregates every process.
+The files are named after the host name and the pid, so containers sharing the directory don't clash.
+"""
+import functools
+import inspect
+import os
+import socket
+import time
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    REGISTRY,
+    CONTENT_TYPE_LATEST,
+    generate_latest,
+    multiprocess,
+    values,
+)
+from celery.signals import task_prerun, task_postrun
+from django.http import HttpResponse
+
+MULTIPROCESS = 'PROMETHEUS_MULTIPROC_DIR' in os.environ
+
+if MULTIPROCESS:
+    values.ValueClass = values.MultiProcessValue(
+        process_identifier=lambda: f'{socket.gethostname()}_{os.getpid()}'
+    )
+
+
+REQUEST_LATENCY = Histogram(
+    'api_request_duration_seconds',
+    'API request latency per viewset action',
+    ['viewset', 'action', 'method', 'status'],
+)
+RESPONSE_SIZE = Histogram(
+    'api_response_size_bytes',
+    'API response body size per viewset action',
+    ['viewset', 'action'],
+    buckets=(100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, float('inf')),
+)
+CACHE_EVENTS = Counter(
+    'api_cache_events_total',
+    'RedisCacheMiddleware hits, misses, stores and evictions',
+    ['event'],
+)
+DAO_DURATION = Histogram(
+    'dao_method_duration_seconds',
+    'Duration of the DAO methods',
+    ['dao', 'method'],
+)
+SWAPI_REQUEST_LATENCY = Histogram(
+    'swapi_request_duration_seconds',
+    'Duration of the SWAPI requests, retries included',
+    ['outcome'],
+)
+SWAPI_RETRIES = Counter(
+    'swapi_retries_total',
+    'Retries of SWAPI requests',
+)
+WEBHOOK_DELIVERIES = Counter(
+    'webhook_deliveries_total',
+    'Webhook batches sent, per outcome (status code or error)',
+    ['outcome'],
+)
+WEBHOOK_EVENTS = Counter(
+    'webhook_events_total',
+    'Change events delivered by the webhooks, after coalescing',
+)
+CELERY_TASK_DURATION = Histogram(
+    'celery_task_duration_seconds',
+    'Duration of the Celery tasks',
+    ['task', 'state'],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, float('inf')),
+)
+
+
+# Celery task id -> start time, filled by task_prerun
+_task_start_times = {}
+
+
+def instrument_dao(cls):
+    """Class decorator timing every static method of a DAO class into DAO_DURATION"""
+    for name, attr in list(vars(cls).items()):
+        if isinstance(attr, staticmethod):
+            setattr(cls, name, staticmethod(_timed(attr.__func__, cls.__name__, name)))
+    return cls
+
+
+def _timed(func, dao, method):
+    histogram = DAO_DURATION.labels(dao, method)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start)
+    return wrapper
+
+
+def metrics_view(request):
+    """Expose the metrics in the Prometheus text format"""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+
+@task_prerun.connect
+def _task_prerun(task_id=None, task=None, **kwargs):
+    _task_start_times[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def _task_postrun(task_id=None, task=None, state=None, **kwargs):
+    start = _task_start_times.pop(task_id, None)
+    if start is not None:
+        CELERY_TASK_DURATION.labels(task.name, state or 'UNKNOWN').observe(time.perf_counter() - start)
@@ -0,0 +1,108 @@
+# Generated by Django 5.0.14 on 2026-10-19 00:20
+
+import re
+
+from django.db import migrations, models
+
+
+NUMBER_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+
+
+def parse_quantity(value):
+    """Copy of models.parse_quantity at the time of this migration"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    numbers = NUMBER_PATTERN.findall(str(value).replace(',', ''))
+    if not numbers:
+        return None
+    return max(float(number) for number in numbers)
+
+
+CHARACTER_NUMERIC_FIELDS = {'mass': ('mass_numeric', float)}
+STARSHIP_NUMERIC_FIELDS = {
+    'cost_in_credits': ('cost_in_credits_numeric', int),
+    'length': ('length_numeric', float),
+    'crew': ('crew_numeric', int),
+    'passengers': ('passengers_numeric', int),
+    'max_atmosphering_speed': ('max_atmosphering_speed_numeric', int),
+    'hyperdrive_rating': ('hyperdrive_rating_numeric', float),
+    'mglt': ('mglt_numeric', int),
+    'cargo_capacity': ('cargo_capacity_numeric', int),
+}
+
+
+def _backfill(model, numeric_fields, batch_size=2000):
+    batch = []
+    for obj in model.objects.only('id', *numeric_fields).iterator(chunk_size=batch_size):
+        for source, (target, cast) in numeric_fields.items():
+            number = parse_quantity(getattr(obj, source))
+            setattr(obj, target, None if number is None else cast(number))
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            model.objects.bulk_update(batch, [target for target, _ in numeric_fields.values()])
+            batch = []
+    if batch:
+        model.objects.bulk_update(batch, [target for target, _ in numeric_fields.values()])
+
+
+def backfill_numeric_fields(apps, schema_editor):
+    _backfill(apps.get_model('starwarsrest', 'Character'), CHARACTER_NUMERIC_FIELDS)
+    _backfill(apps.get_model('starwarsrest', 'Starship'), STARSHIP_NUMERIC_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('starwarsrest', '0002_alter_character_options_alter_film_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='character',
+            name='mass_numeric',
+            field=models.FloatField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='starship',
+            name='cargo_capacity_numeric',
+            field=models.BigIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='starship',
+            name='cost_in_credits_numeric',
+            field=models.BigIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='starship',
+            name='crew_numeric',
+            field=models.BigIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='starship',
+            name='hyperdrive_rating_numeric',
+            field=models.FloatField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='starship',
+            name='length_numeric',
+            field=models.FloatField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='starship',
+            name='max_atmosphering_speed_numeric',
+            field=models.BigIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='starship',
+            name='mglt_numeric',
+            field=models.BigIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='starship',
+            name='passengers_numeric',
+            field=models.BigIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_numeric_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.0.14 on 2026-10-19 00:52
+
+from django.db import migrations, models
+
+
+# Unique indexes are required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+FILM_STATS_SQL = """
+CREATE MATERIALIZED VIEW starwarsrest_film_stats AS
+SELECT
+    f.id AS film_id,
+    f.name,
+    f.episode_id,
+    (SELECT count(*) FROM starwarsrest_character_films cf WHERE cf.film_id = f.id)::integer AS characters,
+    (SELECT count(*) FROM starwarsrest_starship_films sf WHERE sf.film_id = f.id)::integer AS starships,
+    (SELECT count(DISTINCT sp.character_id)
+     FROM starwarsrest_starship_films sf
+     JOIN starwarsrest_starship_pilots sp ON sp.starship_id = sf.starship_id
+     WHERE sf.film_id = f.id)::integer AS pilots
+FROM starwarsrest_film f;
+CREATE UNIQUE INDEX starwarsrest_film_stats_film_id ON starwarsrest_film_stats (film_id);
+"""
+
+STARSHIP_CLASS_STATS_SQL = """
+CREATE MATERIALIZED VIEW starwarsrest_starship_class_stats AS
+SELECT
+    coalesce(nullif(lower(s.starship_class), ''), 'unknown') AS starship_class,
+    count(*)::integer AS starships,
+    avg(s.crew_numeric)::double precision AS avg_crew,
+    avg(s.passengers_numeric)::double precision AS avg_passengers,
+    avg(s.cost_in_credits_numeric)::double precision AS avg_cost_in_credits,
+    max(s.cost_in_credits_numeric) AS max_cost_in_credits,
+    avg(s.length_numeric) AS avg_length,
+    avg(s.hyperdrive_rating_numeric) AS avg_hyperdrive_rating
+FROM starwarsrest_starship s
+GROUP BY 1;
+CREATE UNIQUE INDEX starwarsrest_starship_class_stats_class ON starwarsrest_starship_class_stats (starship_class);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('starwarsrest', '0003_numeric_shadow_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FilmStats',
+            fields=[
+                ('film_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=200)),
+                ('episode_id', models.IntegerField(null=True)),
+                ('characters', models.IntegerField()),
+                ('starships', models.IntegerField()),
+                ('pilots', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'starwarsrest_film_stats',
+                'ordering': ['episode_id', 'name'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='StarshipClassStats',
+            fields=[
+                ('starship_class', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('starships', models.IntegerField()),
+                ('avg_crew', models.FloatField(null=True)),
+                ('avg_passengers', models.FloatField(null=True)),
+                ('avg_cost_in_credits', models.FloatField(null=True)),
+                ('max_cost_in_credits', models.BigIntegerField(null=True)),
+                ('avg_length', models.FloatField(null=True)),
+                ('avg_hyperdrive_rating', models.FloatField(null=True)),
+            ],
+            options={
+                'db_table': 'starwarsrest_starship_class_stats',
+                'ordering': ['-starships', 'starship_class'],
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(FILM_STATS_SQL, 'DROP MATERIALIZED VIEW starwarsrest_film_stats'),
+        migrations.RunSQL(STARSHIP_CLASS_STATS_SQL, 'DROP MATERIALIZED VIEW starwarsrest_starship_class_stats'),
+    ]
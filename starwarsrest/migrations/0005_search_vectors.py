@@ -0,0 +1,42 @@
+# Generated by Django 5.0.14 on 2026-10-19 01:10
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('starwarsrest', '0004_stats_materialized_views'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='character',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('name', config='english', weight='A'), '||', django.contrib.postgres.search.SearchVector('homeworld', config='english', weight='B'), django.contrib.postgres.search.SearchConfig('english')), '||', django.contrib.postgres.search.SearchVector('gender', 'eye_color', 'hair_color', 'skin_color', config='english', weight='C'), django.contrib.postgres.search.SearchConfig('english')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddField(
+            model_name='film',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('name', config='english', weight='A'), '||', django.contrib.postgres.search.SearchVector('opening_crawl', config='english', weight='B'), django.contrib.postgres.search.SearchConfig('english')), '||', django.contrib.postgres.search.SearchVector('director', 'producer', config='english', weight='C'), django.contrib.postgres.search.SearchConfig('english')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddField(
+            model_name='starship',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('name', 'model', config='english', weight='A'), '||', django.contrib.postgres.search.SearchVector('manufacturer', 'starship_class', config='english', weight='B'), django.contrib.postgres.search.SearchConfig('english')), '||', django.contrib.postgres.search.SearchVector('consumables', config='english', weight='C'), django.contrib.postgres.search.SearchConfig('english')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='character',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='character_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='film_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='starship',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='starship_search_vector_idx'),
+        ),
+    ]
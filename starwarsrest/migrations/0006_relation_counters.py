@@ -0,0 +1,132 @@
+# Generated by Django 5.0.14 on 2026-10-19 01:46
+
+from django.db import migrations, models
+
+
+# Statement level triggers with transition tables: one UPDATE per counted table and
+# statement, however many rows the statement wrote. The arguments are triples of
+# (through table column, counted table, counter column).
+COUNT_RELATIONS_FUNCTION_SQL = """
+CREATE FUNCTION starwarsrest_count_relations() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    i integer;
+BEGIN
+    FOR i IN 0 .. TG_NARGS - 1 BY 3 LOOP
+        IF TG_OP = 'TRUNCATE' THEN
+            EXECUTE format('UPDATE %1$I SET %2$I = 0 WHERE %2$I <> 0', TG_ARGV[i + 1], TG_ARGV[i + 2]);
+            CONTINUE;
+        END IF;
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            EXECUTE format(
+                'UPDATE %1$I t SET %2$I = t.%2$I - d.n '
+                'FROM (SELECT %3$I AS id, count(*) AS n FROM old_rows GROUP BY 1) d WHERE t.id = d.id',
+                TG_ARGV[i + 1], TG_ARGV[i + 2], TG_ARGV[i]
+            );
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            EXECUTE format(
+                'UPDATE %1$I t SET %2$I = t.%2$I + d.n '
+                'FROM (SELECT %3$I AS id, count(*) AS n FROM new_rows GROUP BY 1) d WHERE t.id = d.id',
+                TG_ARGV[i + 1], TG_ARGV[i + 2], TG_ARGV[i]
+            );
+        END IF;
+    END LOOP;
+    RETURN NULL;
+END
+$$;
+"""
+
+# through table -> trigger arguments
+RELATIONS = {
+    'starwarsrest_character_films': (
+        'character_id', 'starwarsrest_character', 'film_count', 'film_id', 'starwarsrest_film', 'character_count',
+    ),
+    'starwarsrest_starship_films': (
+        'starship_id', 'starwarsrest_starship', 'film_count', 'film_id', 'starwarsrest_film', 'starship_count',
+    ),
+    'starwarsrest_starship_pilots': (
+        'starship_id', 'starwarsrest_starship', 'pilot_count', 'character_id', 'starwarsrest_character',
+        'starship_count',
+    ),
+}
+
+# Transition tables are only allowed on single event triggers
+TRIGGER_EVENTS = {
+    'insert': ('INSERT', 'REFERENCING NEW TABLE AS new_rows'),
+    'delete': ('DELETE', 'REFERENCING OLD TABLE AS old_rows'),
+    'update': ('UPDATE', 'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+    'truncate': ('TRUNCATE', ''),
+}
+
+
+def triggers_sql():
+    statements = []
+    for table, arguments in RELATIONS.items():
+        arguments = ', '.join(f"'{argument}'" for argument in arguments)
+        for name, (event, referencing) in TRIGGER_EVENTS.items():
+            statements.append(
+                f'CREATE TRIGGER {table}_count_{name} AFTER {event} ON {table} {referencing} '
+                f'FOR EACH STATEMENT EXECUTE FUNCTION starwarsrest_count_relations({arguments});'
+            )
+    return '\n'.join(statements)
+
+
+def backfill_sql():
+    statements = []
+    for table, arguments in RELATIONS.items():
+        for column, counted_table, counter in (arguments[:3], arguments[3:]):
+            statements.append(
+                f'UPDATE {counted_table} t SET {counter} = d.n '
+                f'FROM (SELECT {column} AS id, count(*) AS n FROM {table} GROUP BY 1) d WHERE t.id = d.id;'
+            )
+    return '\n'.join(statements)
+
+
+DROP_SQL = '\n'.join(
+    [f'DROP TRIGGER {table}_count_{name} ON {table};' for table in RELATIONS for name in TRIGGER_EVENTS]
+    + ['DROP FUNCTION starwarsrest_count_relations();']
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('starwarsrest', '0005_search_vectors'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='character',
+            name='film_count',
+            field=models.IntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='character',
+            name='starship_count',
+            field=models.IntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='film',
+            name='character_count',
+            field=models.IntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='film',
+            name='starship_count',
+            field=models.IntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='starship',
+            name='film_count',
+            field=models.IntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='starship',
+            name='pilot_count',
+            field=models.IntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunSQL(
+            sql=COUNT_RELATIONS_FUNCTION_SQL + triggers_sql() + backfill_sql(),
+            reverse_sql=DROP_SQL,
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.0.14 on 2026-10-19 02:08
+
+from django.db import migrations, models
+
+
+# Statement level triggers with transition tables: one INSERT into the change log per
+# statement. The argument is the type name of the table in the change feed.
+RECORD_CHANGES_FUNCTION_SQL = """
+CREATE FUNCTION starwarsrest_record_changes() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO starwarsrest_change (txid, object_type, object_id, deleted, changed_at)
+        SELECT pg_current_xact_id()::text::bigint, TG_ARGV[0], id, true, now() FROM old_rows;
+    ELSE
+        INSERT INTO starwarsrest_change (txid, object_type, object_id, deleted, changed_at)
+        SELECT pg_current_xact_id()::text::bigint, TG_ARGV[0], id, false, now() FROM new_rows;
+    END IF;
+    RETURN NULL;
+END
+$$;
+"""
+
+TABLES = {
+    'starwarsrest_film': 'films',
+    'starwarsrest_character': 'characters',
+    'starwarsrest_starship': 'starships',
+}
+
+# Transition tables are only allowed on single event triggers
+TRIGGER_EVENTS = {
+    'insert': ('INSERT', 'NEW TABLE AS new_rows'),
+    'update': ('UPDATE', 'NEW TABLE AS new_rows'),
+    'delete': ('DELETE', 'OLD TABLE AS old_rows'),
+}
+
+TRIGGERS_SQL = '\n'.join(
+    f'CREATE TRIGGER {table}_change_{name} AFTER {event} ON {table} REFERENCING {transition} '
+    f"FOR EACH STATEMENT EXECUTE FUNCTION starwarsrest_record_changes('{type_name}');"
+    for table, type_name in TABLES.items()
+    for name, (event, transition) in TRIGGER_EVENTS.items()
+)
+
+DROP_SQL = '\n'.join(
+    [f'DROP TRIGGER {table}_change_{name} ON {table};' for table in TABLES for name in TRIGGER_EVENTS]
+    + ['DROP FUNCTION starwarsrest_record_changes();']
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('starwarsrest', '0006_relation_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('txid', models.BigIntegerField()),
+                ('object_type', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('changed_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['txid', 'id'],
+                'indexes': [models.Index(fields=['txid', 'id'], name='change_position_idx'), models.Index(fields=['changed_at'], name='change_changed_at_idx')],
+            },
+        ),
+        migrations.RunSQL(sql=RECORD_CHANGES_FUNCTION_SQL + TRIGGERS_SQL, reverse_sql=DROP_SQL),
+    ]
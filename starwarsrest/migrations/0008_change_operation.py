@@ -0,0 +1,73 @@
+from django.db import migrations, models
+
+
+# Same triggers as 0007, which log the operation and notify the change stream listeners.
+# The counter updates made by the triggers of the through tables (trigger depth > 1) are
+# the relation changes. NOTIFY is delivered on commit, once per distinct payload and
+# transaction, so a transaction sends at most one notification per table.
+RECORD_CHANGES_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION starwarsrest_record_changes() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    operation text;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO starwarsrest_change (txid, object_type, object_id, operation, changed_at)
+        SELECT pg_current_xact_id()::text::bigint, TG_ARGV[0], id, 'deleted', now() FROM old_rows;
+    ELSE
+        IF TG_OP = 'INSERT' THEN
+            operation := 'created';
+        ELSIF pg_trigger_depth() > 1 THEN
+            operation := 'related';
+        ELSE
+            operation := 'updated';
+        END IF;
+        INSERT INTO starwarsrest_change (txid, object_type, object_id, operation, changed_at)
+        SELECT pg_current_xact_id()::text::bigint, TG_ARGV[0], id, operation, now() FROM new_rows;
+    END IF;
+    IF FOUND THEN
+        PERFORM pg_notify('starwarsrest_changes', TG_ARGV[0]);
+    END IF;
+    RETURN NULL;
+END
+$$;
+"""
+
+PREVIOUS_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION starwarsrest_record_changes() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO starwarsrest_change (txid, object_type, object_id, deleted, changed_at)
+        SELECT pg_current_xact_id()::text::bigint, TG_ARGV[0], id, true, now() FROM old_rows;
+    ELSE
+        INSERT INTO starwarsrest_change (txid, object_type, object_id, deleted, changed_at)
+        SELECT pg_current_xact_id()::text::bigint, TG_ARGV[0], id, false, now() FROM new_rows;
+    END IF;
+    RETURN NULL;
+END
+$$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('starwarsrest', '0007_change_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='change',
+            name='operation',
+            field=models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('related', 'Relations changed'), ('deleted', 'Deleted')], default='updated', max_length=7),
+            preserve_default=False,
+        ),
+        migrations.RunSQL(
+            sql="UPDATE starwarsrest_change SET operation = 'deleted' WHERE deleted;",
+            reverse_sql="UPDATE starwarsrest_change SET deleted = operation = 'deleted';",
+        ),
+        migrations.RemoveField(
+            model_name='change',
+            name='deleted',
+        ),
+        migrations.RunSQL(sql=RECORD_CHANGES_FUNCTION_SQL, reverse_sql=PREVIOUS_FUNCTION_SQL),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.14 on 2026-10-19 02:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('starwarsrest', '0008_change_operation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=500, unique=True)),
+                ('txid', models.BigIntegerField()),
+                ('change_id', models.BigIntegerField()),
+                ('failures', models.IntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
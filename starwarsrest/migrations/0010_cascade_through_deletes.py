@@ -0,0 +1,44 @@
+from django.db import migrations
+
+
+# The foreign keys of the through tables delete their rows with the film, character or
+# starship they point to, so that the DAO deletes are one DELETE statement instead of
+# Django's collector deleting the through rows first. Django keeps the constraints as
+# they are (it has no ON DELETE clause of its own), the ORM deletes still work as before.
+THROUGH_TABLES = ('starwarsrest_character_films', 'starwarsrest_starship_films', 'starwarsrest_starship_pilots')
+
+
+def replace_foreign_keys_sql(old, new):
+    """Re-create the foreign keys of the through tables with `old` replaced by `new` in their definition"""
+    tables = ', '.join(f"'{table}'::regclass" for table in THROUGH_TABLES)
+    return f"""
+DO $$
+DECLARE
+    c record;
+BEGIN
+    FOR c IN
+        SELECT conrelid::regclass AS tbl, conname, pg_get_constraintdef(oid) AS def
+        FROM pg_constraint WHERE contype = 'f' AND conrelid IN ({tables})
+    LOOP
+        EXECUTE format(
+            'ALTER TABLE %s DROP CONSTRAINT %I, ADD CONSTRAINT %I %s',
+            c.tbl, c.conname, c.conname, replace(c.def, '{old}', '{new}')
+        );
+    END LOOP;
+END
+$$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('starwarsrest', '0009_webhook_cursor'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=replace_foreign_keys_sql(' DEFERRABLE', ' ON DELETE CASCADE DEFERRABLE'),
+            reverse_sql=replace_foreign_keys_sql(' ON DELETE CASCADE', ''),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('starwarsrest', '0010_cascade_through_deletes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogPruning',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('txid', models.BigIntegerField()),
+                ('change_id', models.BigIntegerField()),
+                ('before', models.DateTimeField()),
+                ('pruned_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -1,7 +1,141 @@
-from django.db import models
+import re
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import connection, models
 
 
-class Film(models.Model):
+NUMBER_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+
+
+def parse_quantity(value):
+    """
+    Parse a SWAPI quantity string such as "1,000", "12.5", "1000km" or "30-165" into a number.
+    Ranges return their upper bound. Returns None for "unknown", "n/a" and other values without digits.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    numbers = NUMBER_PATTERN.findall(str(value).replace(',', ''))
+    if not numbers:
+        return None
+    return max(float(number) for number in numbers)
+
+
+class NumericShadowFieldsMixin:
+    """
+    Keeps parsed numeric copies of text quantity columns, so that they can be
+    filtered and sorted in the database. numeric_fields maps each text field to
+    its numeric shadow field, the shadows are refreshed on every save().
+    Bulk operations, which skip save(), call update_numeric_fields() themselves.
+    """
+    numeric_fields = {}
+
+    @classmethod
+    def parse_numeric_fields(cls, data):
+        """Return the numeric shadow values for the text quantities found in the data dict"""
+        values = {}
+        for source, target in cls.numeric_fields.items():
+            if source not in data:
+                continue
+            number = parse_quantity(data[source])
+            if number is not None and isinstance(cls._meta.get_field(target), models.IntegerField):
+                number = int(number)
+            values[target] = number
+        return values
+
+    def update_numeric_fields(self):
+        """Refresh the numeric shadow fields from their text fields"""
+        data = {source: getattr(self, source) for source in self.numeric_fields}
+        for target, number in self.parse_numeric_fields(data).items():
+            setattr(self, target, number)
+
+    def save(self, *args, **kwargs):
+        self.update_numeric_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {
+                target for source, target in self.numeric_fields.items() if source in update_fields
+            }
+        super().save(*args, **kwargs)
+
+
+class RelationCountersMixin:
+    """
+    Keeps denormalized sizes of many-to-many relations, so that they can be filtered
+    and sorted on without joining the through tables. relation_counters maps each
+    relation to its counter field. The counters are maintained by statement level
+    triggers on the through tables (migration 0006), whatever writes them: add(),
+    set(), the bulk paths, COPY and cascaded deletes alike. save() never writes them,
+    an instance loaded before a relation changed would put a stale count back.
+    Call refresh_from_db() to read the current counts after changing a relation.
+    """
+    relation_counters = {}
+
+    def save(self, *args, **kwargs):
+        counters = set(self.relation_counters.values())
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not self._state.adding and not kwargs.get('force_insert'):
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and not field.generated and field.attname not in deferred
+            ]
+        if update_fields is not None:
+            kwargs['update_fields'] = [name for name in update_fields if name not in counters]
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def recount_relation_counters(cls, relations=None):
+        """
+        Recompute the counters of the given relations (all by default) from the through
+        tables, for writes made with the triggers disabled. One grouped join per counter,
+        only the rows whose count changed are updated.
+        """
+        table = cls._meta.db_table
+        with connection.cursor() as cursor:
+            for relation in relations or cls.relation_counters:
+                counter = cls.relation_counters[relation]
+                field = cls._meta.get_field(relation)
+                if field.concrete:
+                    through, column = field.remote_field.through, field.m2m_column_name()
+                else:
+                    through, column = field.through, field.field.m2m_reverse_name()
+                cursor.execute(
+                    f'UPDATE {table} t SET {counter} = d.n FROM ('
+                    f'SELECT o.id, count(r.{column}) AS n FROM {table} o '
+                    f'LEFT JOIN {through._meta.db_table} r ON r.{column} = o.id GROUP BY o.id'
+                    f') d WHERE t.id = d.id AND t.{counter} <> d.n'
+                )
+
+
+# Text search configuration of the search_vector columns and of the queries against them
+SEARCH_CONFIG = 'english'
+
+
+def search_vector(*weighted_fields):
+    """
+    Stored generated tsvector over (field names, weight) pairs, kept up to date by
+    PostgreSQL on every INSERT and UPDATE, including COPY and bulk operations.
+    """
+    vectors = [SearchVector(*fields, weight=weight, config=SEARCH_CONFIG) for fields, weight in weighted_fields]
+    expression = vectors[0]
+    for vector in vectors[1:]:
+        expression = expression + vector
+    return models.GeneratedField(expression=expression, output_field=SearchVectorField(), db_persist=True)
+
+
+class SearchVectorManager(models.Manager):
+    """
+    Leaves the search_vector column out of the SELECT list: it is only used in WHERE
+    and ORDER BY clauses, loading it would make every read heavier.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().defer('search_vector')
+
+
+class Film(RelationCountersMixin, models.Model):
     """
     Model representing a Star Wars film.
     """
@@ -15,17 +149,28 @@ class Film(models.Model):
     producer = models.CharField(max_length=200, null=True, blank=True)
     release_date = models.DateField(null=True, blank=True)
     
+    # Sizes of the relations, see RelationCountersMixin
+    character_count = models.IntegerField(default=0, db_index=True, editable=False)
+    starship_count = models.IntegerField(default=0, db_index=True, editable=False)
+    
+    relation_counters = {'characters': 'character_count', 'starships': 'starship_count'}
+    
     created = models.DateTimeField(auto_now_add=True)
     edited = models.DateTimeField(auto_now=True)
     
+    search_vector = search_vector((['name'], 'A'), (['opening_crawl'], 'B'), (['director', 'producer'], 'C'))
+    
+    objects = SearchVectorManager()
+    
     def __str__(self):
         return self.name
     
     class Meta:
         ordering = ['name']  # Add default ordering
+        indexes = [GinIndex(fields=['search_vector'], name='film_search_vector_idx')]
 
 
-class Character(models.Model):
+class Character(RelationCountersMixin, NumericShadowFieldsMixin, models.Model):
     """
     Model representing a Star Wars character.
     """
@@ -42,19 +187,38 @@ class Character(models.Model):
     skin_color = models.CharField(max_length=50, null=True, blank=True)
     homeworld = models.CharField(max_length=200, null=True, blank=True)
     
+    # Parsed numeric copies of the text quantities, see NumericShadowFieldsMixin
+    mass_numeric = models.FloatField(null=True, blank=True, db_index=True, editable=False)
+    
+    numeric_fields = {'mass': 'mass_numeric'}
+    
     films = models.ManyToManyField(Film, blank=True, related_name='characters')
     
+    # Sizes of the relations, see RelationCountersMixin
+    film_count = models.IntegerField(default=0, db_index=True, editable=False)
+    starship_count = models.IntegerField(default=0, db_index=True, editable=False)
+    
+    relation_counters = {'films': 'film_count', 'starships': 'starship_count'}
+    
     created = models.DateTimeField(auto_now_add=True)
     edited = models.DateTimeField(auto_now=True)
     
+    search_vector = search_vector(
+        (['name'], 'A'), (['homeworld'], 'B'),
+        (['gender', 'eye_color', 'hair_color', 'skin_color'], 'C'),
+    )
+    
+    objects = SearchVectorManager()
+    
     def __str__(self):
         return self.name
     
     class Meta:
         ordering = ['name']  # Add default ordering
+        indexes = [GinIndex(fields=['search_vector'], name='character_search_vector_idx')]
 
 
-class Starship(models.Model):
+class Starship(RelationCountersMixin, NumericShadowFieldsMixin, models.Model):
     """
     Model representing a Star Wars starship.
     """
@@ -65,6 +229,7 @@ class Starship(models.Model):
     class Meta:
         unique_together = ('name', 'model')
         ordering = ['name', 'model']  # Add default ordering
+        indexes = [GinIndex(fields=['search_vector'], name='starship_search_vector_idx')]
     
     swapi_id = models.IntegerField(default=0, help_text="0 for custom/unofficial records")
     
@@ -81,11 +246,163 @@ class Starship(models.Model):
     cargo_capacity = models.CharField(max_length=50, null=True, blank=True)
     consumables = models.CharField(max_length=100, null=True, blank=True)
     
+    # Parsed numeric copies of the text quantities, see NumericShadowFieldsMixin
+    cost_in_credits_numeric = models.BigIntegerField(null=True, blank=True, db_index=True, editable=False)
+    length_numeric = models.FloatField(null=True, blank=True, db_index=True, editable=False)
+    crew_numeric = models.BigIntegerField(null=True, blank=True, db_index=True, editable=False)
+    passengers_numeric = models.BigIntegerField(null=True, blank=True, db_index=True, editable=False)
+    max_atmosphering_speed_numeric = models.BigIntegerField(null=True, blank=True, db_index=True, editable=False)
+    hyperdrive_rating_numeric = models.FloatField(null=True, blank=True, db_index=True, editable=False)
+    mglt_numeric = models.BigIntegerField(null=True, blank=True, db_index=True, editable=False)
+    cargo_capacity_numeric = models.BigIntegerField(null=True, blank=True, db_index=True, editable=False)
+    
+    numeric_fields = {
+        'cost_in_credits': 'cost_in_credits_numeric',
+        'length': 'length_numeric',
+        'crew': 'crew_numeric',
+        'passengers': 'passengers_numeric',
+        'max_atmosphering_speed': 'max_atmosphering_speed_numeric',
+        'hyperdrive_rating': 'hyperdrive_rating_numeric',
+        'mglt': 'mglt_numeric',
+        'cargo_capacity': 'cargo_capacity_numeric',
+    }
+    
     films = models.ManyToManyField(Film, blank=True, related_name='starships')
     pilots = models.ManyToManyField(Character, blank=True, related_name='starships')
     
+    # Sizes of the relations, see RelationCountersMixin
+    film_count = models.IntegerField(default=0, db_index=True, editable=False)
+    pilot_count = models.IntegerField(default=0, db_index=True, editable=False)
+    
+    relation_counters = {'films': 'film_count', 'pilots': 'pilot_count'}
+    
     created = models.DateTimeField(auto_now_add=True)
     edited = models.DateTimeField(auto_now=True)
     
+    search_vector = search_vector(
+        (['name', 'model'], 'A'), (['manufacturer', 'starship_class'], 'B'), (['consumables'], 'C'),
+    )
+    
+    objects = SearchVectorManager()
+    
     def __str__(self):
-        return f"{self.name} ({self.model})"
\ No newline at end of file
+        return f"{self.name} ({self.model})"
+
+class FilmStats(models.Model):
+    """
+    Row of the starwarsrest_film_stats materialized view: number of characters,
+    starships and distinct starship pilots per film. Read only, refreshed by
+    StatsDAO.refresh_materialized_views().
+    """
+    film_id = models.IntegerField(primary_key=True)
+    name = models.CharField(max_length=200)
+    episode_id = models.IntegerField(null=True)
+    characters = models.IntegerField()
+    starships = models.IntegerField()
+    pilots = models.IntegerField()
+    
+    class Meta:
+        managed = False
+        db_table = 'starwarsrest_film_stats'
+        ordering = ['episode_id', 'name']
+
+
+class StarshipClassStats(models.Model):
+    """
+    Row of the starwarsrest_starship_class_stats materialized view: number of starships
+    and averages of their numeric quantities per (lowercased) starship_class. Read only,
+    refreshed by StatsDAO.refresh_materialized_views().
+    """
+    starship_class = models.CharField(max_length=100, primary_key=True)
+    starships = models.IntegerField()
+    avg_crew = models.FloatField(null=True)
+    avg_passengers = models.FloatField(null=True)
+    avg_cost_in_credits = models.FloatField(null=True)
+    max_cost_in_credits = models.BigIntegerField(null=True)
+    avg_length = models.FloatField(null=True)
+    avg_hyperdrive_rating = models.FloatField(null=True)
+    
+    class Meta:
+        managed = False
+        db_table = 'starwarsrest_starship_class_stats'
+        ordering = ['-starships', 'starship_class']
+
+
+class Change(models.Model):
+    """
+    Entry of the change log behind /api/changes/ and the change stream, appended by
+    statement level triggers on the film, character and starship tables (migrations
+    0007 and 0008) for every INSERT, UPDATE and DELETE, including the bulk paths and
+    COPY. Relation changes update the counters of both sides (see
+    RelationCountersMixin), these updates are logged as `related`. The deleted entries
+    are the tombstones of the deleted rows.
+
+    id is the change sequence. txid, the id of the writing transaction, orders the
+    entries by visibility: sequence numbers are allocated before the commit, a
+    transaction holding a lower one may commit after a higher one is read.
+    """
+    CREATED = 'created'
+    UPDATED = 'updated'
+    RELATED = 'related'
+    DELETED = 'deleted'
+    OPERATIONS = [
+        (CREATED, 'Created'),
+        (UPDATED, 'Updated'),
+        (RELATED, 'Relations changed'),
+        (DELETED, 'Deleted'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    txid = models.BigIntegerField()
+    object_type = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    operation = models.CharField(max_length=7, choices=OPERATIONS)
+    changed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['txid', 'id']
+        indexes = [
+            models.Index(fields=['txid', 'id'], name='change_position_idx'),
+            models.Index(fields=['changed_at'], name='change_changed_at_idx'),
+        ]
+
+    @property
+    def deleted(self):
+        return self.operation == self.DELETED
+
+
+class ChangeLogPruning(models.Model):
+    """
+    Single row recording how far the change log was pruned (see prune_change_log_task):
+    the entries logged before `before` were deleted, the newest of them was at the
+    position (txid, change_id). The cursors before it may have missed changes.
+    """
+    txid = models.BigIntegerField()
+    change_id = models.BigIntegerField()
+    before = models.DateTimeField()
+    pruned_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def position(self):
+        return self.txid, self.change_id
+
+
+class WebhookCursor(models.Model):
+    """
+    Delivery state of a WEBHOOK_URLS endpoint: the change log position it was sent up
+    to (see webhooks.py) and the retry state after failed deliveries.
+    """
+    url = models.URLField(max_length=500, unique=True)
+    txid = models.BigIntegerField()
+    change_id = models.BigIntegerField()
+    failures = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.url
+
+    @property
+    def position(self):
+        return self.txid, self.change_id
@@ -0,0 +1,146 @@
+"""
+Page number pagination without a COUNT(*) per page.
+
+The count of an unfiltered list of a large table is the planner's estimate (pg_class
+statistics scaled to the current table size), the small tables are counted in the
+same query. The other counts are exact and cached in the default cache under a hash
+of the count query, so the pages of a filter share one count. Every write clears the
+default cache (see cache_utils), which invalidates them with the data.
+The responses carry `count_exact` next to `count`.
+"""
+import hashlib
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+
+def is_unfiltered(queryset):
+    """True when the queryset selects every row of its table"""
+    query = queryset.query
+    return (
+        not query.where and not query.distinct and not query.combinator
+        and query.group_by is None and not query.is_sliced
+    )
+
+
+def table_count(queryset, threshold):
+    """
+    (count, exact) of the table of queryset in one query: the planner's row estimate
+    (reltuples scaled to the current number of pages) when it reaches threshold, the
+    exact COUNT(*) otherwise or when the table was never analyzed.
+    """
+    connection = connections[queryset.db]
+    table = connection.ops.quote_name(queryset.model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT CASE WHEN e.n >= %s THEN e.n ELSE (SELECT count(*) FROM {table}) END, e.n >= %s FROM ("
+            f"SELECT CASE WHEN reltuples >= 0 AND relpages > 0 THEN "
+            f"round(reltuples / relpages * (pg_relation_size(oid) / current_setting('block_size')::int))::bigint "
+            f"ELSE -1 END AS n FROM pg_class WHERE oid = %s::regclass) e",
+            [threshold, threshold, queryset.model._meta.db_table],
+        )
+        count, estimated = cursor.fetchone()
+        return count, not estimated
+
+
+def count_cache_key(queryset):
+    sql, params = queryset.query.sql_with_params()
+    digest = hashlib.sha1(repr((queryset.db, sql, params)).encode()).hexdigest()
+    return f'count:{queryset.model._meta.label_lower}:{digest}'
+
+
+class EstimatedCountPage(Page):
+    """Page of an estimated count, which may be short of the real one: a full page has a next page"""
+
+    def has_next(self):
+        if self.paginator.count_exact:
+            return super().has_next()
+        return len(self) == self.paginator.per_page
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator whose count is estimated for the unfiltered lists of the tables larger
+    than PAGINATION_ESTIMATE_THRESHOLD and cached for the other lists.
+    count_exact tells which one it is.
+    """
+    count_exact = True
+
+    @cached_property
+    def count(self):
+        if is_unfiltered(self.object_list):
+            count, self.count_exact = table_count(self.object_list, settings.PAGINATION_ESTIMATE_THRESHOLD)
+            return count
+        key = count_cache_key(self.object_list)
+        count = cache.get(key)
+        if count is None:
+            count = self.object_list.count()
+            cache.set(key, count, timeout=settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        return count
+
+    async def acount(self):
+        """count for the async views, fills the cached property"""
+        if is_unfiltered(self.object_list):
+            self.count, self.count_exact = await sync_to_async(table_count)(
+                self.object_list, settings.PAGINATION_ESTIMATE_THRESHOLD,
+            )
+            return self.count
+        key = count_cache_key(self.object_list)
+        count = await cache.aget(key)
+        if count is None:
+            count = await self.object_list.acount()
+            await cache.aset(key, count, timeout=settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        self.count = count
+        return count
+
+    def validate_number(self, number):
+        if self.count_exact:
+            return super().validate_number(number)
+        # The pages past an estimated count may exist, they come back empty otherwise
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        # Sets count_exact
+        self.count
+        if self.count_exact:
+            return super().page(number)
+        # Not cut at the estimated count
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(self.object_list[bottom:bottom + self.per_page], number, self)
+
+    def _get_page(self, *args, **kwargs):
+        return EstimatedCountPage(*args, **kwargs)
+
+
+class EstimatedCountPagination(PageNumberPagination):
+    """PageNumberPagination with EstimatedCountPaginator, adds count_exact to the responses"""
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.page.paginator.count,
+            'count_exact': self.page.paginator.count_exact,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties']['count_exact'] = {
+            'type': 'boolean',
+            'description': 'False when count is an estimate, for the unfiltered lists of large tables',
+        }
+        return schema
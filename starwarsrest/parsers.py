@@ -0,0 +1,31 @@
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from .renderers import FastJSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSON parser backed by orjson when it is installed.
+    Falls back to the stock DRF parser when orjson is not available.
+    """
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', 'utf-8')
+
+        try:
+            content = stream.read()
+            if encoding.lower().replace('-', '') != 'utf8':
+                content = content.decode(encoding)
+            return orjson.loads(content)
+        except (ValueError, orjson.JSONDecodeError) as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,40 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSON renderer backed by orjson when it is installed.
+    Dates and datetimes are serialized natively, everything orjson does not know
+    about (Decimal, lazy strings, querysets...) goes through the DRF encoder.
+    Falls back to the stock DRF renderer when orjson is not available.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+
+        # orjson only supports a fixed indent of two spaces
+        option = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+
+        try:
+            ret = orjson.dumps(data, default=encoders.JSONEncoder().default, option=option)
+        except orjson.JSONEncodeError:
+            # e.g. integers wider than 64 bits, let the stdlib handle them
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Keep the output a strict javascript subset, same as the DRF renderer
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
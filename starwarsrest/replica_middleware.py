@@ -0,0 +1,58 @@
+import hashlib
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+from .db_router import replica_reads, wrote
+
+PINS_CACHE_ALIAS = 'replica_pins'
+
+
+class ReplicaPinningMiddleware:
+    """
+    Middleware opening a replica read context (see db_router) for the GET/HEAD requests.
+    A client writing to the database is pinned to the primary for REPLICA_PIN_SECONDS, so
+    that it reads its own writes while the replicas catch up. Clients are identified by
+    their Authorization header or session cookie, anonymous clients can't write.
+    Does nothing when no replica is configured. Runs in sync and async mode.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        client = self._client_key(request)
+        enabled = request.method in SAFE_METHODS and not (client and caches[PINS_CACHE_ALIAS].get(client))
+        with replica_reads(enabled):
+            response = self.get_response(request)
+            if client and wrote():
+                caches[PINS_CACHE_ALIAS].set(client, True, settings.REPLICA_PIN_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+
+        client = self._client_key(request)
+        enabled = request.method in SAFE_METHODS and not (client and await caches[PINS_CACHE_ALIAS].aget(client))
+        with replica_reads(enabled):
+            response = await self.get_response(request)
+            if client and wrote():
+                await caches[PINS_CACHE_ALIAS].aset(client, True, settings.REPLICA_PIN_SECONDS)
+        return response
+
+    def _client_key(self, request):
+        credentials = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        if not credentials:
+            return None
+        return 'pin:' + hashlib.sha256(credentials.encode('utf-8')).hexdigest()
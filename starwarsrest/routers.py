@@ -0,0 +1,19 @@
+from django.urls import URLPattern
+from rest_framework.routers import DefaultRouter
+
+
+class AsyncReadRouter(DefaultRouter):
+    """
+    DefaultRouter serving the viewsets having an as_async_view() (see AsyncReadMixin)
+    through their async view, used under ASGI when the ASYNC_VIEWS setting is on.
+    """
+
+    def get_urls(self):
+        urls = []
+        for url in super().get_urls():
+            viewset = getattr(url.callback, 'cls', None)
+            if isinstance(url, URLPattern) and hasattr(viewset, 'as_async_view'):
+                callback = viewset.as_async_view(url.callback.actions, **url.callback.initkwargs)
+                url = URLPattern(url.pattern, callback, url.default_args, url.name)
+            urls.append(url)
+        return urls
@@ -1,28 +1,114 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 from .models import Character, Film, Starship
 
 
-class FilmSerializer(serializers.ModelSerializer):
+def split_field_paths(paths):
+    """
+    Split dotted field paths into the top level names and the remaining paths per name.
+    e.g. ['name', 'pilots.name', 'pilots.films'] -> {'name', 'pilots'}, {'pilots': ['name', 'films']}
+    None is passed through as None, meaning no restriction.
+    """
+    if paths is None:
+        return None, {}
+    top_level = set()
+    nested = {}
+    for path in paths:
+        name, _, rest = path.partition('.')
+        top_level.add(name)
+        if rest:
+            nested.setdefault(name, []).append(rest)
+    return top_level, nested
+
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    ModelSerializer that accepts the optional `fields` and `expand` arguments.
+    `fields` limits the rendered fields. `expand` picks the relations rendered as
+    nested objects, the rest of the relations are rendered as primary keys.
+    Nested relations use dots, e.g. fields=['name', 'pilots.name'], expand=['pilots.films'].
+    When `expand` is None the relations keep their default nested representation.
+    """
+    # Relation name -> serializer class used when the relation is expanded
+    expandable_fields = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        self.requested_fields = fields
+        self.requested_expand = expand
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested, nested_fields = split_field_paths(self.requested_fields)
+        expanded, nested_expand = split_field_paths(self.requested_expand)
+
+        for name, serializer_class in self.expandable_fields.items():
+            if name not in fields:
+                continue
+            if expanded is not None and name not in expanded:
+                fields[name] = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+            else:
+                fields[name] = serializer_class(
+                    many=True,
+                    required=False,
+                    fields=nested_fields.get(name),
+                    expand=None if expanded is None else nested_expand.get(name, []),
+                )
+
+        if requested is not None:
+            fields = {name: field for name, field in fields.items() if name in requested}
+        return fields
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None, expand=None):
+        """
+        Shape the queryset for the given `fields` and `expand`: restrict the SELECT
+        list with only() and prefetch just the relations that will be rendered.
+        """
+        requested, nested_fields = split_field_paths(fields)
+        expanded, nested_expand = split_field_paths(expand)
+        model = queryset.model
+
+        if requested is not None:
+            columns = [field.name for field in model._meta.concrete_fields if field.name in requested]
+            queryset = queryset.only('id', *columns)
+
+        for name, serializer_class in cls.expandable_fields.items():
+            if requested is not None and name not in requested:
+                continue
+            related_model = model._meta.get_field(name).related_model
+            if expanded is not None and name not in expanded:
+                related_queryset = related_model.objects.only('id')
+            else:
+                related_queryset = serializer_class.setup_eager_loading(
+                    related_model.objects.all(),
+                    nested_fields.get(name),
+                    None if expanded is None else nested_expand.get(name, []),
+                )
+            queryset = queryset.prefetch_related(Prefetch(name, queryset=related_queryset))
+        return queryset
+
+
+class FilmSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Film
-        fields = '__all__'
+        exclude = ['search_vector']
 
 
-class CharacterSerializer(serializers.ModelSerializer):
-    films = FilmSerializer(many=True, required=False)
+class CharacterSerializer(DynamicFieldsModelSerializer):
+    expandable_fields = {'films': FilmSerializer}
 
     class Meta:
         model = Character
-        fields = '__all__'
+        exclude = ['search_vector']
 
 
-class StarshipSerializer(serializers.ModelSerializer):
-    films = FilmSerializer(many=True, required=False)
-    pilots = CharacterSerializer(many=True, required=False)
+class StarshipSerializer(DynamicFieldsModelSerializer):
+    expandable_fields = {'films': FilmSerializer, 'pilots': CharacterSerializer}
 
     class Meta:
         model = Starship
-        fields = '__all__'
+        exclude = ['search_vector']
 
 
 class CreateCharacterSerializer(serializers.ModelSerializer):
@@ -30,7 +116,7 @@ class CreateCharacterSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Character
-        fields = '__all__'
+        exclude = ['search_vector']
 
 
 class CreateStarshipSerializer(serializers.ModelSerializer):
@@ -39,4 +125,4 @@ class CreateStarshipSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Starship
-        fields = '__all__'
+        exclude = ['search_vector']
@@ -1,3 +1,4 @@
+import time
 import requests
 from django.conf import settings
 from decouple import config
@@ -5,12 +6,21 @@ from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from django.core.exceptions import ValidationError
 from .models import Character, Film, Starship
+from .metrics import SWAPI_REQUEST_LATENCY, SWAPI_RETRIES
 
 
 # Get the setting for allowing unofficial records
 ALLOW_UNOFFICIAL_RECORDS = config('ALLOW_UNOFFICIAL_RECORDS', default=True, cast=bool)
 
 
+class CountingRetry(Retry):
+    """Retry strategy counting every retry into the SWAPI_RETRIES metric"""
+
+    def increment(self, *args, **kwargs):
+        SWAPI_RETRIES.inc()
+        return super().increment(*args, **kwargs)
+
+
 class SwapiService:
     """Service for interacting with the Star Wars API (SWAPI)"""
     
@@ -22,7 +32,7 @@ class SwapiService:
         self.session.verify = False
         requests.packages.urllib3.disable_warnings()
         
-        retry_strategy = Retry(
+        retry_strategy = CountingRetry(
             total=3,
             backoff_factor=1,
             status_forcelist=[429, 500, 502, 503, 504],
@@ -32,8 +42,11 @@ class SwapiService:
         self.session.mount("https://", adapter)
     
     def _make_request(self, url, timeout=10):
+        start = time.perf_counter()
+        outcome = 'error'
         try:
             response = self.session.get(url, timeout=timeout)
+            outcome = str(response.status_code)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.Timeout:
@@ -48,6 +61,8 @@ class SwapiService:
             raise ValidationError(f"Error communicating with SWAPI: {str(e)}")
         except ValueError:  # JSON decode error
             raise ValidationError("Invalid response from SWAPI")
+        finally:
+            SWAPI_REQUEST_LATENCY.labels(outcome).observe(time.perf_counter() - start)
     
     def search_character(self, name):
         """Search for a character by name in SWAPI"""
@@ -188,7 +203,7 @@ class SwapiService:
     
     def populate_character_from_swapi(self, swapi_data):
         """Convert SWAPI character data to our model format"""
-        return {
+        data = {
             'name': swapi_data['name'],
             'swapi_id': int(swapi_data['url'].split('/')[-2]),  # Extract ID from URL
             'birth_year': swapi_data.get('birth_year'),
@@ -201,6 +216,8 @@ class SwapiService:
             'created': swapi_data.get('created'),
             'edited': swapi_data.get('edited'),
         }
+        data.update(Character.parse_numeric_fields(data))
+        return data
     
     def populate_film_from_swapi(self, swapi_data):
         """Convert SWAPI film data to our model format"""
@@ -218,7 +235,7 @@ class SwapiService:
     
     def populate_starship_from_swapi(self, swapi_data):
         """Convert SWAPI starship data to our model format"""
-        return {
+        data = {
             'name': swapi_data['name'],
             'model': swapi_data['model'],
             'swapi_id': int(swapi_data['url'].split('/')[-2]),  # Extract ID from URL
@@ -235,4 +252,6 @@ class SwapiService:
             'consumables': swapi_data.get('consumables'),
             'created': swapi_data.get('created'),
             'edited': swapi_data.get('edited'),
-        }
\ No newline at end of file
+        }
+        data.update(Starship.parse_numeric_fields(data))
+        return data
\ No newline at end of file
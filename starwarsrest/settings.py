@@ -12,7 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 import os
 from pathlib import Path
-from decouple import config
+from decouple import config, Csv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -43,22 +43,31 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'drf_spectacular',
     'django_filters',
+    'django.contrib.postgres',
     'starwarsrest.apps.StarwarsrestConfig',
 ]
 
 MIDDLEWARE = [
+    'starwarsrest.instrumentation_middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Before sessions and authentication so that cache hits skip them
+    'starwarsrest.cache_middleware.RedisCacheMiddleware',
+    'starwarsrest.replica_middleware.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'starwarsrest.cache_middleware.RedisCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'starwarsrest.urls'
 
+# Requests running more queries or taking longer (in milliseconds) are logged as warnings
+# by the InstrumentationMiddleware
+QUERY_COUNT_BUDGET = config('QUERY_COUNT_BUDGET', default=20, cast=int)
+LATENCY_BUDGET_MS = config('LATENCY_BUDGET_MS', default=500, cast=int)
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -89,6 +98,11 @@ DATABASES = {
         'PASSWORD': config('DB_PASSWORD'),
         'HOST': config('DB_HOST'),
         'PORT': config('DB_PORT'),
+        # Persistent connections: reused by the requests/tasks of a worker for DB_CONN_MAX_AGE seconds
+        # (0 closes them after every request, None never), checked before reuse with DB_CONN_HEALTH_CHECKS.
+        # Always 0 under ASGI, see asgi.py
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=lambda v: None if v == 'None' else int(v)),
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
     }
 }
 
@@ -97,6 +111,24 @@ DATABASES['default']['TEST'] = {
     'CREATE_DB': False,
 }
 
+# Read replicas, a comma separated list of host[:port] with the credentials of the primary.
+# Each one gets a replica_<n> alias used by the GET requests, see db_router.py
+DATABASE_REPLICAS = []
+for index, replica in enumerate(config('DB_REPLICAS', default='', cast=Csv())):
+    host, _, port = replica.partition(':')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{index}')
+
+DATABASE_ROUTERS = ['starwarsrest.db_router.PrimaryReplicaRouter']
+
+# Seconds a client reads from the primary after a write, should cover the replication lag
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -140,18 +172,42 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Serve the list, retrieve and search actions with async views, for ASGI deployments (see asgi.py)
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
+# Full-text search ranks at most this many matches per model, the first ones found by the index
+SEARCH_MAX_CANDIDATES = config('SEARCH_MAX_CANDIDATES', default=10000, cast=int)
+
+# Unfiltered paginated lists of tables with more rows than this return the planner's row estimate
+# as their count instead of running COUNT(*), see pagination.py
+PAGINATION_ESTIMATE_THRESHOLD = config('PAGINATION_ESTIMATE_THRESHOLD', default=100000, cast=int)
+# Seconds the exact counts of the other paginated lists are cached, writes clear them earlier
+PAGINATION_COUNT_CACHE_TIMEOUT = config('PAGINATION_COUNT_CACHE_TIMEOUT', default=300, cast=int)
+
 # DRF settings
+# Use the orjson backed renderer/parser, set FAST_JSON to False to go back to the stdlib json ones
+FAST_JSON = config('FAST_JSON', default=True, cast=bool)
+
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'starwarsrest.pagination.EstimatedCountPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'starwarsrest.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'starwarsrest.permissions.IsAuthenticatedOrReadOnly',
-    ]
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'starwarsrest.renderers.FastJSONRenderer' if FAST_JSON else 'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'starwarsrest.parsers.FastJSONParser' if FAST_JSON else 'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 # Swagger settings
@@ -163,17 +219,124 @@ SPECTACULAR_SETTINGS = {
 }
 
 # Redis cache configuration
+# PooledRedisCache reuses the redis client instead of building one per cache operation
+REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/1')
+TOKEN_CACHE_URL = config('TOKEN_CACHE_URL', default=REDIS_URL.rsplit('/', 1)[0] + '/2')
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
-        'LOCATION': config('REDIS_URL', default='redis://localhost:6379/1'),
-    }
+        'BACKEND': 'starwarsrest.cache_backend.PooledRedisCache',
+        'LOCATION': REDIS_URL,
+    },
+    # Authentication tokens, kept apart from the default cache which is cleared on every write
+    'tokens': {
+        'BACKEND': 'starwarsrest.cache_backend.PooledRedisCache',
+        'LOCATION': TOKEN_CACHE_URL,
+    },
+    # Clients pinned to the primary database after a write, see ReplicaPinningMiddleware
+    'replica_pins': {
+        'BACKEND': 'starwarsrest.cache_backend.PooledRedisCache',
+        'LOCATION': TOKEN_CACHE_URL,
+        'KEY_PREFIX': 'replica',
+    },
+    # Character co-appearance graph shared by the processes, see graph.py
+    'graph': {
+        'BACKEND': 'starwarsrest.cache_backend.PooledRedisCache',
+        'LOCATION': TOKEN_CACHE_URL,
+        'KEY_PREFIX': 'graph',
+    },
+    # Name changes replayed by the per process autocomplete indexes, see autocomplete.py
+    'autocomplete': {
+        'BACKEND': 'starwarsrest.cache_backend.PooledRedisCache',
+        'LOCATION': TOKEN_CACHE_URL,
+        'KEY_PREFIX': 'autocomplete',
+    },
 }
 
+# Seconds between two checks of the autocomplete changes made by the other processes
+AUTOCOMPLETE_SYNC_INTERVAL = config('AUTOCOMPLETE_SYNC_INTERVAL', default=1.0, cast=float)
+
+# Films with more characters are walked at query time instead of being expanded into the co-appearance graph
+GRAPH_MAX_FILM_SIZE = config('GRAPH_MAX_FILM_SIZE', default=100, cast=int)
+
+# Change stream (see change_stream.py): open streams per process, events queued per client
+# before it is switched to catching up from the log, seconds between two reads of the log
+# without notification and between two keepalive comments of an idle stream
+CHANGE_STREAM_MAX_SUBSCRIBERS = config('CHANGE_STREAM_MAX_SUBSCRIBERS', default=10000, cast=int)
+CHANGE_STREAM_QUEUE_SIZE = config('CHANGE_STREAM_QUEUE_SIZE', default=1000, cast=int)
+CHANGE_STREAM_POLL_INTERVAL = config('CHANGE_STREAM_POLL_INTERVAL', default=1.0, cast=float)
+CHANGE_STREAM_KEEPALIVE = config('CHANGE_STREAM_KEEPALIVE', default=15.0, cast=float)
+
+# CachedTokenAuthentication: seconds a token stays in the shared cache and in the per process cache
+# (per process entries are not evicted by other processes), and size of the per process cache
+TOKEN_CACHE_TTL = config('TOKEN_CACHE_TTL', default=60, cast=int)
+TOKEN_LOCAL_CACHE_TTL = config('TOKEN_LOCAL_CACHE_TTL', default=5, cast=int)
+TOKEN_LOCAL_CACHE_SIZE = config('TOKEN_LOCAL_CACHE_SIZE', default=10000, cast=int)
+
 # Celery Configuration
 CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default='redis://localhost:6379/0')
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
-CELERY_TIMEZONE = 'UTC'
\ No newline at end of file
+CELERY_TIMEZONE = 'UTC'
+
+# Webhooks (see webhooks.py): endpoints receiving the changes, HMAC key of their signature,
+# log entries per request, requests per endpoint and task, seconds between two deliveries
+# by Celery beat, request timeout and longest delay between two retries in seconds
+WEBHOOK_URLS = config('WEBHOOK_URLS', default='', cast=Csv())
+WEBHOOK_SECRET = config('WEBHOOK_SECRET', default='')
+WEBHOOK_BATCH_SIZE = config('WEBHOOK_BATCH_SIZE', default=500, cast=int)
+WEBHOOK_MAX_BATCHES = config('WEBHOOK_MAX_BATCHES', default=20, cast=int)
+WEBHOOK_INTERVAL = config('WEBHOOK_INTERVAL', default=5.0, cast=float)
+WEBHOOK_TIMEOUT = config('WEBHOOK_TIMEOUT', default=10.0, cast=float)
+WEBHOOK_RETRY_MAX_DELAY = config('WEBHOOK_RETRY_MAX_DELAY', default=3600, cast=int)
+
+# Days the change log entries are kept, 0 keeps them forever, and seconds between two prunings
+CHANGE_LOG_RETENTION_DAYS = config('CHANGE_LOG_RETENTION_DAYS', default=30, cast=int)
+CHANGE_LOG_PRUNE_INTERVAL = config('CHANGE_LOG_PRUNE_INTERVAL', default=3600.0, cast=float)
+
+CELERY_BEAT_SCHEDULE = {
+    'deliver-webhooks': {
+        'task': 'starwarsrest.webhooks.deliver_webhooks_task',
+        'schedule': WEBHOOK_INTERVAL,
+    },
+    'prune-change-log': {
+        'task': 'starwarsrest.tasks.prune_change_log_task',
+        'schedule': CHANGE_LOG_PRUNE_INTERVAL,
+    },
+}
+
+# Logging
+# Records go through a queue to a background thread, so requests never block on stdout/stderr.
+# The per request cache lines are DEBUG and sampled (one out of CACHE_LOG_SAMPLE_RATE),
+# hit/miss counts are logged as one summary line every CACHE_STATS_LOG_INTERVAL seconds.
+CACHE_STATS_LOG_INTERVAL = config('CACHE_STATS_LOG_INTERVAL', default=60, cast=int)
+CACHE_LOG_SAMPLE_RATE = config('CACHE_LOG_SAMPLE_RATE', default=100, cast=int)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {
+            'format': '{asctime} {levelname} {name} {message}',
+            'style': '{',
+        },
+    },
+    'handlers': {
+        'queue': {
+            '()': 'starwarsrest.logging_utils.QueueLogHandler',
+            'formatter': 'simple',
+        },
+    },
+    'loggers': {
+        'starwarsrest': {
+            'handlers': ['queue'],
+            'level': config('LOG_LEVEL', default='WARNING'),
+            'propagate': False,
+        },
+        'starwarsrest.cache_middleware': {
+            'level': config('CACHE_LOG_LEVEL', default='INFO'),
+        },
+    },
+}
@@ -1,7 +1,13 @@
-from django.db.models.signals import post_save, post_delete
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
-from django.core.cache import cache
+from rest_framework.authtoken.models import Token
 from .models import Character, Film, Starship
+from .authentication import invalidate_token
+from .cache_utils import invalidate_cache_for_model
+from .graph import update_graph
+from .autocomplete import TYPE_NAMES, update_autocomplete
 
 
 @receiver(post_save, sender=Character)
@@ -15,4 +21,65 @@ def invalidate_cache(sender, **kwargs):
     Invalidate the entire cache when any model instance is saved or deleted.
     This ensures that GET requests will fetch fresh data after any modification.
     """
-    cache.clear()
\ No newline at end of file
+    invalidate_cache_for_model(sender._meta.model_name)
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_token_cache(sender, instance, **kwargs):
+    """
+    Evict deleted or regenerated tokens from the CachedTokenAuthentication caches.
+    Deleting a user deletes its tokens, which evicts them too.
+    """
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Evict the tokens of a changed user, so that e.g. a deactivated user is refused.
+    Logins only update last_login and keep the cached tokens.
+    """
+    if created or (update_fields is not None and set(update_fields) == {'last_login'}):
+        return
+    for key in Token.objects.filter(user=instance).values_list('key', flat=True):
+        invalidate_token(key)
+
+
+@receiver(m2m_changed, sender=Character.films.through)
+def update_coappearance_graph(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Apply the film membership changes to the co-appearance graph once they are committed.
+    reverse is True when the relation is changed from the film side (film.characters).
+    """
+    if action in ('post_add', 'post_remove'):
+        pairs = [(instance.pk, pk) if reverse else (pk, instance.pk) for pk in pk_set]
+        change = {'added': pairs} if action == 'post_add' else {'removed': pairs}
+    elif action == 'post_clear':
+        change = {'cleared_films': [instance.pk]} if reverse else {'cleared_characters': [instance.pk]}
+    else:
+        return
+    transaction.on_commit(lambda: update_graph(**change))
+
+
+@receiver(post_delete, sender=Character)
+@receiver(post_delete, sender=Film)
+def remove_from_coappearance_graph(sender, instance, **kwargs):
+    """Deletions remove the memberships without m2m_changed, clear them in the graph once committed"""
+    change = {'cleared_characters': [instance.pk]} if sender is Character else {'cleared_films': [instance.pk]}
+    transaction.on_commit(lambda: update_graph(**change))
+
+
+@receiver(post_save, sender=Character)
+@receiver(post_save, sender=Film)
+@receiver(post_save, sender=Starship)
+@receiver(post_delete, sender=Character)
+@receiver(post_delete, sender=Film)
+@receiver(post_delete, sender=Starship)
+def update_autocomplete_index(sender, instance, signal, update_fields=None, **kwargs):
+    """Publish the new name, or the deletion, to the autocomplete indexes once committed"""
+    if update_fields is not None and 'name' not in update_fields:
+        return
+    name = None if signal is post_delete else instance.name
+    change = [(TYPE_NAMES[sender], instance.pk, name)]
+    transaction.on_commit(lambda: update_autocomplete(change))
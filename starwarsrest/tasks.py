@@ -1,2 +1,22 @@
 # This file is needed to make Celery discover tasks in this app
-from .management.commands.populate_swapi_data import populate_films_task, populate_characters_task, populate_starships_task
\ No newline at end of file
+import logging
+from datetime import timedelta
+from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+from .dao import ChangesDAO
+from .management.commands.populate_swapi_data import populate_films_task, populate_characters_task, populate_starships_task, refresh_stats_task
+from .webhooks import deliver_webhooks_task
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def prune_change_log_task():
+    """Delete the change log entries older than CHANGE_LOG_RETENTION_DAYS, run by Celery beat"""
+    if not settings.CHANGE_LOG_RETENTION_DAYS:
+        return
+    before = timezone.now() - timedelta(days=settings.CHANGE_LOG_RETENTION_DAYS)
+    deleted = ChangesDAO.prune_changes(before)
+    if deleted:
+        logger.info("Pruned %d change log entries logged before %s", deleted, before.isoformat())
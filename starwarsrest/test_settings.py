@@ -9,9 +9,27 @@ from .settings import *
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
-    }
+    },
+    'tokens': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
+    'replica_pins': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
+    'graph': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
+    'autocomplete': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
 }
 
+# No per process token cache, it would outlive the test transactions
+TOKEN_LOCAL_CACHE_TTL = 0
+
+# No background rebuild of the autocomplete index, its thread would not see the test transactions
+AUTOCOMPLETE_SYNC_INTERVAL = 3600
+
 # Remove cache middleware for tests
 MIDDLEWARE = [
     middleware for middleware in MIDDLEWARE 
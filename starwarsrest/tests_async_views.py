@@ -0,0 +1,102 @@
+import json
+from asgiref.sync import async_to_sync
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from django.urls import include, path
+from rest_framework import routers
+from .models import Character, Film, Starship
+from .routers import AsyncReadRouter
+from .views import CharacterViewSet, FilmViewSet, StarshipViewSet
+
+async_router = AsyncReadRouter()
+sync_router = routers.DefaultRouter()
+for router in (async_router, sync_router):
+    router.register(r'characters', CharacterViewSet)
+    router.register(r'films', FilmViewSet)
+    router.register(r'starships', StarshipViewSet)
+
+# URL configuration of the tests, the async views under /api/ and the sync ones under /sync/
+urlpatterns = [
+    path('api/', include(async_router.urls)),
+    path('sync/', include(sync_router.urls)),
+]
+
+
+@override_settings(ROOT_URLCONF='starwarsrest.tests_async_views')
+class AsyncViewsTest(TestCase):
+    """Test cases for the async list, retrieve and search actions"""
+
+    def setUp(self):
+        film = Film.objects.create(name='A New Hope', swapi_id=1, episode_id=4, release_date='1977-05-25')
+        for i in range(25):
+            character = Character.objects.create(name=f'Character {i:02}', swapi_id=i + 1, mass=str(50 + i))
+            character.films.add(film)
+        starship = Starship.objects.create(name='X-wing', model='T-65 X-wing', swapi_id=12, crew='1')
+        starship.films.add(film)
+        starship.pilots.add(Character.objects.get(name='Character 00'))
+        self.film = film
+        self.starship = starship
+
+    async def assertSameAsSync(self, url, params=None, status_code=200):
+        response = await self.async_client.get(f'/api/{url}', params or {})
+        sync_response = await self.async_client.get(f'/sync/{url}', params or {})
+        self.assertEqual(response.status_code, status_code)
+        self.assertEqual(response.status_code, sync_response.status_code)
+        self.assertEqual(response['Content-Type'], sync_response['Content-Type'])
+        self.assertIn('Accept', response['Vary'])
+        self.assertEqual(
+            json.loads(response.content),
+            json.loads(sync_response.content.decode().replace('/sync/', '/api/'))
+        )
+        return response
+
+    async def test_list(self):
+        """Test that the async list returns the same pages as the sync one"""
+        response = await self.assertSameAsSync('characters/')
+        self.assertEqual(json.loads(response.content)['count'], 25)
+        await self.assertSameAsSync('characters/', {'page': 2})
+        await self.assertSameAsSync('characters/', {'page': 'last'})
+        await self.assertSameAsSync('characters/', {'page': 5}, status_code=404)
+        await self.assertSameAsSync('starships/')
+        await self.assertSameAsSync('films/')
+
+    async def test_list_filters_and_fieldsets(self):
+        """Test that the filters, ordering, fields and expand apply to the async list"""
+        await self.assertSameAsSync('characters/', {'mass__gte': 70, 'ordering': '-mass'})
+        await self.assertSameAsSync('characters/', {'search': 'Character 1'})
+        await self.assertSameAsSync('characters/', {'fields': 'id,name,films', 'expand': ''})
+        await self.assertSameAsSync('starships/', {'expand': 'pilots'})
+
+    async def test_retrieve(self):
+        """Test that the async retrieve returns the same object as the sync one"""
+        await self.assertSameAsSync(f'starships/{self.starship.id}/')
+        await self.assertSameAsSync(f'films/{self.film.id}/', {'fields': 'name'})
+        await self.assertSameAsSync('starships/999999/', status_code=404)
+        await self.assertSameAsSync('starships/abc/', status_code=404)
+
+    async def test_search(self):
+        """Test that the async search returns the same objects as the sync one"""
+        await self.assertSameAsSync('characters/search/', {'name': 'character 2'})
+        await self.assertSameAsSync('starships/search/', {'name': 'x-wing', 'expand': 'films'})
+        await self.assertSameAsSync('films/search/', status_code=400)
+
+    def test_async_queries(self):
+        """Test that the async views run the same queries, counted by the instrumentation middleware"""
+        sync_response = self.client.get('/sync/characters/')
+        response = async_to_sync(self.async_client.get)('/api/characters/')
+        # COUNT, SELECT and the films prefetch
+        self.assertIn('desc="3 queries"', sync_response['Server-Timing'])
+        self.assertIn('desc="3 queries"', response['Server-Timing'])
+
+    async def test_other_actions_use_sync_view(self):
+        """Test that writes and the browsable API are handed to the sync view"""
+        response = await self.async_client.post('/api/films/', {'name': 'Rogue One'}, content_type='application/json')
+        self.assertIn(response.status_code, (401, 403))
+        response = await self.async_client.get('/api/films/', {'format': 'api'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+
+    def test_unconfigured(self):
+        """Test that a viewset without its async DAO methods is refused when defined"""
+        with self.assertRaisesMessage(ImproperlyConfigured, 'acount_objects'):
+            type('PartialViewSet', (FilmViewSet,), {'acount_objects': None})
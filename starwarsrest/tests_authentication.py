@@ -0,0 +1,89 @@
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory
+from .authentication import CachedTokenAuthentication, TOKEN_CACHE_ALIAS, _cache_key, _local_cache
+
+
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+        TOKEN_CACHE_ALIAS: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    },
+    TOKEN_LOCAL_CACHE_TTL=60,
+)
+class CachedTokenAuthenticationTest(TestCase):
+    """Test cases for the cached token authentication"""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.auth = CachedTokenAuthentication()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.token = Token.objects.create(user=self.user)
+        _local_cache.clear()
+        caches[TOKEN_CACHE_ALIAS].clear()
+
+    def tearDown(self):
+        _local_cache.clear()
+
+    def _authenticate(self, key):
+        return self.auth.authenticate(self.factory.get('/', HTTP_AUTHORIZATION=f'Token {key}'))
+
+    def test_cached_after_first_request(self):
+        """Test that the token is only looked up in the database once"""
+        with self.assertNumQueries(1):
+            user, token = self._authenticate(self.token.key)
+        with self.assertNumQueries(0):
+            self.assertEqual(self._authenticate(self.token.key), (user, token))
+        self.assertEqual(user, self.user)
+
+    def test_shared_cache(self):
+        """Test that another process finds the token in the shared cache"""
+        self._authenticate(self.token.key)
+        _local_cache.clear()
+        with self.assertNumQueries(0):
+            user, token = self._authenticate(self.token.key)
+        self.assertEqual(token.key, self.token.key)
+        self.assertEqual((user.pk, user.username, user.is_active), (self.user.pk, 'testuser', True))
+
+    def test_shared_cache_has_no_password(self):
+        """Test that the shared cache doesn't hold the password hash of the user"""
+        self._authenticate(self.token.key)
+        entry = caches[TOKEN_CACHE_ALIAS].get(_cache_key(self.token.key))
+        self.assertNotIn(self.user.password, repr(entry))
+        _local_cache.clear()
+        user, token = self._authenticate(self.token.key)
+        self.assertFalse(user.has_usable_password())
+
+    def test_invalid_token(self):
+        """Test that unknown tokens are refused"""
+        with self.assertRaises(AuthenticationFailed):
+            self._authenticate('invalid')
+
+    def test_deleted_token(self):
+        """Test that a deleted token is evicted from the caches"""
+        self._authenticate(self.token.key)
+        self.token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self._authenticate(self.token.key)
+
+    def test_inactive_user(self):
+        """Test that deactivating a user evicts its tokens"""
+        self._authenticate(self.token.key)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self._authenticate(self.token.key)
+
+    def test_regenerated_by_command(self):
+        """Test that get_user_token --regenerate evicts the previous token"""
+        self._authenticate(self.token.key)
+        call_command('get_user_token', 'testuser', '--regenerate', stdout=StringIO())
+        with self.assertRaises(AuthenticationFailed):
+            self._authenticate(self.token.key)
+        user, token = self._authenticate(Token.objects.get(user=self.user).key)
+        self.assertEqual(user, self.user)
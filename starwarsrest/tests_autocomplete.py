@@ -0,0 +1,201 @@
+import os
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from . import autocomplete
+from .autocomplete import AutocompleteIndex, PrefixArray, get_autocomplete_index, name_keys
+from .dao import CharacterDAO
+from .models import Character, Film, Starship
+
+AUTOCOMPLETE_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    'tokens': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    'graph': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    'autocomplete': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+
+def _names(results):
+    return [result['name'] for result in results]
+
+
+class AutocompleteIndexTest(SimpleTestCase):
+    """Test cases for the in-memory prefix index"""
+
+    def setUp(self):
+        self.index = AutocompleteIndex({
+            # In name order, as read from the database
+            'characters': PrefixArray([(2, 'Anakin Skywalker'), (5, 'Kel Vos 1234'), (4, 'Leia Organa'),
+                                       (1, 'Luke Skywalker'), (3, 'Padmé Amidala')]),
+            'films': PrefixArray([(1, 'A New Hope'), (2, 'Return of the Jedi')]),
+            'starships': PrefixArray([(1, 'Sky Hopper'), (2, 'Jedi starfighter')]),
+        })
+
+    def test_name_keys(self):
+        """Test the normalization and the word keys, numbers excepted"""
+        self.assertEqual(name_keys('  Padmé  AMIDALA '), ['padme amidala', 'amidala'])
+        self.assertEqual(name_keys('Kel Vos 1234'), ['kel vos 1234', 'vos 1234'])
+        self.assertEqual(name_keys('1138 Clone'), ['1138 clone', 'clone'])
+
+    def test_prefixes(self):
+        """Test that any word of the name matches, across the types, in key order"""
+        self.assertEqual(self.index.search('sky'), [
+            {'type': 'starships', 'id': 1, 'name': 'Sky Hopper'},
+            {'type': 'characters', 'id': 2, 'name': 'Anakin Skywalker'},
+            {'type': 'characters', 'id': 1, 'name': 'Luke Skywalker'},
+        ])
+        self.assertEqual(_names(self.index.search('luke sky')), ['Luke Skywalker'])
+        self.assertEqual(_names(self.index.search('PADME')), ['Padmé Amidala'])
+        self.assertEqual(_names(self.index.search('padmé')), ['Padmé Amidala'])
+        self.assertEqual(self.index.search('1234'), [])
+        self.assertEqual(self.index.search(' '), [])
+
+    def test_types_and_limit(self):
+        """Test the type filter, the limit and that a name is returned once"""
+        self.assertEqual(_names(self.index.search('jedi', types=['films'])), ['Return of the Jedi'])
+        self.assertEqual(len(self.index.search('s', limit=2)), 2)
+        self.assertEqual(_names(self.index.search('l')), ['Leia Organa', 'Luke Skywalker'])
+
+    def test_apply(self):
+        """Test that the overlay serves the created, renamed and deleted names"""
+        self.index.apply([
+            ('characters', 6, 'Lando Calrissian'),
+            ('characters', 1, 'Luke Skywalker (Jedi)'),
+            ('characters', 4, None),
+        ])
+        self.assertEqual(_names(self.index.search('l')), ['Lando Calrissian', 'Luke Skywalker (Jedi)'])
+        self.index.apply([('characters', 6, 'Lando')])
+        self.assertEqual(_names(self.index.search('calr')), [])
+        self.assertEqual(_names(self.index.search('lan')), ['Lando'])
+
+
+@override_settings(CACHES=AUTOCOMPLETE_CACHE, AUTOCOMPLETE_SYNC_INTERVAL=0)
+class AutocompleteMaintenanceTest(TestCase):
+    """Test cases for the maintenance of the per process indexes"""
+
+    def setUp(self):
+        # The rebuilds run synchronously, a thread would not see the test transaction
+        patcher = patch.object(autocomplete, '_start_rebuild', autocomplete._rebuild_and_swap)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        autocomplete.invalidate_autocomplete()
+        autocomplete._state = (None, None, 0.0)
+        self.luke = Character.objects.create(name='Luke Skywalker')
+        Film.objects.create(name='A New Hope')
+        get_autocomplete_index()
+
+    def tearDown(self):
+        autocomplete.invalidate_autocomplete()
+
+    def search(self, text):
+        return _names(get_autocomplete_index().search(text))
+
+    def test_index_is_reused(self):
+        """Test that the index is built once"""
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search('sky'), ['Luke Skywalker'])
+
+    def test_signals(self):
+        """Test that created, renamed and deleted rows update the index without rebuilding it"""
+        with self.captureOnCommitCallbacks(execute=True):
+            leia = Character.objects.create(name='Leia Organa')
+            Starship.objects.create(name='Lambda shuttle', model='Lambda-class')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search('l'), ['Lambda shuttle', 'Leia Organa', 'Luke Skywalker'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            leia.name = 'Princess Leia'
+            leia.save()
+            self.luke.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search('l'), ['Lambda shuttle', 'Princess Leia'])
+
+    def test_rollback_keeps_index(self):
+        """Test that changes are only applied when committed"""
+        with self.captureOnCommitCallbacks(execute=False):
+            Character.objects.create(name='Leia Organa')
+        self.assertEqual(self.search('leia'), [])
+
+    def test_other_process_replays(self):
+        """Test that another process replays the changes instead of rebuilding"""
+        other = (AutocompleteIndex.from_database(), autocomplete._state[1], 0.0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Character.objects.create(name='Leia Organa')
+        autocomplete._state = other
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search('leia'), ['Leia Organa'])
+
+    def test_bulk_writes(self):
+        """Test that bulk writes publish their names and the generator rebuilds the indexes"""
+        with self.captureOnCommitCallbacks(execute=True):
+            CharacterDAO.bulk_create_characters([{'name': 'Leia Organa'}])
+            CharacterDAO.bulk_update_characters([(self.luke.id, {'name': 'Luke'})])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search('l'), ['Leia Organa', 'Luke'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('generate_synthetic_data', films=0, characters=3, starships=0, swapi_names=1,
+                         keep_indexes=True, stdout=StringIO())
+        self.assertEqual(Character.objects.count(), 5)
+        # The query starting the rebuild is served by the previous index
+        self.assertEqual(len(get_autocomplete_index().arrays['characters']), 1)
+        self.assertEqual(len(get_autocomplete_index().arrays['characters']), 5)
+
+
+@override_settings(CACHES=AUTOCOMPLETE_CACHE, AUTOCOMPLETE_SYNC_INTERVAL=0)
+class AutocompleteRebuildTest(TransactionTestCase):
+    """Test cases for the background rebuilds of the index"""
+
+    def setUp(self):
+        autocomplete.invalidate_autocomplete()
+        autocomplete._state = (None, None, 0.0)
+        Character.objects.create(name='Luke Skywalker')
+        get_autocomplete_index()
+
+    def tearDown(self):
+        autocomplete.invalidate_autocomplete()
+        autocomplete._state = (None, None, 0.0)
+
+    def test_rebuild_in_background(self):
+        """Test that an invalidated index is served until the rebuilt one is swapped in"""
+        Character.objects.bulk_create([Character(name='Leia Organa')])
+        autocomplete.invalidate_autocomplete()
+        with self.assertNumQueries(0):
+            self.assertEqual(_names(get_autocomplete_index().search('l')), ['Luke Skywalker'])
+        thread = autocomplete._rebuilding
+        if thread is not None:
+            thread.join()
+        self.assertEqual(_names(get_autocomplete_index().search('l')), ['Leia Organa', 'Luke Skywalker'])
+
+    def test_fork_during_rebuild(self):
+        """Test that a worker forked while a thread of the master holds the lock can still use it"""
+        with autocomplete._lock:
+            pid = os.fork()
+            if pid == 0:
+                os._exit(0 if autocomplete._lock.acquire(timeout=1) and autocomplete._rebuilding is None else 1)
+        self.assertEqual(os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]), 0)
+
+
+class AutocompleteEndpointTest(TestCase):
+    """Test cases for the autocomplete endpoint"""
+
+    def setUp(self):
+        autocomplete.invalidate_autocomplete()
+        self.luke = Character.objects.create(name='Luke Skywalker')
+        self.film = Film.objects.create(name='Return of the Jedi')
+
+    def test_autocomplete(self):
+        """Test the id, name and type of the matches"""
+        response = self.client.get('/api/autocomplete/', {'q': 'jed'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [{'type': 'films', 'id': self.film.id, 'name': 'Return of the Jedi'}])
+        response = self.client.get('/api/autocomplete/', {'q': 'sky', 'type': 'films,starships'})
+        self.assertEqual(response.json(), [])
+
+    def test_invalid_parameters(self):
+        """Test the unknown types and invalid limits"""
+        for params in ({'q': 'l', 'type': 'planets'}, {'q': 'l', 'limit': 'ten'}, {'q': 'l', 'limit': 51}):
+            response = self.client.get('/api/autocomplete/', params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.json())
@@ -0,0 +1,125 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from .cache_middleware import RedisCacheMiddleware, CacheStats
+from .models import Film
+
+CACHE_MIDDLEWARE = 'starwarsrest.cache_middleware.RedisCacheMiddleware'
+
+
+class RedisCacheMiddlewareKeyTest(TestCase):
+    """Test cases for the RedisCacheMiddleware cache keys"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = RedisCacheMiddleware(lambda request: None)
+
+    def _key(self, params):
+        return self.middleware._generate_cache_key(self.factory.get('/api/starships/', params))
+
+    def test_key_includes_fields_and_expand(self):
+        """Test that fields and expand produce different cache keys"""
+        self.assertNotEqual(self._key({}), self._key({'fields': 'id,name'}))
+        self.assertNotEqual(self._key({}), self._key({'expand': 'pilots'}))
+        self.assertNotEqual(self._key({'expand': 'pilots'}), self._key({'expand': 'films'}))
+
+    def test_key_ignores_set_order(self):
+        """Test that the order of the fields and expand values does not matter"""
+        self.assertEqual(self._key({'fields': 'id,name'}), self._key({'fields': 'name, id'}))
+        self.assertEqual(self._key({'expand': 'films,pilots'}), self._key({'expand': 'pilots,films'}))
+
+    def test_key_includes_accept(self):
+        """Test that the Accept header is part of the cache key"""
+        json_request = self.factory.get('/api/starships/', HTTP_ACCEPT='application/json')
+        html_request = self.factory.get('/api/starships/', HTTP_ACCEPT='text/html')
+        self.assertNotEqual(self.middleware._generate_cache_key(json_request),
+                            self.middleware._generate_cache_key(html_request))
+
+    def test_cacheable_response(self):
+        """Test that responses setting cookies, private or varying on other headers are not cached"""
+        self.assertTrue(self.middleware._is_cacheable(HttpResponse(headers={'Vary': 'Accept, Cookie'})))
+        self.assertFalse(self.middleware._is_cacheable(HttpResponse(headers={'Vary': 'Accept-Language'})))
+        self.assertFalse(self.middleware._is_cacheable(HttpResponse(headers={'Cache-Control': 'private'})))
+        response = HttpResponse()
+        response.set_cookie('csrftoken', 'token')
+        self.assertFalse(self.middleware._is_cacheable(response))
+
+
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'tokens': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    },
+    MIDDLEWARE=[settings.MIDDLEWARE[0], settings.MIDDLEWARE[1], CACHE_MIDDLEWARE, *settings.MIDDLEWARE[2:]],
+)
+class RedisCacheMiddlewareFastPathTest(TestCase):
+    """Test cases for cache hits served before the session and authentication middleware"""
+
+    def setUp(self):
+        self.client = APIClient()
+        Film.objects.create(name='A New Hope', swapi_id=1, episode_id=4)
+        cache.clear()
+        self.url = reverse('film-list')
+
+    def test_anonymous_hit(self):
+        """Test that a second anonymous GET is served from the cache with the same headers"""
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertIn('cache;desc="miss"', first['Server-Timing'])
+        self.assertIn('cache;desc="hit"', second['Server-Timing'])
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['Vary'], second['Vary'])
+        self.assertEqual(first['Content-Type'], second['Content-Type'])
+
+    def test_authenticated_bypasses_cache(self):
+        """Test that authenticated requests are neither served from nor stored in the cache"""
+        user = User.objects.create_user(username='user', password='userpass')
+        token = Token.objects.create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        self.client.get(self.url)
+        response = self.client.get(self.url)
+        self.assertNotIn('cache;', response['Server-Timing'])
+
+        self.client.credentials()
+        response = self.client.get(self.url)
+        self.assertIn('cache;desc="miss"', response['Server-Timing'])
+
+    def test_session_cookie_bypasses_cache(self):
+        """Test that requests with a session cookie go through the whole stack"""
+        self.client.get(self.url)
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = 'session'
+        response = self.client.get(self.url)
+        self.assertNotIn('cache;', response['Server-Timing'])
+
+    def test_accept_variants(self):
+        """Test that the cached responses are kept apart per Accept header"""
+        self.client.get(self.url, HTTP_ACCEPT='application/json')
+        response = self.client.get(self.url, HTTP_ACCEPT='text/html')
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+
+
+class CacheStatsTest(TestCase):
+    """Test cases for the aggregated cache hit/miss counters"""
+
+    def test_summary_logged_once_per_interval(self):
+        """Test that hits and misses are logged as one summary line per interval"""
+        stats = CacheStats(interval=3600)
+        with self.assertNoLogs('starwarsrest.cache_middleware', level='INFO'):
+            stats.hit()
+            stats.hit()
+            stats.miss()
+        self.assertEqual((stats.hits, stats.misses), (2, 1))
+
+        stats._since -= 3600
+        with self.assertLogs('starwarsrest.cache_middleware', level='INFO') as logs:
+            stats.hit()
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('3 hits, 1 misses', logs.output[0])
+        self.assertEqual((stats.hits, stats.misses), (0, 0))
@@ -0,0 +1,239 @@
+import asyncio
+import json
+from datetime import timedelta
+from unittest.mock import ANY
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from .change_stream import ChangeBroker, format_position, get_change_broker
+from .dao import CharacterDAO, ChangesDAO, StarshipDAO
+from .models import Character, Change, Film
+from .tasks import prune_change_log_task
+
+
+class ChangesTest(TransactionTestCase):
+    """
+    Test cases for the change log and the /api/changes/ delta feed. Transactions are
+    committed: the entries of the running transactions are withheld by the feed.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.new_hope = Film.objects.create(name='A New Hope')
+        self.luke = Character.objects.create(name='Luke Skywalker')
+        self.cursor = self._get()['cursor']
+
+    def _get(self, **params):
+        response = self.client.get(reverse('changes-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def _sync(self, limit=100):
+        """All the changes after self.cursor as (type, id, deleted) tuples, advances the cursor"""
+        changes = []
+        while True:
+            data = self._get(since=self.cursor, limit=limit)
+            changes += [(change['type'], change['id'], change['deleted']) for change in data['changes']]
+            self.cursor = data['cursor']
+            if not data['has_more']:
+                return changes
+
+    def test_no_since(self):
+        """Test that without since the feed returns the current cursor and no changes"""
+        data = self._get()
+        self.assertEqual((data['changes'], data['has_more']), ([], False))
+        self.assertEqual(self._sync(), [])
+
+    def test_create_update_delete(self):
+        """Test that the writes are returned once per row with the current data, deletes as tombstones"""
+        han = Character.objects.create(name='Han Solo')
+        self.luke.height = 172
+        self.luke.save()
+        self.luke.height = 173
+        self.luke.save()
+        data = self._get(since=self.cursor)
+        self.assertEqual([(change['type'], change['id']) for change in data['changes']],
+                         [('characters', han.id), ('characters', self.luke.id)])
+        self.assertEqual(data['changes'][1]['data']['height'], 173)
+        self.cursor = data['cursor']
+
+        han_id, film_id = han.id, self.new_hope.id
+        han.delete()
+        self.new_hope.delete()
+        data = self._get(since=self.cursor)
+        self.assertEqual([(change['type'], change['id'], change['deleted']) for change in data['changes']],
+                         [('characters', han_id, True), ('films', film_id, True)])
+        self.assertNotIn('data', data['changes'][0])
+
+    def test_relations(self):
+        """Test that a relation change returns the rows of both sides"""
+        self.luke.films.add(self.new_hope)
+        self.assertEqual(sorted(self._sync()),
+                         [('characters', self.luke.id, False), ('films', self.new_hope.id, False)])
+        data = self._get(since='0-0')
+        luke = [change for change in data['changes'] if change['type'] == 'characters'][0]
+        self.assertEqual(luke['data']['films'], [self.new_hope.id])
+
+    def test_bulk_paths(self):
+        """Test that the bulk creates, updates and deletes of the DAOs are logged"""
+        leia, = CharacterDAO.bulk_create_characters([{'name': 'Leia Organa'}])
+        xwing, = StarshipDAO.bulk_create_starships([{'name': 'X-wing', 'model': 'T-65', 'pilots': [self.luke.id]}])
+        self.assertEqual(sorted(self._sync()), [
+            ('characters', self.luke.id, False), ('characters', leia.id, False), ('starships', xwing.id, False),
+        ])
+        Character.objects.filter(id=leia.id).update(height=150)
+        CharacterDAO.bulk_delete_characters([self.luke.id])
+        self.assertEqual(sorted(self._sync()), [
+            ('characters', self.luke.id, True), ('characters', leia.id, False), ('starships', xwing.id, False),
+        ])
+
+    def test_pagination(self):
+        """Test that following the cursors returns every change once, in commit order"""
+        ids = [Character.objects.create(name=f'Character {i}').id for i in range(7)]
+        self.assertEqual(self._sync(limit=3), [('characters', id, False) for id in ids])
+        self.assertEqual(self._sync(limit=3), [])
+
+    def test_running_transaction_withheld(self):
+        """Test that the changes of a transaction still running are returned after its commit"""
+        first = Character.objects.create(name='Biggs Darklighter')
+        with transaction.atomic():
+            late = Character.objects.create(name='Wedge Antilles')
+            entries, position, has_more = ChangesDAO.list_changes(
+                tuple(map(int, self.cursor.split('-'))), 100, 'default',
+            )
+            self.assertNotIn(late.id, [entry.object_id for entry in entries])
+        self.assertEqual(self._sync(), [('characters', first.id, False), ('characters', late.id, False)])
+
+    def test_since_timestamp(self):
+        """Test that an ISO timestamp returns the changes from then on"""
+        Character.objects.create(name='Biggs Darklighter')
+        since = timezone.now()
+        han = Character.objects.create(name='Han Solo')
+        changes = self._get(since=since.isoformat().replace('+00:00', 'Z'))['changes']
+        self.assertEqual([(change['type'], change['id']) for change in changes], [('characters', han.id)])
+        self.assertEqual(Change.objects.filter(changed_at__gte=since).count(), 1)
+
+    @override_settings(CHANGE_LOG_RETENTION_DAYS=30)
+    def test_pruned_log(self):
+        """Test that the old entries are pruned and that the cursors from before them get a 410"""
+        old_cursor = self.cursor
+        han = Character.objects.create(name='Han Solo')
+        self.cursor = self._get()['cursor']
+        Change.objects.filter(object_id=han.id).update(changed_at=timezone.now() - timedelta(days=31))
+        leia = Character.objects.create(name='Leia Organa')
+        prune_change_log_task()
+        self.assertFalse(Change.objects.filter(object_id=han.id).exists())
+
+        old_since = (timezone.now() - timedelta(days=40)).isoformat()
+        for params in ({'since': old_cursor}, {'since': old_since}):
+            response = self.client.get(reverse('changes-list'), params)
+            self.assertEqual(response.status_code, status.HTTP_410_GONE, params)
+            self.assertIn('error', response.data)
+        self.assertEqual(self._sync(), [('characters', leia.id, False)])
+
+    def test_invalid_parameters(self):
+        """Test the errors on an invalid since or limit"""
+        for params in ({'since': 'yesterday'}, {'limit': 0}, {'limit': 1001}, {'since': '1-1', 'limit': 'x'}):
+            response = self.client.get(reverse('changes-list'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+            self.assertIn('error', response.data)
+
+
+async def _next_event(stream):
+    """(event, id, data) of the next event of a stream, keepalives skipped"""
+    while True:
+        chunk = await asyncio.wait_for(anext(stream), 10)
+        if isinstance(chunk, bytes):
+            chunk = chunk.decode()
+        if chunk.startswith(':'):
+            continue
+        fields = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+        return fields['event'], fields['id'], json.loads(fields['data'])
+
+
+class ChangeStreamTest(TransactionTestCase):
+    """Test cases for the Server-Sent Events change stream"""
+
+    def setUp(self):
+        self.luke = Character.objects.create(name='Luke Skywalker')
+        self.new_hope = Film.objects.create(name='A New Hope')
+
+    async def _cursor(self):
+        return format_position(await sync_to_async(ChangesDAO.current_position)('default'))
+
+    @override_settings(CHANGE_STREAM_POLL_INTERVAL=60)
+    async def test_notified_events(self):
+        """Test that the committed writes are pushed through NOTIFY, one event per row"""
+        broker = ChangeBroker()
+        stream = broker.stream()
+        try:
+            pending = asyncio.ensure_future(_next_event(stream))
+            while not broker.subscriptions:
+                await asyncio.sleep(0.01)
+            han = await sync_to_async(Character.objects.create)(name='Han Solo')
+            self.assertEqual(await pending, ('created', ANY, {'type': 'characters', 'id': han.id, 'changed_at': ANY}))
+
+            await sync_to_async(self.luke.films.add)(self.new_hope)
+            events = [await _next_event(stream) for _ in range(2)]
+            self.assertEqual({(event, data['type'], data['id']) for event, _, data in events},
+                             {('related', 'characters', self.luke.id), ('related', 'films', self.new_hope.id)})
+
+            self.luke.height = 172
+            await sync_to_async(self.luke.save)()
+            await sync_to_async(han.delete)()
+            self.assertEqual((await _next_event(stream))[0], 'updated')
+            self.assertEqual((await _next_event(stream))[0], 'deleted')
+        finally:
+            await stream.aclose()
+            await broker.close()
+
+    @override_settings(CHANGE_STREAM_QUEUE_SIZE=2)
+    async def test_slow_subscriber(self):
+        """Test that a subscriber whose queue overflows catches up from the log, in order"""
+        broker = ChangeBroker()
+        stream = broker.stream(types={'characters'})
+        try:
+            pending = asyncio.ensure_future(_next_event(stream))
+            while not broker.subscriptions:
+                await asyncio.sleep(0.01)
+            created = await sync_to_async(CharacterDAO.bulk_create_characters)(
+                [{'name': f'Character {i}'} for i in range(6)],
+            )
+            await sync_to_async(Film.objects.create)(name='The Empire Strikes Back')
+            ids = [(await pending)[2]['id']] + [(await _next_event(stream))[2]['id'] for _ in range(5)]
+            self.assertEqual(ids, [character.id for character in created])
+        finally:
+            await stream.aclose()
+            await broker.close()
+
+    async def test_resume(self):
+        """Test that the endpoint replays the changes after Last-Event-ID"""
+        cursor = await self._cursor()
+        han = await sync_to_async(Character.objects.create)(name='Han Solo')
+        await sync_to_async(self.new_hope.delete)()
+        response = await self.async_client.get('/api/changes/stream/', headers={'Last-Event-ID': cursor})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        try:
+            event, event_id, data = await _next_event(stream)
+            self.assertEqual((event, data['type'], data['id']), ('created', 'characters', han.id))
+            self.assertEqual((await _next_event(stream))[0], 'deleted')
+        finally:
+            await stream.aclose()
+            await get_change_broker().close()
+
+    async def test_invalid_requests(self):
+        """Test the errors on an unknown type, an invalid or pruned cursor and a request outside ASGI"""
+        response = await self.async_client.get('/api/changes/stream/', {'type': 'planets'})
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.get('/api/changes/stream/', {'since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+        await sync_to_async(ChangesDAO.prune_changes)(timezone.now() + timedelta(seconds=1))
+        response = await self.async_client.get('/api/changes/stream/', {'since': '0-0'})
+        self.assertEqual(response.status_code, 410)
+        response = await sync_to_async(self.client.get)('/api/changes/stream/')
+        self.assertEqual(response.status_code, 501)
@@ -0,0 +1,192 @@
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import Count, F
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from .dao import CharacterDAO, StarshipDAO
+from .models import Character, Film, Starship
+
+User = get_user_model()
+
+
+def _counters(obj):
+    obj.refresh_from_db()
+    return {counter: getattr(obj, counter) for counter in obj.relation_counters.values()}
+
+
+class RelationCountersTest(TestCase):
+    """Test cases for the denormalized relation counters"""
+
+    def setUp(self):
+        self.new_hope = Film.objects.create(name='A New Hope')
+        self.empire = Film.objects.create(name='The Empire Strikes Back')
+        self.luke = Character.objects.create(name='Luke Skywalker')
+        self.han = Character.objects.create(name='Han Solo')
+        self.falcon = Starship.objects.create(name='Millennium Falcon', model='YT-1300')
+
+    def test_add_remove_clear(self):
+        """Test that both sides of the relations follow add(), remove(), set() and clear()"""
+        self.luke.films.add(self.new_hope, self.empire)
+        self.new_hope.characters.add(self.han)
+        self.assertEqual(_counters(self.luke), {'film_count': 2, 'starship_count': 0})
+        self.assertEqual(_counters(self.new_hope), {'character_count': 2, 'starship_count': 0})
+
+        self.luke.films.remove(self.new_hope)
+        self.falcon.pilots.set([self.luke, self.han])
+        self.falcon.films.add(self.empire)
+        self.assertEqual(_counters(self.new_hope), {'character_count': 1, 'starship_count': 0})
+        self.assertEqual(_counters(self.empire), {'character_count': 1, 'starship_count': 1})
+        self.assertEqual(_counters(self.falcon), {'film_count': 1, 'pilot_count': 2})
+        self.assertEqual(_counters(self.han), {'film_count': 1, 'starship_count': 1})
+
+        self.falcon.pilots.clear()
+        self.assertEqual(_counters(self.falcon), {'film_count': 1, 'pilot_count': 0})
+        self.assertEqual(_counters(self.luke), {'film_count': 1, 'starship_count': 0})
+
+    def test_bulk_paths(self):
+        """Test the bulk creates and updates, which write the through tables directly"""
+        leia, = CharacterDAO.bulk_create_characters([{'name': 'Leia Organa', 'films': [self.new_hope, self.empire]}])
+        StarshipDAO.bulk_create_starships([
+            {'name': 'X-wing', 'model': 'T-65', 'films': [self.new_hope.id], 'pilots': [self.luke.id]},
+            {'name': 'Y-wing', 'model': 'BTL', 'films': [self.new_hope.id], 'pilots': [self.luke.id, leia.id]},
+        ])
+        self.assertEqual(_counters(leia), {'film_count': 2, 'starship_count': 1})
+        self.assertEqual(_counters(self.luke), {'film_count': 0, 'starship_count': 2})
+        self.assertEqual(_counters(self.new_hope), {'character_count': 1, 'starship_count': 2})
+
+        CharacterDAO.bulk_update_characters([(leia.id, {'films': [self.empire]})])
+        self.assertEqual(_counters(leia), {'film_count': 1, 'starship_count': 1})
+        self.assertEqual(_counters(self.new_hope), {'character_count': 0, 'starship_count': 2})
+
+    def test_deletes(self):
+        """Test that deleting a row decrements the counters of the rows it was related to"""
+        self.luke.films.add(self.new_hope)
+        self.han.films.add(self.new_hope)
+        self.falcon.films.add(self.new_hope)
+        self.falcon.pilots.add(self.han)
+        self.han.delete()
+        self.assertEqual(_counters(self.new_hope), {'character_count': 1, 'starship_count': 1})
+        self.assertEqual(_counters(self.falcon), {'film_count': 1, 'pilot_count': 0})
+        CharacterDAO.bulk_delete_characters([self.luke.id])
+        self.new_hope.delete()
+        self.assertEqual(_counters(self.falcon), {'film_count': 0, 'pilot_count': 0})
+
+    def test_save_keeps_counters(self):
+        """Test that saving an instance loaded before a relation change keeps the current counts"""
+        stale = Character.objects.get(id=self.luke.id)
+        self.luke.films.add(self.new_hope, self.empire)
+        stale.height = 172
+        stale.save()
+        stale.film_count = 10
+        stale.save(update_fields=['film_count', 'height'])
+        self.assertEqual(_counters(self.luke), {'film_count': 2, 'starship_count': 0})
+        self.assertEqual(self.luke.height, 172)
+
+    def test_recount(self):
+        """Test that recount_relation_counters() repairs counters written around the triggers"""
+        self.luke.films.add(self.new_hope)
+        Character.objects.update(film_count=5)
+        Character.recount_relation_counters()
+        self.assertEqual(_counters(self.luke), {'film_count': 1, 'starship_count': 0})
+        self.assertEqual(_counters(self.han), {'film_count': 0, 'starship_count': 0})
+
+    def test_generated_data(self):
+        """Test that the counters written by generate_synthetic_data match the relations"""
+        self.luke.films.add(self.new_hope)
+        call_command('generate_synthetic_data', films=3, characters=100, starships=30, chunk_size=32,
+                     stdout=StringIO())
+        for model in (Film, Character, Starship):
+            for relation, counter in model.relation_counters.items():
+                mismatched = model.objects.annotate(count=Count(relation)).exclude(count=F(counter))
+                self.assertFalse(mismatched.exists(), f'{model.__name__}.{counter}')
+
+
+class RelationCounterEndpointTest(TestCase):
+    """Test cases for the relation counter filters and ordering"""
+
+    def setUp(self):
+        self.client = APIClient()
+        films = [Film.objects.create(name=name) for name in ('A New Hope', 'The Empire Strikes Back')]
+        luke = Character.objects.create(name='Luke Skywalker')
+        luke.films.set(films)
+        Character.objects.create(name='Han Solo').films.set(films[:1])
+        Character.objects.create(name='Biggs Darklighter')
+        Starship.objects.create(name='X-wing', model='T-65').pilots.add(luke)
+
+    def _names(self, name, params):
+        response = self.client.get(reverse(f'{name}-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [row['name'] for row in response.data['results']]
+
+    def test_filters(self):
+        """Test the exact and range filters on the counters"""
+        self.assertEqual(self._names('character', {'film_count__gte': 1}), ['Han Solo', 'Luke Skywalker'])
+        self.assertEqual(self._names('character', {'film_count': 0}), ['Biggs Darklighter'])
+        self.assertEqual(self._names('character', {'starship_count__gt': 0}), ['Luke Skywalker'])
+        self.assertEqual(self._names('starship', {'pilot_count': 1}), ['X-wing'])
+        self.assertEqual(self._names('film', {'character_count__lt': 2}), ['The Empire Strikes Back'])
+
+    def test_ordering(self):
+        """Test the ordering on the counters and that they are rendered"""
+        self.assertEqual(self._names('character', {'ordering': '-film_count'}),
+                         ['Luke Skywalker', 'Han Solo', 'Biggs Darklighter'])
+        response = self.client.get(reverse('film-list'), {'ordering': '-character_count'})
+        self.assertEqual([(row['name'], row['character_count']) for row in response.data['results']],
+                         [('A New Hope', 2), ('The Empire Strikes Back', 1)])
+
+
+class RelationCounterWriteEndpointTest(TestCase):
+    """Test cases for the counters rendered by the write endpoints"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user(username='user', password='userpass'))
+        self.films = [Film.objects.create(name=name) for name in ('A New Hope', 'The Empire Strikes Back')]
+        self.falcon = Starship.objects.create(name='Millennium Falcon', model='YT-1300')
+
+    def _film_counts(self, response):
+        return {film['name']: film['character_count'] for film in response.data['films']}
+
+    def test_create_and_update(self):
+        """Test that the counters of the object and of its nested films follow the relations written"""
+        response = self.client.post(reverse('character-list'), {
+            'name': 'Luke Skywalker', 'films': [film.id for film in self.films],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['film_count'], 2)
+        self.assertEqual(self._film_counts(response), {'A New Hope': 1, 'The Empire Strikes Back': 1})
+
+        luke = response.data['id']
+        response = self.client.patch(reverse('character-detail', kwargs={'pk': luke}), {
+            'films': [self.films[0].id],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['film_count'], 1)
+        self.assertEqual(self._film_counts(response), {'A New Hope': 1})
+
+        response = self.client.patch(reverse('starship-detail', kwargs={'pk': self.falcon.id}), {
+            'pilots': [luke], 'films': [film.id for film in self.films],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['pilot_count'], response.data['film_count']), (1, 2))
+        self.assertEqual(response.data['pilots'][0]['starship_count'], 1)
+
+    def test_batches(self):
+        """Test that the batch endpoints render the counters after the relations are written"""
+        response = self.client.post(reverse('character-batch'), [
+            {'name': 'Han Solo', 'films': [film.id for film in self.films]},
+            {'name': 'Leia Organa'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([item['film_count'] for item in response.data], [2, 0])
+
+        han, leia = (item['id'] for item in response.data)
+        response = self.client.patch(reverse('character-batch'), [
+            {'id': han, 'films': [self.films[1].id]},
+            {'id': leia, 'films': [film.id for film in self.films]},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['film_count'] for item in response.data], [1, 2])
@@ -1,4 +1,7 @@
+from django.db import connection
+from django.db.models.signals import post_delete, post_save
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.core.exceptions import ValidationError
 from .models import Character, Film, Starship
 from .dao import CharacterDAO, FilmDAO, StarshipDAO
@@ -387,4 +390,140 @@ class StarshipDAOTest(TestCase):
     def test_delete_starship_not_found(self):
         """Test deleting a non-existent starship"""
         result = StarshipDAO.delete_starship(99999)
-        self.assertFalse(result)
\ No newline at end of file
+        self.assertFalse(result)
+
+class BulkDAOTest(TestCase):
+    """Test cases for the bulk DAO operations"""
+
+    def setUp(self):
+        """Create test data"""
+        self.film = FilmDAO.create_film({'name': 'A New Hope', 'swapi_id': 1})
+        self.other_film = FilmDAO.create_film({'name': 'The Empire Strikes Back', 'swapi_id': 2})
+        self.luke = CharacterDAO.create_character({'name': 'Luke Skywalker', 'swapi_id': 1})
+
+    def test_bulk_create_starships(self):
+        """Test creating starships with their films and pilots"""
+        starships = StarshipDAO.bulk_create_starships([
+            {'name': 'X-wing', 'model': 'T-65 X-wing', 'films': [self.film], 'pilots': [self.luke.id]},
+            {'name': 'Millennium Falcon', 'model': 'YT-1300'},
+        ])
+        self.assertEqual(len(starships), 2)
+        self.assertEqual(list(starships[0].films.all()), [self.film])
+        self.assertEqual(list(starships[0].pilots.all()), [self.luke])
+        self.assertEqual(starships[1].films.count(), 0)
+        # The counters written by the triggers are read back
+        self.assertEqual([(s.film_count, s.pilot_count) for s in starships], [(1, 1), (0, 0)])
+
+    def test_bulk_create_duplicate(self):
+        """Test that a duplicate name rolls back the whole batch"""
+        with self.assertRaises(ValidationError):
+            CharacterDAO.bulk_create_characters([{'name': 'Han Solo'}, {'name': 'Luke Skywalker'}])
+        self.assertFalse(Character.objects.filter(name='Han Solo').exists())
+
+    def test_bulk_update_characters(self):
+        """Test updating columns and replacing films"""
+        self.luke.films.add(self.film)
+        characters = CharacterDAO.bulk_update_characters([
+            (self.luke.id, {'mass': '77', 'films': [self.other_film, self.film]}),
+        ])
+        self.assertEqual(characters[0].mass, '77')
+        self.assertEqual(characters[0].film_count, 2)
+        self.luke.refresh_from_db()
+        self.assertEqual(self.luke.mass, '77')
+        self.assertEqual(self.luke.mass_numeric, 77)
+        self.assertEqual(set(self.luke.films.all()), {self.film, self.other_film})
+
+    def test_bulk_update_not_found(self):
+        """Test updating a non-existent film"""
+        with self.assertRaises(ValidationError):
+            FilmDAO.bulk_update_films([(self.film.id, {'director': 'George Lucas'}), (99999, {})])
+        self.film.refresh_from_db()
+        self.assertIsNone(self.film.director)
+
+    def test_bulk_delete_films(self):
+        """Test deleting films returns the deleted ids"""
+        deleted = FilmDAO.bulk_delete_films([self.film.id, 99999])
+        self.assertEqual(deleted, {self.film.id})
+        self.assertEqual(list(Film.objects.all()), [self.other_film])
+
+
+class SingleStatementDAOTest(TestCase):
+    """Test cases for the single statement update and delete paths"""
+
+    def setUp(self):
+        """Create test data"""
+        self.film = FilmDAO.create_film({'name': 'A New Hope', 'swapi_id': 1})
+        self.luke = CharacterDAO.create_character({'name': 'Luke Skywalker', 'swapi_id': 1, 'films': [self.film]})
+        self.xwing = StarshipDAO.create_starship({'name': 'X-wing', 'model': 'T-65 X-wing'})
+        self.xwing.pilots.add(self.luke)
+
+    def _statements(self, func, *args):
+        """Run func, returns (its result, the SQL statements it ran without the savepoints)"""
+        with CaptureQueriesContext(connection) as queries:
+            result = func(*args)
+        return result, [query['sql'] for query in queries if 'SAVEPOINT' not in query['sql']]
+
+    def _signals(self, signal):
+        """Record the kwargs of signal for the duration of the test"""
+        received = []
+
+        def receiver(sender, **kwargs):
+            received.append(kwargs)
+        signal.connect(receiver, weak=False)
+        self.addCleanup(signal.disconnect, receiver)
+        return received
+
+    def test_update_one_statement(self):
+        """Test that an update writes the given columns with one UPDATE and sends post_save"""
+        received = self._signals(post_save)
+        character, statements = self._statements(CharacterDAO.update_character, self.luke.id, {'mass': '80'})
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith('UPDATE'))
+        self.assertEqual((character.name, character.mass, character.mass_numeric), ('Luke Skywalker', '80', 80))
+        self.assertEqual(received[0]['instance'], character)
+        self.assertEqual(received[0]['update_fields'], {'mass', 'mass_numeric', 'edited'})
+        self.luke.refresh_from_db()
+        self.assertEqual((self.luke.mass_numeric, self.luke.film_count), (80, 1))
+
+    def test_update_relations(self):
+        """Test that the given relations are replaced"""
+        other_film = FilmDAO.create_film({'name': 'The Empire Strikes Back', 'swapi_id': 2})
+        starship = StarshipDAO.update_starship(self.xwing.id, {'films': [other_film], 'pilots': []})
+        self.assertEqual(list(starship.films.all()), [other_film])
+        self.assertEqual(starship.pilots.count(), 0)
+
+    def test_delete_one_statement(self):
+        """Test that a delete is one DELETE, the database deleting the through rows"""
+        received = self._signals(post_delete)
+        deleted, statements = self._statements(CharacterDAO.delete_character, self.luke.id)
+        self.assertTrue(deleted)
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(received[0]['instance'].name, 'Luke Skywalker')
+        self.assertFalse(Character.films.through.objects.exists())
+        self.assertFalse(Starship.pilots.through.objects.exists())
+        self.film.refresh_from_db()
+        self.xwing.refresh_from_db()
+        self.assertEqual((self.film.character_count, self.xwing.pilot_count), (0, 0))
+
+    def test_bulk_delete_cascade(self):
+        """Test that a bulk delete removes the through rows of the deleted objects only and sends post_delete"""
+        leia = CharacterDAO.create_character({'name': 'Leia Organa', 'films': [self.film]})
+        received = self._signals(post_delete)
+        self.assertEqual(CharacterDAO.bulk_delete_characters([self.luke.id, 99999]), {self.luke.id})
+        self.assertEqual([kwargs['instance'].name for kwargs in received], ['Luke Skywalker'])
+        self.assertEqual(list(self.film.characters.all()), [leia])
+        self.assertEqual(self.xwing.pilots.count(), 0)
+
+    def test_through_foreign_keys_cascade(self):
+        """Test that the foreign keys of the through tables delete on cascade (migration 0010)"""
+        tables = [field.remote_field.through._meta.db_table
+                  for field in (Character.films.field, Starship.films.field, Starship.pilots.field)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT conrelid::regclass::text, confdeltype FROM pg_constraint "
+                "WHERE contype = 'f' AND conrelid::regclass::text = ANY(%s)",
+                [tables],
+            )
+            constraints = cursor.fetchall()
+        self.assertEqual(len(constraints), 6)
+        self.assertEqual({delete_type for _, delete_type in constraints}, {'c'})
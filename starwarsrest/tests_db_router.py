@@ -0,0 +1,94 @@
+from django.http import HttpResponse
+from django.test import SimpleTestCase, RequestFactory, override_settings
+from .db_router import PrimaryReplicaRouter, read_alias, replica_reads, wrote
+from .models import Character
+from .replica_middleware import ReplicaPinningMiddleware
+
+REPLICAS = ['replica_0', 'replica_1']
+PINS_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    'replica_pins': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS)
+class PrimaryReplicaRouterTest(SimpleTestCase):
+    """Test cases for the primary/replica database router"""
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def test_primary_outside_read_context(self):
+        """Test that reads go to the primary outside of a replica read context"""
+        self.assertEqual(self.router.db_for_read(Character), 'default')
+
+    def test_replica_inside_read_context(self):
+        """Test that reads go to a replica inside a replica read context"""
+        with replica_reads():
+            self.assertIn(self.router.db_for_read(Character), REPLICAS)
+        with replica_reads(False):
+            self.assertEqual(self.router.db_for_read(Character), 'default')
+
+    def test_one_replica_per_context(self):
+        """Test that every read of a context goes to the same replica"""
+        for _ in range(10):
+            with replica_reads():
+                alias = read_alias()
+                self.assertEqual({self.router.db_for_read(Character) for _ in range(20)}, {alias})
+
+    def test_read_your_writes(self):
+        """Test that the reads following a write go to the primary"""
+        with replica_reads():
+            self.assertFalse(wrote())
+            self.assertEqual(self.router.db_for_write(Character), 'default')
+            self.assertTrue(wrote())
+            self.assertEqual(self.router.db_for_read(Character), 'default')
+        self.assertFalse(wrote())
+
+    def test_instance_hint(self):
+        """Test that related objects are read from the database of the instance"""
+        character = Character(name='Luke Skywalker')
+        character._state.db = 'replica_1'
+        self.assertEqual(self.router.db_for_read(Character, instance=character), 'replica_1')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        """Test that everything goes to the primary without replicas"""
+        with replica_reads():
+            self.assertEqual(read_alias(), 'default')
+
+    def test_migrations_on_primary_only(self):
+        """Test that migrations only run on the primary"""
+        self.assertTrue(self.router.allow_migrate('default', 'starwarsrest'))
+        self.assertFalse(self.router.allow_migrate('replica_0', 'starwarsrest'))
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS, CACHES=PINS_CACHE, REPLICA_PIN_SECONDS=10)
+class ReplicaPinningMiddlewareTest(SimpleTestCase):
+    """Test cases for the ReplicaPinningMiddleware"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.aliases = []
+
+    def view(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            PrimaryReplicaRouter().db_for_write(Character)
+        self.aliases.append(read_alias())
+        return HttpResponse()
+
+    def _request(self, method, **headers):
+        middleware = ReplicaPinningMiddleware(self.view)
+        middleware(getattr(self.factory, method)('/api/characters/', **headers))
+        return self.aliases[-1]
+
+    def test_get_reads_replica(self):
+        """Test that GET requests read from a replica"""
+        self.assertIn(self._request('get'), REPLICAS)
+
+    def test_pinned_after_write(self):
+        """Test that a client reads from the primary after a write, other clients don't"""
+        self.assertEqual(self._request('post', HTTP_AUTHORIZATION='Token abc'), 'default')
+        self.assertEqual(self._request('get', HTTP_AUTHORIZATION='Token abc'), 'default')
+        self.assertIn(self._request('get', HTTP_AUTHORIZATION='Token other'), REPLICAS)
+        self.assertIn(self._request('get'), REPLICAS)
@@ -1,9 +1,13 @@
+import json
+from unittest.mock import patch
+from django.core.exceptions import ImproperlyConfigured
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.contrib.auth import get_user_model
 from .models import Character, Film, Starship
+from .views import CharacterViewSet
 
 User = get_user_model()
 
@@ -444,4 +448,256 @@ class StarshipEndpointTest(TestCase):
         """Test deleting a starship with admin user"""
         self.client.force_authenticate(user=self.admin_user)
         response = self.client.delete(reverse('starship-detail', kwargs={'pk': self.starship.id}))
-        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+class SparseFieldsetEndpointTest(TestCase):
+    """Test cases for the fields and expand query parameters"""
+
+    def setUp(self):
+        """Set up test data and client"""
+        self.client = APIClient()
+
+        self.film = Film.objects.create(
+            name='A New Hope',
+            swapi_id=1,
+            episode_id=4,
+            opening_crawl='It is a period of civil war...',
+            release_date='1977-05-25'
+        )
+        self.character = Character.objects.create(name='Luke Skywalker', swapi_id=1, mass='77')
+        self.character.films.add(self.film)
+        self.starship = Starship.objects.create(name='X-wing', model='T-65 X-wing', swapi_id=12)
+        self.starship.films.add(self.film)
+        self.starship.pilots.add(self.character)
+
+    def test_fields(self):
+        """Test that only the requested fields are returned"""
+        response = self.client.get(reverse('character-list'), {'fields': 'id,name'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0], {'id': self.character.id, 'name': 'Luke Skywalker'})
+
+    def test_fields_on_retrieve_and_search(self):
+        """Test that fields also applies to retrieve and search"""
+        response = self.client.get(
+            reverse('film-detail', kwargs={'pk': self.film.id}), {'fields': 'name,release_date'}
+        )
+        self.assertEqual(response.data, {'name': 'A New Hope', 'release_date': '1977-05-25'})
+
+        response = self.client.get(reverse('starship-search'), {'name': 'X-wing', 'fields': 'name'})
+        self.assertEqual(response.data, [{'name': 'X-wing'}])
+
+    def test_fields_restrict_select_and_prefetch(self):
+        """Test that unrequested relations are not prefetched"""
+        # One COUNT for the pagination and one SELECT
+        with self.assertNumQueries(2):
+            self.client.get(reverse('starship-list'), {'fields': 'id,name'})
+
+    def test_default_nesting(self):
+        """Test that without expand the relations keep their nested representation"""
+        response = self.client.get(reverse('starship-detail', kwargs={'pk': self.starship.id}))
+        self.assertEqual(response.data['films'][0]['name'], 'A New Hope')
+        self.assertEqual(response.data['pilots'][0]['films'][0]['name'], 'A New Hope')
+
+    def test_expand(self):
+        """Test that only the expanded relations are nested, the others are primary keys"""
+        response = self.client.get(
+            reverse('starship-detail', kwargs={'pk': self.starship.id}), {'expand': 'pilots'}
+        )
+        self.assertEqual(response.data['films'], [self.film.id])
+        self.assertEqual(response.data['pilots'][0]['name'], 'Luke Skywalker')
+        self.assertEqual(response.data['pilots'][0]['films'], [self.film.id])
+
+    def test_expand_nested(self):
+        """Test expanding a relation of a relation with a dotted path"""
+        response = self.client.get(
+            reverse('starship-detail', kwargs={'pk': self.starship.id}),
+            {'expand': 'pilots.films', 'fields': 'name,pilots.name,pilots.films.name'}
+        )
+        self.assertEqual(response.data, {
+            'name': 'X-wing',
+            'pilots': [{'name': 'Luke Skywalker', 'films': [{'name': 'A New Hope'}]}],
+        })
+
+    def test_empty_expand(self):
+        """Test that an empty expand renders every relation as primary keys"""
+        response = self.client.get(reverse('character-list'), {'expand': ''})
+        self.assertEqual(response.data['results'][0]['films'], [self.film.id])
+
+
+class ExportEndpointTest(TestCase):
+    """Test cases for the streaming export endpoints"""
+
+    def setUp(self):
+        """Set up test data and client"""
+        self.client = APIClient()
+
+        self.film = Film.objects.create(name='A New Hope', swapi_id=1, release_date='1977-05-25')
+        self.luke = Character.objects.create(name='Luke Skywalker', swapi_id=1, mass='77')
+        self.leia = Character.objects.create(name='Leia Organa', swapi_id=5, mass='49')
+        self.luke.films.add(self.film)
+        self.starship = Starship.objects.create(name='X-wing', model='T-65 X-wing', swapi_id=12)
+        self.starship.pilots.add(self.luke)
+
+    def _lines(self, response):
+        return b''.join(response.streaming_content).decode().splitlines()
+
+    def test_export_ndjson(self):
+        """Test exporting characters as NDJSON with relations as ids"""
+        response = self.client.get(reverse('character-export'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self._lines(response)]
+        self.assertEqual([row['name'] for row in rows], ['Leia Organa', 'Luke Skywalker'])
+        self.assertEqual(rows[1]['films'], [self.film.id])
+
+    def test_export_fields_and_filters(self):
+        """Test that the export honours fields and the viewset filters"""
+        response = self.client.get(reverse('starship-export'), {'fields': 'name,pilots', 'search': 'X-wing'})
+        rows = [json.loads(line) for line in self._lines(response)]
+        self.assertEqual(rows, [{'name': 'X-wing', 'pilots': [self.luke.id]}])
+
+    def test_export_csv(self):
+        """Test exporting films as CSV"""
+        response = self.client.get(reverse('film-export'), {'output': 'csv', 'fields': 'id,name,release_date'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(self._lines(response), ['id,name,release_date', f'{self.film.id},A New Hope,1977-05-25'])
+
+    def test_export_chunks(self):
+        """Test that rows and their relations are read in chunks"""
+        with patch.object(CharacterViewSet, 'export_chunk_size', 1):
+            response = self.client.get(reverse('character-export'))
+            rows = [json.loads(line) for line in self._lines(response)]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1]['films'], [self.film.id])
+
+    def test_export_invalid_output(self):
+        """Test that an unknown output is rejected"""
+        response = self.client.get(reverse('character-export'), {'output': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BatchEndpointTest(TestCase):
+    """Test cases for the batch endpoints"""
+
+    def setUp(self):
+        """Set up test data and client"""
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user', password='userpass')
+        self.film = Film.objects.create(name='A New Hope', swapi_id=1)
+        self.luke = Character.objects.create(name='Luke Skywalker', swapi_id=1)
+
+    def test_batch_unauthorized(self):
+        """Test that batches require authentication"""
+        response = self.client.post(reverse('character-batch'), [{'name': 'Han Solo'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_batch_create(self):
+        """Test creating several characters with their films"""
+        self.client.force_authenticate(user=self.user)
+        items = [
+            {'name': 'Han Solo', 'swapi_id': 14, 'films': [self.film.id]},
+            {'name': 'Leia Organa', 'swapi_id': 5},
+        ]
+        with patch('starwarsrest.cache_utils.cache') as cache:
+            response = self.client.post(reverse('character-batch'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([item['name'] for item in response.data], ['Han Solo', 'Leia Organa'])
+        self.assertEqual(response.data[0]['films'], [self.film.id])
+        self.assertEqual(Character.objects.get(name='Han Solo').films.count(), 1)
+        # One invalidation for the whole batch
+        self.assertEqual(cache.clear.call_count, 1)
+
+    def test_batch_create_invalid_item(self):
+        """Test that an invalid item rejects the whole batch with per item errors"""
+        self.client.force_authenticate(user=self.user)
+        items = [{'name': 'Han Solo'}, {'name': 'Luke Skywalker'}]
+        response = self.client.post(reverse('character-batch'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['errors'][0], {})
+        self.assertIn('name', response.data['errors'][1])
+        self.assertFalse(Character.objects.filter(name='Han Solo').exists())
+
+    @patch('starwarsrest.views.SwapiService.validate_starship_data', return_value=False)
+    def test_batch_create_swapi_validation(self, mock_validate):
+        """Test that items are validated against SWAPI"""
+        self.client.force_authenticate(user=self.user)
+        items = [{'name': 'X-wing', 'model': 'T-65 X-wing'}]
+        response = self.client.post(reverse('starship-batch'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('not found in SWAPI', response.data['errors'][0]['error'])
+        mock_validate.assert_called_once_with('X-wing', 'T-65 X-wing', 0)
+        self.assertFalse(Starship.objects.exists())
+
+    def test_batch_update(self):
+        """Test partially updating several films"""
+        self.client.force_authenticate(user=self.user)
+        other = Film.objects.create(name='The Empire Strikes Back', swapi_id=2)
+        items = [
+            {'id': self.film.id, 'director': 'George Lucas'},
+            {'id': other.id, 'director': 'Irvin Kershner'},
+        ]
+        response = self.client.patch(reverse('film-batch'), items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[1]['director'], 'Irvin Kershner')
+        self.film.refresh_from_db()
+        self.assertEqual(self.film.director, 'George Lucas')
+
+    def test_batch_update_unknown_id(self):
+        """Test that updating an unknown id rejects the batch"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.patch(reverse('film-batch'), [{'id': 0, 'director': 'Nobody'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('id', response.data['errors'][0])
+
+    def test_batch_delete(self):
+        """Test deleting several characters"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.delete(reverse('character-batch'), [self.luke.id, 0], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [{'id': self.luke.id, 'deleted': True}, {'id': 0, 'deleted': False}])
+        self.assertFalse(Character.objects.exists())
+
+    def test_batch_empty(self):
+        """Test that an empty batch is rejected"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(reverse('film-batch'), [], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_unconfigured(self):
+        """Test that a viewset without its bulk DAO operations is refused when defined"""
+        with self.assertRaisesMessage(ImproperlyConfigured, 'batch_delete'):
+            type('PartialViewSet', (CharacterViewSet,), {'batch_delete': None})
+
+
+class NumericFilterEndpointTest(TestCase):
+    """Test cases for the numeric range filters and ordering"""
+
+    def setUp(self):
+        """Set up test data and client"""
+        self.client = APIClient()
+        Starship.objects.create(name='X-wing', model='T-65 X-wing', cost_in_credits='149999')
+        Starship.objects.create(name='Death Star', model='DS-1', cost_in_credits='1000000000000')
+        Starship.objects.create(name='Millennium Falcon', model='YT-1300', cost_in_credits='100000')
+        Starship.objects.create(name='Slave 1', model='Firespray-31', cost_in_credits='unknown')
+
+    def _names(self, params):
+        response = self.client.get(reverse('starship-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [starship['name'] for starship in response.data['results']]
+
+    def test_range_filter(self):
+        """Test that range filters compare numbers, not strings"""
+        self.assertEqual(self._names({'cost_in_credits__gte': 149999}), ['Death Star', 'X-wing'])
+        self.assertEqual(self._names({'cost_in_credits__lt': 149999}), ['Millennium Falcon'])
+
+    def test_numeric_ordering(self):
+        """Test that ordering on a quantity is numeric"""
+        names = self._names({'ordering': 'cost_in_credits', 'cost_in_credits__gt': 0})
+        self.assertEqual(names, ['Millennium Falcon', 'X-wing', 'Death Star'])
+
+    def test_character_mass_filter(self):
+        """Test the mass range filter on characters"""
+        Character.objects.create(name='Luke Skywalker', mass='77')
+        Character.objects.create(name='Jabba Desilijic Tiure', mass='1,358')
+        response = self.client.get(reverse('character-list'), {'mass__gt': 100})
+        self.assertEqual([c['name'] for c in response.data['results']], ['Jabba Desilijic Tiure'])
@@ -0,0 +1,96 @@
+import re
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from .models import Character, Film, Starship
+
+
+def _generate(**options):
+    out = StringIO()
+    call_command('generate_synthetic_data', stdout=out, **{
+        'films': 5, 'characters': 200, 'starships': 50, 'chunk_size': 64, **options,
+    })
+    return out.getvalue()
+
+
+def _without_ids(names):
+    return [re.sub(r' \d+$', '', name) for name in names]
+
+
+class GenerateSyntheticDataTest(TestCase):
+    """Test cases for the generate_synthetic_data management command"""
+
+    def test_copy(self):
+        """Test the row counts with COPY"""
+        out = _generate()
+        self.assertIn('Generated 5 films, 200 characters and 50 starships', out)
+        self.assertEqual(Film.objects.count(), 5)
+        self.assertEqual(Character.objects.count(), 200)
+        self.assertEqual(Starship.objects.count(), 50)
+
+    def test_bulk(self):
+        """Test the row counts and the numeric fields with bulk_create()"""
+        _generate(method='bulk')
+        self.assertEqual(Character.objects.count(), 200)
+        self.assertEqual(Starship.objects.count(), 50)
+        starship = Starship.objects.exclude(cost_in_credits='unknown').first()
+        self.assertEqual(starship.cost_in_credits_numeric, int(starship.cost_in_credits))
+        self.assertEqual(starship.crew_numeric, int(starship.crew))
+
+    def test_deterministic(self):
+        """Test that a seed generates the same names and relations, apart from the ids"""
+        _generate(seed=7)
+        first = _without_ids(Character.objects.order_by('id').values_list('name', flat=True))
+        films = [character.films.count() for character in Character.objects.order_by('id')]
+        Character.objects.all().delete()
+        Starship.objects.all().delete()
+        Film.objects.all().delete()
+        _generate(seed=7)
+        self.assertEqual(_without_ids(Character.objects.order_by('id').values_list('name', flat=True)), first)
+        self.assertEqual([character.films.count() for character in Character.objects.order_by('id')], films)
+
+    def test_swapi_names(self):
+        """Test that --swapi-names 1 reuses the real names, which searches then match"""
+        _generate(swapi_names=1)
+        self.assertFalse(Character.objects.exclude(name__regex=r'^.+ \d+$').exists())
+        self.assertGreater(Character.objects.filter(name__startswith='Luke Skywalker ').count(), 0)
+        self.assertFalse(Film.objects.filter(name__startswith='Film ').exists())
+
+    def test_relation_density(self):
+        """Test the number of films and pilots per row"""
+        _generate(films_per_character=2, films_per_starship=1, pilots_per_starship=0)
+        links = Character.films.through.objects.count()
+        self.assertGreaterEqual(links, 200)
+        self.assertLessEqual(links, 600)
+        self.assertEqual(Starship.films.through.objects.count(), 50)
+        self.assertEqual(Starship.pilots.through.objects.count(), 0)
+        for character in Character.objects.all()[:20]:
+            self.assertGreaterEqual(character.films.count(), 1)
+
+    def test_adds_to_existing_rows(self):
+        """Test that the rows are added after the existing ones and the sequences follow"""
+        film = Film.objects.create(name='A New Hope', episode_id=4)
+        Character.objects.create(name='Luke Skywalker')
+        _generate(films=0, keep_indexes=True)
+        self.assertEqual(Character.objects.count(), 201)
+        self.assertEqual(Character.films.through.objects.exclude(film=film).count(), 0)
+        created = Character.objects.create(name='Leia Organa')
+        self.assertEqual(created.id, Character.objects.order_by('-id').values_list('id', flat=True)[1] + 1)
+
+    def test_restores_constraints(self):
+        """Test that the dropped indexes and constraints are recreated"""
+        def indexes():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename LIKE 'starwarsrest_%%'")
+                return sorted(row[0] for row in cursor.fetchall())
+
+        before = indexes()
+        _generate()
+        self.assertEqual(indexes(), before)
+
+    def test_no_films(self):
+        """Test that characters need films to relate to"""
+        with self.assertRaises(CommandError):
+            _generate(films=0)
@@ -54,6 +54,17 @@ class GetUserTokenTest(TestCase):
         token = Token.objects.get(user=self.user)
         self.assertIn(token.key, output)
 
+    def test_regenerate_token(self):
+        """Test replacing the existing token of a user"""
+        old_token = Token.objects.create(user=self.user)
+        out = StringIO()
+
+        call_command('get_user_token', 'testuser', '--regenerate', stdout=out)
+
+        token = Token.objects.get(user=self.user)
+        self.assertNotEqual(token.key, old_token.key)
+        self.assertIn(f'Regenerated token for testuser: {token.key}', out.getvalue())
+
     def test_get_token_for_nonexistent_user(self):
         """Test getting token for nonexistent user"""
         # Capture command output
@@ -0,0 +1,254 @@
+from unittest.mock import patch
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+from . import graph
+from .dao import CharacterDAO
+from .graph import CoAppearanceGraph, get_graph
+from .models import Character, Film
+
+GRAPH_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    'tokens': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    'graph': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'autocomplete': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+class CoAppearanceGraphTest(SimpleTestCase):
+    """Test cases for the CSR co-appearance graph"""
+
+    def setUp(self):
+        # 1-2-3 share film 10, 1-2 also share film 11, 3-4 share film 12, 5 is alone in film 13
+        self.graph = CoAppearanceGraph({10: {1, 2, 3}, 11: {1, 2}, 12: {3, 4}, 13: {5}})
+
+    def test_neighbors(self):
+        """Test that the neighbors are sorted by shared films"""
+        self.assertEqual(self.graph.neighbors(1), [(2, 2), (3, 1)])
+        self.assertEqual(self.graph.neighbors(3), [(1, 1), (2, 1), (4, 1)])
+        self.assertEqual(self.graph.neighbors(1, limit=1), [(2, 2)])
+        self.assertEqual(self.graph.neighbors(5), [])
+        self.assertEqual(self.graph.neighbors(99), [])
+
+    def test_shortest_path(self):
+        """Test the shortest chains of co-stars"""
+        self.assertEqual(self.graph.shortest_path(1, 4), [1, 3, 4])
+        self.assertEqual(self.graph.shortest_path(4, 1), [4, 3, 1])
+        self.assertEqual(self.graph.shortest_path(1, 2), [1, 2])
+        self.assertEqual(self.graph.shortest_path(1, 1), [1])
+        self.assertIsNone(self.graph.shortest_path(1, 5))
+        self.assertIsNone(self.graph.shortest_path(1, 99))
+
+    def test_changed(self):
+        """Test that changed() applies memberships to a new graph"""
+        changed = self.graph.changed(added=[(13, 4)], removed=[(11, 1)])
+        self.assertEqual(changed.neighbors(1), [(2, 1), (3, 1)])
+        self.assertEqual(changed.shortest_path(1, 5), [1, 3, 4, 5])
+        # The original graph is unchanged
+        self.assertEqual(self.graph.neighbors(1), [(2, 2), (3, 1)])
+        # Only the rows of the changed characters are adjusted, the arrays are shared
+        self.assertIs(changed.indices, self.graph.indices)
+        self.assertEqual(set(changed.adjustments), {1, 2, 4, 5})
+        self.assertEqual(changed.changed(removed=[(13, 4)]).neighbors(4), [(3, 1)])
+
+    def test_large_films(self):
+        """Test that the films above the size limit give the same answers without being expanded"""
+        graph_ = CoAppearanceGraph({10: {1, 2, 3}, 11: {1, 2}, 12: {3, 4}, 13: {5}}, max_film_size=2)
+        self.assertEqual(graph_.large_films, {10})
+        self.assertEqual(graph_.neighbors(1), [(2, 2), (3, 1)])
+        self.assertEqual(graph_.neighbors(3, limit=2), [(1, 1), (2, 1)])
+        self.assertEqual(graph_.shortest_path(1, 4), [1, 3, 4])
+        changed = graph_.changed(added=[(10, 5)], removed=[(10, 3)])
+        self.assertEqual(changed.neighbors(5), [(1, 1), (2, 1)])
+        self.assertIsNone(changed.shortest_path(1, 4))
+
+
+@override_settings(CACHES=GRAPH_CACHE)
+class GraphMaintenanceTest(TestCase):
+    """Test cases for the incremental maintenance of the shared graph"""
+
+    def setUp(self):
+        # The rebuilds run synchronously, a thread would not see the test transaction
+        patcher = patch.object(graph, '_start_rebuild', graph._rebuild_and_swap)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        graph.invalidate_graph()
+        graph._state = (None, None)
+        self.film = Film.objects.create(name='A New Hope')
+        self.luke = Character.objects.create(name='Luke Skywalker')
+        self.leia = Character.objects.create(name='Leia Organa')
+        self.luke.films.add(self.film)
+        get_graph()
+
+    def tearDown(self):
+        graph.invalidate_graph()
+
+    def test_graph_is_reused(self):
+        """Test that the graph is built once"""
+        with self.assertNumQueries(0):
+            get_graph()
+
+    def test_incremental_add_and_remove(self):
+        """Test that m2m changes update the graph without rebuilding it"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.leia.films.add(self.film)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_graph().neighbors(self.luke.id), [(self.leia.id, 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.film.characters.remove(self.luke)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_graph().neighbors(self.leia.id), [])
+
+    def test_clear(self):
+        """Test that clearing a relation removes the memberships"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.leia.films.add(self.film)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.film.characters.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_graph().neighbors(self.luke.id), [])
+
+    def test_rollback_keeps_graph(self):
+        """Test that changes are only applied when committed"""
+        with self.captureOnCommitCallbacks(execute=False):
+            self.leia.films.add(self.film)
+        self.assertEqual(get_graph().neighbors(self.luke.id), [])
+
+    def test_changes_are_published(self):
+        """Test that a change is shared as a versioned delta, not as the whole graph"""
+        version = graph._state[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.leia.films.add(self.film)
+        cache = caches[graph.GRAPH_CACHE_ALIAS]
+        self.assertEqual(cache.get(graph.VERSION_KEY), version + 1)
+        self.assertEqual(cache.get(graph._change_key(version + 1))['added'], [(self.film.id, self.leia.id)])
+
+    def test_other_process_reloads(self):
+        """Test that a process with an outdated graph loads the shared one"""
+        outdated = graph._state
+        with self.captureOnCommitCallbacks(execute=True):
+            self.leia.films.add(self.film)
+        graph._state = outdated
+        with self.assertNumQueries(0):
+            self.assertEqual(get_graph().neighbors(self.luke.id), [(self.leia.id, 1)])
+
+    def test_outdated_process_rebuilds(self):
+        """Test that a process missing a change rebuilds its graph instead of applying the next ones to a stale one"""
+        graph._state = (graph._state[0], graph._state[1] - 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.leia.films.add(self.film)
+        # The query starting the rebuild is answered from the previous graph
+        self.assertEqual(get_graph().neighbors(self.luke.id), [])
+        self.assertEqual(get_graph().neighbors(self.luke.id), [(self.leia.id, 1)])
+
+    def test_delete_and_bulk_writes(self):
+        """Test that the deletions and the bulk writes publish their changes instead of rebuilding the graph"""
+        with self.captureOnCommitCallbacks(execute=True):
+            CharacterDAO.bulk_update_characters([(self.leia.id, {'films': [self.film.id]})])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_graph().neighbors(self.luke.id), [(self.leia.id, 1)])
+
+        other = Film.objects.create(name='The Empire Strikes Back')
+        with self.captureOnCommitCallbacks(execute=True):
+            CharacterDAO.bulk_update_characters([(self.luke.id, {'films': [other.id]})])
+            han = CharacterDAO.bulk_create_characters([{'name': 'Han Solo', 'films': [other.id]}])[0]
+        with self.assertNumQueries(0):
+            self.assertEqual(get_graph().neighbors(self.luke.id), [(han.id, 1)])
+            self.assertEqual(get_graph().neighbors(self.leia.id), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            han.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_graph().neighbors(self.luke.id), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.leia.films.add(other)
+            other.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_graph().neighbors(self.luke.id), [])
+            self.assertEqual(get_graph().films_of(self.leia.id), [self.film.id])
+
+    def test_invalidation_serves_previous_graph(self):
+        """Test that an invalidated graph answers until the rebuilt one replaces it"""
+        Character.films.through.objects.create(character=self.leia, film=self.film)
+        graph.invalidate_graph()
+        self.assertEqual(get_graph().neighbors(self.luke.id), [])
+        self.assertEqual(get_graph().neighbors(self.luke.id), [(self.leia.id, 1)])
+
+
+@override_settings(CACHES=GRAPH_CACHE)
+class GraphRebuildTest(TransactionTestCase):
+    """Test cases for the background rebuilds of the graph"""
+
+    def setUp(self):
+        graph.invalidate_graph()
+        graph._state = (None, None)
+        self.film = Film.objects.create(name='A New Hope')
+        self.luke = Character.objects.create(name='Luke Skywalker')
+        self.luke.films.add(self.film)
+        get_graph()
+
+    def tearDown(self):
+        graph.invalidate_graph()
+        graph._state = (None, None)
+
+    def test_rebuild_in_background(self):
+        """Test that the query starting a rebuild doesn't wait for it"""
+        leia = Character.objects.create(name='Leia Organa')
+        Character.films.through.objects.create(character=leia, film=self.film)
+        graph.invalidate_graph()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_graph().neighbors(self.luke.id), [])
+        thread = graph._rebuilding
+        if thread is not None:
+            thread.join()
+        self.assertEqual(get_graph().neighbors(self.luke.id), [(leia.id, 1)])
+
+
+class GraphEndpointsTest(TestCase):
+    """Test cases for the character graph endpoints"""
+
+    def setUp(self):
+        self.client = APIClient()
+        films = [Film.objects.create(name=name) for name in ('A New Hope', 'The Empire Strikes Back')]
+        self.luke = Character.objects.create(name='Luke Skywalker')
+        self.leia = Character.objects.create(name='Leia Organa')
+        self.boba = Character.objects.create(name='Boba Fett')
+        self.yoda = Character.objects.create(name='Yoda')
+        self.luke.films.set(films)
+        self.leia.films.set(films[:1])
+        self.boba.films.set(films[1:])
+
+    def test_neighbors(self):
+        """Test the co-stars of a character"""
+        response = self.client.get(f'/api/characters/{self.leia.id}/neighbors/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            'count': 1,
+            'results': [{'id': self.luke.id, 'name': 'Luke Skywalker', 'shared_films': 1}],
+        })
+
+    def test_neighbors_limit(self):
+        """Test the top k co-stars"""
+        response = self.client.get(f'/api/characters/{self.luke.id}/neighbors/?limit=1')
+        self.assertEqual(response.data['count'], 1)
+        response = self.client.get(f'/api/characters/{self.luke.id}/neighbors/?limit=0')
+        self.assertEqual(response.status_code, 400)
+
+    def test_path(self):
+        """Test the degrees of separation between two characters"""
+        response = self.client.get(f'/api/characters/{self.leia.id}/path/?to={self.boba.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['degrees'], 2)
+        self.assertEqual([step['name'] for step in response.data['path']],
+                         ['Leia Organa', 'Luke Skywalker', 'Boba Fett'])
+
+        response = self.client.get(f'/api/characters/{self.leia.id}/path/?to={self.yoda.id}')
+        self.assertEqual(response.data, {'degrees': None, 'path': None})
+
+    def test_missing_characters(self):
+        """Test the unknown characters and the missing parameters"""
+        self.assertEqual(self.client.get('/api/characters/999999/neighbors/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/characters/{self.luke.id}/path/?to=999999').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/characters/{self.luke.id}/path/').status_code, 400)
@@ -0,0 +1,46 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from .models import Character, Film
+
+
+class InstrumentationMiddlewareTest(TestCase):
+    """Test cases for the InstrumentationMiddleware"""
+
+    def setUp(self):
+        self.client = APIClient()
+        film = Film.objects.create(name='A New Hope', swapi_id=1)
+        Character.objects.create(name='Luke Skywalker', swapi_id=1).films.add(film)
+
+    def test_server_timing_header(self):
+        """Test that the query count and timings are returned in Server-Timing"""
+        response = self.client.get(reverse('character-list'))
+        server_timing = response['Server-Timing']
+        # COUNT, SELECT and the films prefetch
+        self.assertIn('desc="3 queries"', server_timing)
+        self.assertIn('db;dur=', server_timing)
+        self.assertIn('serialize;dur=', server_timing)
+        self.assertIn('total;dur=', server_timing)
+
+    def test_log_metrics(self):
+        """Test that every request is logged with its metrics"""
+        with self.assertLogs('starwarsrest.instrumentation_middleware', level='INFO') as logs:
+            self.client.get(reverse('film-list'))
+        metrics = logs.records[0].metrics
+        self.assertEqual(metrics['path'], '/api/films/')
+        self.assertEqual(metrics['queries'], 2)
+        self.assertEqual(metrics['over_budget'], [])
+
+    @override_settings(QUERY_COUNT_BUDGET=1)
+    def test_query_budget(self):
+        """Test that requests over the query budget are logged as warnings"""
+        with self.assertLogs('starwarsrest.instrumentation_middleware', level='WARNING') as logs:
+            self.client.get(reverse('character-list'))
+        self.assertEqual(logs.records[0].metrics['over_budget'], ['queries'])
+
+    @override_settings(LATENCY_BUDGET_MS=-1)
+    def test_latency_budget(self):
+        """Test that requests over the latency budget are logged as warnings"""
+        with self.assertLogs('starwarsrest.instrumentation_middleware', level='WARNING') as logs:
+            self.client.get(reverse('film-list'))
+        self.assertIn('latency', logs.records[0].metrics['over_budget'])
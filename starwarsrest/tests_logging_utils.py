@@ -0,0 +1,76 @@
+import io
+import logging
+import os
+import tempfile
+from django.test import SimpleTestCase
+from .logging_utils import QueueLogHandler, Sampler
+
+
+class QueueLogHandlerTest(SimpleTestCase):
+    """Test cases for the non-blocking queue log handler"""
+
+    def setUp(self):
+        self.logger = logging.getLogger('starwarsrest.tests.queue')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+
+    def tearDown(self):
+        self.logger.handlers.clear()
+        self.logger.propagate = True
+
+    def test_records_written_by_listener(self):
+        """Test that queued records are formatted and written by the listener thread"""
+        stream = io.StringIO()
+        handler = QueueLogHandler(stream)
+        handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+        self.logger.addHandler(handler)
+
+        self.logger.info("Cache HIT for key: %s", 'abc')
+        handler.close()
+
+        self.assertEqual(stream.getvalue(), 'INFO Cache HIT for key: abc\n')
+
+    def test_full_queue_drops_records(self):
+        """Test that records are dropped instead of blocking when the queue is full"""
+        handler = QueueLogHandler(io.StringIO(), maxsize=1)
+        handler.listener.stop()
+        self.logger.addHandler(handler)
+
+        for i in range(3):
+            self.logger.info("record %d", i)
+
+        self.assertEqual(handler.dropped, 2)
+        handler.close()
+
+    def test_forked_child_writes_records(self):
+        """Test that a process forked after the setup gets its own listener thread"""
+        with tempfile.TemporaryFile('w+') as stream:
+            handler = QueueLogHandler(stream)
+            handler.setFormatter(logging.Formatter('%(process)d %(message)s'))
+            self.logger.addHandler(handler)
+
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    self.logger.info("from the child")
+                    handler.close()
+                finally:
+                    os._exit(0)
+            os.waitpid(pid, 0)
+            handler.close()
+
+            stream.seek(0)
+            self.assertEqual(stream.read(), f'{pid} from the child\n')
+
+
+class SamplerTest(SimpleTestCase):
+    """Test cases for the log sampler"""
+
+    def test_one_out_of_rate(self):
+        """Test that the sampler lets one call out of `rate` through"""
+        sample = Sampler(rate=10)
+        self.assertEqual(sum(sample() for _ in range(100)), 10)
+
+    def test_rate_one_keeps_everything(self):
+        """Test that a rate of 1 (or less) disables the sampling"""
+        self.assertTrue(all(Sampler(rate=0)() for _ in range(5)))
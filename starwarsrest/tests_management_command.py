@@ -182,6 +182,8 @@ class PopulateSwapiDataTest(TestCase):
         starship = Starship.objects.get(name='CR90 corvette')
         self.assertEqual(starship.starship_class, 'corvette')
         self.assertEqual(starship.manufacturer, 'Corellian Engineering Corporation')
+        self.assertEqual(starship.cost_in_credits_numeric, 3500000)
+        self.assertEqual(starship.hyperdrive_rating_numeric, 2.0)
 
     @patch('starwarsrest.services.SwapiService._make_request')
     def test_populate_entities_with_existing_records(self, mock_make_request):
@@ -0,0 +1,50 @@
+from unittest.mock import patch, Mock
+from django.test import TestCase
+from django.urls import reverse
+from prometheus_client import REGISTRY
+from rest_framework.test import APIClient
+from .dao import FilmDAO
+from .models import Film
+from .services import SwapiService
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTest(TestCase):
+    """Test cases for the Prometheus metrics"""
+
+    def setUp(self):
+        self.client = APIClient()
+        Film.objects.create(name='A New Hope', swapi_id=1)
+
+    def test_metrics_endpoint(self):
+        """Test that /metrics exposes the metrics in the Prometheus format"""
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'api_request_duration_seconds', response.content)
+        self.assertIn(b'dao_method_duration_seconds', response.content)
+
+    def test_request_latency_and_size(self):
+        """Test that viewset requests are observed per action"""
+        labels = {'viewset': 'FilmViewSet', 'action': 'list'}
+        before = sample('api_request_duration_seconds_count', method='GET', status='200', **labels)
+        size_before = sample('api_response_size_bytes_count', **labels)
+        self.client.get(reverse('film-list'))
+        self.assertEqual(sample('api_request_duration_seconds_count', method='GET', status='200', **labels), before + 1)
+        self.assertEqual(sample('api_response_size_bytes_count', **labels), size_before + 1)
+
+    def test_dao_timings(self):
+        """Test that DAO methods are timed"""
+        before = sample('dao_method_duration_seconds_count', dao='FilmDAO', method='get_film_by_name')
+        FilmDAO.get_film_by_name('A New Hope')
+        self.assertEqual(sample('dao_method_duration_seconds_count', dao='FilmDAO', method='get_film_by_name'), before + 1)
+
+    def test_swapi_latency(self):
+        """Test that SWAPI requests are timed by outcome"""
+        before = sample('swapi_request_duration_seconds_count', outcome='200')
+        service = SwapiService()
+        with patch.object(service.session, 'get', return_value=Mock(status_code=200, json=lambda: {})):
+            service._make_request('https://swapi.dev/api/films/1/')
+        self.assertEqual(sample('swapi_request_duration_seconds_count', outcome='200'), before + 1)
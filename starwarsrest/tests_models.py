@@ -0,0 +1,43 @@
+from django.test import TestCase
+from .models import Character, Starship, parse_quantity
+
+
+class ParseQuantityTest(TestCase):
+    """Test cases for parse_quantity"""
+
+    def test_parse_quantity(self):
+        """Test parsing the SWAPI quantity formats"""
+        self.assertEqual(parse_quantity('77'), 77)
+        self.assertEqual(parse_quantity('1,358'), 1358)
+        self.assertEqual(parse_quantity('12.5'), 12.5)
+        self.assertEqual(parse_quantity('1000km'), 1000)
+        self.assertEqual(parse_quantity('30-165'), 165)
+
+    def test_parse_quantity_unknown(self):
+        """Test that non numeric values give None"""
+        self.assertIsNone(parse_quantity('unknown'))
+        self.assertIsNone(parse_quantity('n/a'))
+        self.assertIsNone(parse_quantity(''))
+        self.assertIsNone(parse_quantity(None))
+
+
+class NumericShadowFieldsTest(TestCase):
+    """Test cases for the numeric shadow columns"""
+
+    def test_save_updates_shadow_fields(self):
+        """Test that save() keeps the shadow columns in sync"""
+        starship = Starship.objects.create(name='X-wing', model='T-65', cost_in_credits='149,999', length='12.5')
+        self.assertEqual(starship.cost_in_credits_numeric, 149999)
+        self.assertEqual(starship.length_numeric, 12.5)
+
+        starship.cost_in_credits = 'unknown'
+        starship.save(update_fields=['cost_in_credits'])
+        starship.refresh_from_db()
+        self.assertIsNone(starship.cost_in_credits_numeric)
+
+    def test_integer_shadow_fields(self):
+        """Test that integer shadow columns store integers"""
+        character = Character.objects.create(name='Jabba', mass='1,358')
+        self.assertEqual(character.mass_numeric, 1358.0)
+        starship = Starship.objects.create(name='Death Star', model='DS-1', crew='342,953')
+        self.assertIsInstance(starship.crew_numeric, int)
@@ -0,0 +1,80 @@
+import json
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from .models import Character
+from .pagination import EstimatedCountPaginator
+
+COUNT_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'tokens': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    'graph': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    'autocomplete': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+def _analyze():
+    with connection.cursor() as cursor:
+        cursor.execute(f'ANALYZE {Character._meta.db_table}')
+
+
+class EstimatedCountPaginationTest(TestCase):
+    """Test cases for the estimated and cached counts of the paginated lists"""
+
+    def setUp(self):
+        self.client = APIClient()
+        for i in range(3):
+            Character.objects.create(name=f'Character {i:02}', gender='male' if i else 'female')
+        _analyze()
+
+    def test_small_table_exact(self):
+        """Test that the lists under the threshold are counted exactly"""
+        response = self.client.get('/api/characters/')
+        self.assertEqual((response.data['count'], response.data['count_exact']), (3, True))
+        response = self.client.get('/api/characters/', {'film_count': 0})
+        self.assertEqual((response.data['count'], response.data['count_exact']), (3, True))
+
+    @override_settings(PAGINATION_ESTIMATE_THRESHOLD=1)
+    def test_estimate(self):
+        """Test that an unfiltered list past the threshold returns the estimate and filtered ones don't"""
+        response = self.client.get('/api/characters/')
+        self.assertEqual((response.data['count'], response.data['count_exact']), (3, False))
+        response = self.client.get('/api/characters/', {'name': 'Character 01'})
+        self.assertEqual((response.data['count'], response.data['count_exact']), (1, True))
+
+    @override_settings(PAGINATION_ESTIMATE_THRESHOLD=1)
+    def test_pages_past_the_estimate(self):
+        """Test that the rows added since the last ANALYZE are still paginated"""
+        for i in range(3, 25):
+            Character.objects.create(name=f'Character {i:02}')
+        first = self.client.get('/api/characters/')
+        self.assertFalse(first.data['count_exact'])
+        self.assertLess(first.data['count'], 25)
+        self.assertIsNotNone(first.data['next'])
+        second = self.client.get(first.data['next'])
+        self.assertEqual(len(second.data['results']), 5)
+        self.assertIsNone(second.data['next'])
+        self.assertEqual(self.client.get('/api/characters/', {'page': 3}).data['results'], [])
+        self.assertEqual(self.client.get('/api/characters/', {'page': 0}).status_code, 404)
+
+    @override_settings(CACHES=COUNT_CACHE)
+    def test_filtered_count_cached(self):
+        """Test that the exact counts are cached per filter and cleared by the writes"""
+        def count(**filters):
+            return EstimatedCountPaginator(Character.objects.filter(**filters), 20).count
+
+        self.assertEqual(count(gender='male'), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(count(gender='male'), 2)
+        with self.assertNumQueries(1):
+            self.assertEqual(count(gender='female'), 1)
+        Character.objects.create(name='Character 03', gender='male')
+        self.assertEqual(count(gender='male'), 3)
+
+    @override_settings(ROOT_URLCONF='starwarsrest.tests_async_views', PAGINATION_ESTIMATE_THRESHOLD=1)
+    async def test_async_list(self):
+        """Test the estimated count of the async list"""
+        response = await self.async_client.get('/api/characters/')
+        content = json.loads(response.content)
+        self.assertEqual((content['count'], content['count_exact'], content['next']), (3, False, None))
+        self.assertEqual(len(content['results']), 3)
@@ -0,0 +1,90 @@
+import datetime
+import io
+import json
+from unittest.mock import patch
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from .models import Film
+from .parsers import FastJSONParser
+from .renderers import FastJSONRenderer
+
+
+class FastJSONRendererTest(TestCase):
+    """Test cases for FastJSONRenderer"""
+
+    def setUp(self):
+        self.renderer = FastJSONRenderer()
+
+    def test_render_matches_stock_renderer(self):
+        """Test that the output parses to the same data as the DRF renderer output"""
+        data = {'name': 'A New Hope', 'episode_id': 4, 'films': [1, 2], 'crawl': 'It is a period…'}
+        fast = self.renderer.render(data)
+        stock = JSONRenderer().render(data)
+        self.assertEqual(json.loads(fast), json.loads(stock))
+
+    def test_render_dates_and_datetimes(self):
+        """Test that dates and datetimes are rendered natively"""
+        data = {
+            'release_date': datetime.date(1977, 5, 25),
+            'created': datetime.datetime(2014, 12, 10, 14, 23, 31, tzinfo=datetime.timezone.utc),
+        }
+        rendered = json.loads(self.renderer.render(data))
+        self.assertEqual(rendered['release_date'], '1977-05-25')
+        self.assertEqual(rendered['created'], '2014-12-10T14:23:31Z')
+
+    def test_render_none(self):
+        """Test that None renders to an empty body"""
+        self.assertEqual(self.renderer.render(None), b'')
+
+    def test_render_escapes_line_separators(self):
+        """Test that U+2028 and U+2029 are escaped"""
+        rendered = self.renderer.render({'text': 'a\u2028b\u2029c'})
+        self.assertIn(b'\\u2028', rendered)
+        self.assertIn(b'\\u2029', rendered)
+
+    def test_render_fallback_without_orjson(self):
+        """Test that the stock renderer is used when orjson is not installed"""
+        with patch('starwarsrest.renderers.orjson', None):
+            rendered = self.renderer.render({'name': 'Luke Skywalker'})
+        self.assertEqual(json.loads(rendered), {'name': 'Luke Skywalker'})
+
+
+class FastJSONParserTest(TestCase):
+    """Test cases for FastJSONParser"""
+
+    def setUp(self):
+        self.parser = FastJSONParser()
+
+    def test_parse(self):
+        """Test parsing a JSON body"""
+        stream = io.BytesIO(b'{"name": "Luke Skywalker", "films": [1, 2]}')
+        self.assertEqual(self.parser.parse(stream), {'name': 'Luke Skywalker', 'films': [1, 2]})
+
+    def test_parse_invalid(self):
+        """Test that invalid JSON raises a ParseError"""
+        with self.assertRaises(ParseError):
+            self.parser.parse(io.BytesIO(b'{"name": '))
+
+    def test_parse_fallback_without_orjson(self):
+        """Test that the stock parser is used when orjson is not installed"""
+        with patch('starwarsrest.parsers.orjson', None):
+            data = self.parser.parse(io.BytesIO(b'{"name": "Luke Skywalker"}'))
+        self.assertEqual(data, {'name': 'Luke Skywalker'})
+
+
+class FastJSONEndpointTest(TestCase):
+    """Test the fast renderer through the API"""
+
+    def setUp(self):
+        self.client = APIClient()
+        Film.objects.create(name='A New Hope', swapi_id=1, release_date='1977-05-25')
+
+    def test_list_films(self):
+        """Test that list responses are rendered as JSON"""
+        response = self.client.get(reverse('film-list'))
+        self.assertEqual(response['Content-Type'], 'application/json')
+        body = json.loads(response.content)
+        self.assertEqual(body['results'][0]['release_date'], '1977-05-25')
@@ -0,0 +1,92 @@
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from .dao import SearchDAO
+from .models import Character, Film, Starship
+
+
+class SearchTest(TestCase):
+    """Test cases for the full-text search endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.new_hope = Film.objects.create(
+            name='A New Hope', episode_id=4, director='George Lucas',
+            opening_crawl='It is a period of civil war. Rebel spaceships, striking from a hidden base, '
+                          'have won their first victory against the evil Galactic Empire.',
+        )
+        self.empire = Film.objects.create(
+            name='The Empire Strikes Back', episode_id=5, director='Irvin Kershner',
+            opening_crawl='It is a dark time for the Rebellion. Although the Death Star has been destroyed, '
+                          'Imperial troops have driven the Rebel forces from their hidden base.',
+        )
+        self.luke = Character.objects.create(name='Luke Skywalker', homeworld='Tatooine', gender='male')
+        self.death_star = Starship.objects.create(
+            name='Death Star', model='DS-1 Orbital Battle Station', starship_class='Deep Space Mobile Battlestation',
+            manufacturer='Imperial Department of Military Research, Sienar Fleet Systems',
+        )
+        self.falcon = Starship.objects.create(
+            name='Millennium Falcon', model='YT-1300 light freighter', starship_class='Light freighter',
+            manufacturer='Corellian Engineering Corporation',
+        )
+
+    def search(self, **params):
+        response = self.client.get('/api/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_opening_crawl(self):
+        """Test that the opening crawls are searched, with stemming and highlighting"""
+        results = self.search(q='victories')
+        self.assertEqual([(result['type'], result['id']) for result in results], [('films', self.new_hope.id)])
+        self.assertIn('<mark>victory</mark>', results[0]['headline'])
+
+    def test_ranking(self):
+        """Test that name matches rank above text matches, across the models"""
+        results = self.search(q='death star')
+        self.assertEqual([(result['type'], result['id']) for result in results],
+                         [('starships', self.death_star.id), ('films', self.empire.id)])
+        self.assertGreater(results[0]['rank'], results[1]['rank'])
+
+    def test_starship_attributes(self):
+        """Test that the manufacturer and the starship class are searched"""
+        self.assertEqual([result['id'] for result in self.search(q='corellian')], [self.falcon.id])
+        self.assertEqual([result['id'] for result in self.search(q='freighter', type='starships')], [self.falcon.id])
+
+    def test_websearch_syntax(self):
+        """Test the quoted phrases and excluded words"""
+        self.assertEqual([result['id'] for result in self.search(q='rebel -victory')], [self.empire.id])
+        self.assertEqual({result['id'] for result in self.search(q='"hidden base"')},
+                         {self.new_hope.id, self.empire.id})
+        self.assertEqual(self.search(q='"base hidden"'), [])
+
+    def test_type_and_limit(self):
+        """Test the type filter and the limit"""
+        self.assertEqual({result['type'] for result in self.search(q='rebel', type='characters,films')}, {'films'})
+        self.assertEqual(len(self.search(q='rebel', limit=1)), 1)
+
+    def test_updates(self):
+        """Test that the search vectors follow the updates, bulk ones included"""
+        self.luke.homeworld = 'Dagobah'
+        self.luke.save()
+        self.assertEqual(self.search(q='tatooine'), [])
+        Character.objects.filter(id=self.luke.id).update(homeworld='Tatooine')
+        self.assertEqual([result['id'] for result in self.search(q='tatooine')], [self.luke.id])
+
+    def test_invalid_parameters(self):
+        """Test the missing query, unknown types and invalid limits"""
+        for params in ({}, {'q': ' '}, {'q': 'rebel', 'type': 'planets'}, {'q': 'rebel', 'limit': 'all'},
+                       {'q': 'rebel', 'limit': 0}, {'q': 'rebel', 'limit': 1000}):
+            response = self.client.get('/api/search/', params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.json())
+
+    @override_settings(SEARCH_MAX_CANDIDATES=1)
+    def test_max_candidates(self):
+        """Test that only SEARCH_MAX_CANDIDATES matches are ranked per model"""
+        self.assertEqual(len(SearchDAO.search_model('films', 'rebel', 10)), 1)
+
+    def test_search_vector_not_serialized(self):
+        """Test that the search vectors stay out of the API responses"""
+        response = self.client.get(f'/api/films/{self.new_hope.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('search_vector', response.json())
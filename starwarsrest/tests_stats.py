@@ -0,0 +1,87 @@
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+from .dao import StatsDAO
+from .models import Character, Film, Starship
+
+
+class StatsTest(TestCase):
+    """Test cases for the statistics endpoints"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.new_hope = Film.objects.create(name='A New Hope', episode_id=4)
+        self.empire = Film.objects.create(name='The Empire Strikes Back', episode_id=5)
+        self.luke = Character.objects.create(name='Luke Skywalker')
+        self.han = Character.objects.create(name='Han Solo')
+        self.luke.films.set([self.new_hope, self.empire])
+        self.han.films.set([self.new_hope])
+        x_wing = Starship.objects.create(name='X-wing', model='T-65', starship_class='Starfighter',
+                                         crew='1', cost_in_credits='149999')
+        tie = Starship.objects.create(name='TIE Advanced x1', model='Twin Ion Engine', starship_class='starfighter',
+                                      crew='1', cost_in_credits='unknown')
+        falcon = Starship.objects.create(name='Millennium Falcon', model='YT-1300', starship_class='Light freighter',
+                                         crew='4', cost_in_credits='100000')
+        x_wing.films.set([self.new_hope, self.empire])
+        falcon.films.set([self.new_hope])
+        x_wing.pilots.set([self.luke])
+        falcon.pilots.set([self.luke, self.han])
+        tie.films.set([self.new_hope])
+        StatsDAO.refresh_materialized_views()
+
+    def test_overview(self):
+        """Test the totals and averages"""
+        response = self.client.get('/api/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            'characters': 2,
+            'films': 2,
+            'starships': 3,
+            'avg_films_per_character': 1.5,
+            'pilots': 2,
+            'avg_starships_per_pilot': 1.5,
+        })
+
+    def test_films(self):
+        """Test the per film statistics"""
+        response = self.client.get('/api/stats/films/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [
+            {'film_id': self.new_hope.id, 'name': 'A New Hope', 'episode_id': 4,
+             'characters': 2, 'starships': 3, 'pilots': 2},
+            {'film_id': self.empire.id, 'name': 'The Empire Strikes Back', 'episode_id': 5,
+             'characters': 1, 'starships': 1, 'pilots': 1},
+        ])
+
+    def test_pilots(self):
+        """Test the paginated starships per pilot"""
+        response = self.client.get('/api/stats/pilots/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(list(response.data['results']), [
+            {'id': self.luke.id, 'name': 'Luke Skywalker', 'starship_count': 2},
+            {'id': self.han.id, 'name': 'Han Solo', 'starship_count': 1},
+        ])
+
+    def test_starship_classes(self):
+        """Test the per class statistics, classes are case insensitive"""
+        response = self.client.get('/api/stats/starship-classes/')
+        self.assertEqual(response.status_code, 200)
+        starfighter, freighter = response.json()
+        self.assertEqual(starfighter['starship_class'], 'starfighter')
+        self.assertEqual(starfighter['starships'], 2)
+        self.assertEqual(starfighter['avg_crew'], 1)
+        # "unknown" costs are left out of the averages
+        self.assertEqual(starfighter['avg_cost_in_credits'], 149999)
+        self.assertEqual(freighter['starship_class'], 'light freighter')
+        self.assertEqual(freighter['max_cost_in_credits'], 100000)
+
+    def test_materialized_views_refresh(self):
+        """Test that the materialized statistics change on refresh only"""
+        self.han.films.add(self.empire)
+        self.assertEqual(self.client.get('/api/stats/films/').json()[1]['characters'], 1)
+        out = StringIO()
+        call_command('refresh_stats', stdout=out)
+        self.assertIn('Refreshed statistics', out.getvalue())
+        self.assertEqual(self.client.get('/api/stats/films/').json()[1]['characters'], 2)
@@ -0,0 +1,107 @@
+import json
+from datetime import timedelta
+from unittest.mock import Mock, patch
+import requests
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from .dao import CharacterDAO
+from .models import Character, Film, WebhookCursor
+from .webhooks import deliver_webhooks_task, sign
+
+URL = 'https://hooks.example.com/starwars'
+SECRET = 'webhook-secret'
+
+
+def _response(status_code=200, headers=None):
+    return Mock(status_code=status_code, headers=headers or {})
+
+
+@override_settings(WEBHOOK_URLS=[URL], WEBHOOK_SECRET=SECRET)
+class WebhookTest(TransactionTestCase):
+    """
+    Test cases for the webhooks drained from the change log. Transactions are committed,
+    the changes of the running transactions are not delivered yet.
+    """
+
+    def setUp(self):
+        self.luke = Character.objects.create(name='Luke Skywalker')
+        # Places the cursor of the endpoint after the setup
+        with patch('starwarsrest.webhooks.requests.post') as post:
+            deliver_webhooks_task()
+        post.assert_not_called()
+
+    def _deliver(self, *responses):
+        """Run the task, return the (headers, body) sent"""
+        with patch('starwarsrest.webhooks.requests.post', side_effect=list(responses)) as post:
+            deliver_webhooks_task()
+        return [(call.kwargs['headers'], call.kwargs['data']) for call in post.call_args_list]
+
+    def test_signed_coalesced_batch(self):
+        """Test that the changes are sent once per row with a valid signature"""
+        han = Character.objects.create(name='Han Solo')
+        han.height = 180
+        han.save()
+        self.luke.height = 172
+        self.luke.save()
+        film = Film.objects.create(name='A New Hope')
+        film.characters.add(self.luke)
+        film_id = film.id
+        film.delete()
+
+        (headers, body), = self._deliver(_response())
+        self.assertEqual(headers['X-Webhook-Signature'], sign(body, headers['X-Webhook-Timestamp'], SECRET))
+        payload = json.loads(body)
+        self.assertEqual(payload['id'], headers['X-Webhook-Id'])
+        self.assertEqual([(event['type'], event['id'], event['operation']) for event in payload['events']], [
+            ('characters', han.id, 'created'),
+            ('characters', self.luke.id, 'updated'),
+            ('films', film_id, 'deleted'),
+        ])
+        self.assertEqual(self._deliver(), [])
+
+    def test_retry_after_failure(self):
+        """Test that a failed batch is sent again, with the same id, once the backoff is over"""
+        Character.objects.create(name='Han Solo')
+        with self.assertLogs('starwarsrest.webhooks', 'WARNING'):
+            (headers, _), = self._deliver(_response(500))
+        cursor = WebhookCursor.objects.get(url=URL)
+        self.assertEqual((cursor.failures, cursor.last_error), (1, 'HTTP 500'))
+        self.assertGreater(cursor.next_attempt_at, timezone.now())
+        self.assertEqual(self._deliver(), [])
+
+        WebhookCursor.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        with self.assertLogs('starwarsrest.webhooks', 'WARNING'):
+            (retry_headers, _), = self._deliver(requests.exceptions.ConnectionError('refused'))
+        self.assertEqual(retry_headers['X-Webhook-Id'], headers['X-Webhook-Id'])
+        self.assertEqual(WebhookCursor.objects.get(url=URL).failures, 2)
+
+        WebhookCursor.objects.update(next_attempt_at=None)
+        self.assertEqual(len(self._deliver(_response())), 1)
+        cursor = WebhookCursor.objects.get(url=URL)
+        self.assertEqual((cursor.failures, cursor.next_attempt_at, cursor.last_error), (0, None, ''))
+
+    def test_retry_after_header(self):
+        """Test that a 429 answer delays the next attempt by its Retry-After"""
+        Character.objects.create(name='Han Solo')
+        with self.assertLogs('starwarsrest.webhooks', 'WARNING'):
+            self._deliver(_response(429, {'Retry-After': '120'}))
+        delay = WebhookCursor.objects.get(url=URL).next_attempt_at - timezone.now()
+        self.assertAlmostEqual(delay.total_seconds(), 120, delta=5)
+
+    @override_settings(WEBHOOK_BATCH_SIZE=2, WEBHOOK_MAX_BATCHES=2)
+    def test_batches(self):
+        """Test that a backlog is sent in batches, the task queueing the next one past WEBHOOK_MAX_BATCHES"""
+        characters = CharacterDAO.bulk_create_characters([{'name': f'Character {i}'} for i in range(5)])
+        with patch.object(deliver_webhooks_task, 'apply_async') as apply_async:
+            sent = self._deliver(_response(), _response())
+        apply_async.assert_called_once_with()
+        sent += self._deliver(_response())
+        ids = [event['id'] for _, body in sent for event in json.loads(body)['events']]
+        self.assertEqual(ids, [character.id for character in characters])
+
+    @override_settings(WEBHOOK_SECRET='')
+    def test_no_secret(self):
+        """Test that nothing is sent unsigned"""
+        Character.objects.create(name='Han Solo')
+        with self.assertLogs('starwarsrest.webhooks', 'ERROR'):
+            self.assertEqual(self._deliver(), [])
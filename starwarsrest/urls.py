@@ -20,19 +20,28 @@ from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework import routers
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
-from .views import CharacterViewSet, FilmViewSet, StarshipViewSet
+from .views import CharacterViewSet, FilmViewSet, StarshipViewSet, StatsViewSet, SearchViewSet, ChangesViewSet, autocomplete_view, change_stream_view
+from .metrics import metrics_view
+from .routers import AsyncReadRouter
 
 # Create router and register viewsets
-router = routers.DefaultRouter()
+# Under ASGI with ASYNC_VIEWS the list, retrieve and search actions are served by async views
+router = AsyncReadRouter() if settings.ASYNC_VIEWS else routers.DefaultRouter()
 router.register(r'characters', CharacterViewSet)
 router.register(r'films', FilmViewSet)
 router.register(r'starships', StarshipViewSet)
+router.register(r'stats', StatsViewSet, basename='stats')
+router.register(r'search', SearchViewSet, basename='search')
+router.register(r'changes', ChangesViewSet, basename='changes')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/autocomplete/', autocomplete_view, name='autocomplete'),
+    path('api/changes/stream/', change_stream_view, name='change-stream'),
     path('api/', include(router.urls)),
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Serve static files in development and production
@@ -1,22 +1,371 @@
-from rest_framework import viewsets, status, filters
+from datetime import timezone as dt_timezone
+from asgiref.sync import sync_to_async
+from rest_framework import exceptions, viewsets, status, filters
 from rest_framework.decorators import action
+from rest_framework.request import Request
 from rest_framework.response import Response
-from django.core.exceptions import ValidationError
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.paginator import InvalidPage
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import Character, Film, Starship
 from .serializers import (
+    DynamicFieldsModelSerializer,
     CharacterSerializer,
     CreateCharacterSerializer,
     FilmSerializer,
     StarshipSerializer,
     CreateStarshipSerializer
 )
-from .dao import CharacterDAO, FilmDAO, StarshipDAO
+from .dao import CharacterDAO, FilmDAO, StarshipDAO, StatsDAO, SearchDAO, ChangesDAO
 from .services import SwapiService, ALLOW_UNOFFICIAL_RECORDS
 from .permissions import IsAuthenticatedOrReadOnly
+from .exports import ndjson_lines, csv_lines
+from .filters import CharacterFilter, FilmFilter, StarshipFilter
+from .pagination import EstimatedCountPaginator
+from .db_router import read_alias
+from .graph import get_graph
+from .autocomplete import MODELS as AUTOCOMPLETE_TYPES, get_autocomplete_index
+from .change_stream import format_position, get_change_broker, parse_position
 
 
-class CharacterViewSet(viewsets.ModelViewSet):
+class SparseFieldsetMixin:
+    """
+    Applies the `fields` and `expand` query parameters of GET requests, e.g.
+    ?fields=id,name or ?expand=films,pilots, to the serializer and to the queryset,
+    so that the SELECT list and the prefetches only cover what the client asked for.
+    """
+
+    def _get_list_param(self, name):
+        value = self.request.query_params.get(name)
+        if value is None:
+            return None
+        return [item.strip() for item in value.split(',') if item.strip()]
+
+    def get_sparse_fieldset(self):
+        """Return the requested (fields, expand), None for each one not given"""
+        request = getattr(self, 'request', None)
+        if request is None or request.method != 'GET':
+            return None, None
+        return self._get_list_param('fields'), self._get_list_param('expand')
+
+    def shape_queryset(self, queryset):
+        """Restrict columns and prefetches of a queryset to the requested fieldset"""
+        request = getattr(self, 'request', None)
+        serializer_class = self.get_serializer_class()
+        if request is None or request.method != 'GET' or not issubclass(serializer_class, DynamicFieldsModelSerializer):
+            return queryset
+        fields, expand = self.get_sparse_fieldset()
+        return serializer_class.setup_eager_loading(queryset, fields, expand)
+
+    def get_queryset(self):
+        return self.shape_queryset(super().get_queryset())
+
+    def get_serializer(self, *args, **kwargs):
+        if issubclass(self.get_serializer_class(), DynamicFieldsModelSerializer):
+            fields, expand = self.get_sparse_fieldset()
+            kwargs.setdefault('fields', fields)
+            kwargs.setdefault('expand', expand)
+        return super().get_serializer(*args, **kwargs)
+
+
+class ExportMixin:
+    """
+    Adds an `export` action that streams every row as NDJSON, or as CSV with ?output=csv.
+    Rows are read through a server-side cursor in chunks of `export_chunk_size` and the
+    relation ids are prefetched per chunk, so memory stays flat whatever the table size.
+    Supports the `fields` parameter and the filters of the viewset.
+    """
+    export_chunk_size = 2000
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        output = request.query_params.get('output', 'ndjson')
+        if output not in ('ndjson', 'csv'):
+            return Response(
+                {"error": "Unsupported output, use 'ndjson' or 'csv'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        fields, _ = self.get_sparse_fieldset()
+        serializer_class = self.get_serializer_class()
+        # Relations are exported as ids only
+        queryset = serializer_class.setup_eager_loading(self.queryset.all(), fields, expand=[])
+        # The rows are read after the request returns, bind the database chosen for it now
+        queryset = self.filter_queryset(queryset).using(read_alias())
+        serializer = serializer_class(fields=fields, expand=[])
+        rows = (
+            serializer.to_representation(obj)
+            for obj in queryset.iterator(chunk_size=self.export_chunk_size)
+        )
+
+        if output == 'csv':
+            response = StreamingHttpResponse(csv_lines(rows, list(serializer.fields)), content_type='text/csv')
+        else:
+            response = StreamingHttpResponse(ndjson_lines(rows), content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="{self.basename}s.{output}"'
+        return response
+
+
+class BatchMixin:
+    """
+    Adds a `batch` action that creates (POST a list of objects), updates (PATCH a list
+    of objects with their `id`) or deletes (DELETE a list of ids) many rows at once.
+    The whole batch is validated first and then written through the bulk DAO operations
+    in one transaction, so the cache is invalidated once at the end. An invalid batch
+    is rejected as a whole, with the errors listed per item.
+    """
+    batch_max_size = 1000
+    # Serializer validating the items of a create or update batch
+    batch_serializer_class = None
+    # Bulk DAO operations writing a batch: create(data_list), update([(id, data)]) and delete(ids)
+    batch_create = None
+    batch_update = None
+    batch_delete = None
+    # Name of the SwapiService method validating one item of a create batch, called with
+    # the batch_swapi_fields of the item and its swapi_id
+    batch_swapi_validator = None
+    batch_swapi_fields = ('name',)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        missing = [
+            name for name in ('batch_serializer_class', 'batch_create', 'batch_update', 'batch_delete',
+                              'batch_swapi_validator')
+            if getattr(cls, name) is None
+        ]
+        if missing:
+            raise ImproperlyConfigured(f"{cls.__name__} must set {', '.join(missing)}")
+
+    def validate_swapi(self, swapi_service, data):
+        """Validate one item of a create batch against SWAPI, see SwapiService"""
+        validator = getattr(swapi_service, self.batch_swapi_validator)
+        return validator(*(data.get(field) for field in self.batch_swapi_fields), data.get('swapi_id', 0))
+
+    @action(detail=False, methods=['post', 'patch', 'delete'])
+    def batch(self, request):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response(
+                {"error": "Please provide a non empty list"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > self.batch_max_size:
+            return Response(
+                {"error": f"Batches are limited to {self.batch_max_size} items"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if request.method == 'DELETE':
+            return self._batch_delete(items)
+        if request.method == 'PATCH':
+            return self._batch_update(items)
+        return self._batch_create(items)
+
+    def _batch_create(self, items):
+        serializer = self.batch_serializer_class(data=items, many=True)
+        if not serializer.is_valid():
+            return Response({"errors": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        swapi_service = SwapiService()
+        errors = []
+        for data in serializer.validated_data:
+            try:
+                is_valid = self.validate_swapi(swapi_service, data)
+                errors.append({} if is_valid else {
+                    "error": f"{self.basename.capitalize()} not found in SWAPI and unofficial records are not allowed"
+                })
+            except ValidationError as e:
+                errors.append({"error": str(e)})
+        if any(errors):
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            objects = self.batch_create(serializer.validated_data)
+        except ValidationError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self._batch_representation(objects), status=status.HTTP_201_CREATED)
+
+    def _batch_update(self, items):
+        ids = [item.get('id') if isinstance(item, dict) else None for item in items]
+        instances = self.queryset.model.objects.in_bulk([i for i in ids if isinstance(i, int)])
+
+        errors = []
+        updates = []
+        for item, object_id in zip(items, ids):
+            instance = instances.get(object_id)
+            if instance is None:
+                errors.append({"id": [f"{self.basename.capitalize()} not found"]})
+                continue
+            serializer = self.batch_serializer_class(instance, data=item, partial=True)
+            if serializer.is_valid():
+                errors.append({})
+                updates.append((object_id, serializer.validated_data))
+            else:
+                errors.append(serializer.errors)
+        if any(errors):
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            objects = self.batch_update(updates)
+        except ValidationError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self._batch_representation(objects))
+
+    def _batch_delete(self, ids):
+        if not all(isinstance(i, int) for i in ids):
+            return Response(
+                {"error": "Please provide a list of ids"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        deleted = self.batch_delete(ids)
+        return Response([{"id": i, "deleted": i in deleted} for i in ids])
+
+    def _batch_representation(self, objects):
+        """Serialize the written objects in input order, relations as ids"""
+        ids = [obj.pk for obj in objects]
+        serializer_class = self.get_serializer_class()
+        queryset = serializer_class.setup_eager_loading(self.queryset.filter(id__in=ids), expand=[])
+        by_id = {obj.pk: obj for obj in queryset}
+        return serializer_class([by_id[pk] for pk in ids], many=True, expand=[]).data
+
+
+class AsyncReadMixin:
+    """
+    Async versions of the list, retrieve and search actions, for ASGI deployments.
+    as_async_view() returns an async view running them on the event loop with the
+    queryset, filters, fieldsets, serializers and pagination of the viewset, the rows
+    being read through the async DAO methods (see the a* attributes). The other actions, and
+    the requests negotiating another format than JSON (e.g. the browsable API), are
+    handed to the sync view in a thread.
+    Reads are public (IsAuthenticatedOrReadOnly), the async actions don't authenticate.
+    """
+    async_actions = ('list', 'retrieve', 'search')
+    # Async DAO methods reading the rows: get(pk, queryset), None if missing,
+    # list(queryset), count(queryset) and search(name, queryset)
+    aget_object_by_id = None
+    alist_objects = None
+    acount_objects = None
+    asearch_objects = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        missing = [
+            name for name in ('aget_object_by_id', 'alist_objects', 'acount_objects', 'asearch_objects')
+            if getattr(cls, name) is None
+        ]
+        if missing:
+            raise ImproperlyConfigured(f"{cls.__name__} must set {', '.join(missing)}")
+
+    @classmethod
+    def as_async_view(cls, actions, **initkwargs):
+        sync_view = cls.as_view(actions, **initkwargs)
+        async_actions = {method: name for method, name in actions.items() if name in cls.async_actions}
+
+        async def view(request, *args, **kwargs):
+            action_name = async_actions.get(request.method.lower())
+            if action_name is not None:
+                self = cls(**initkwargs)
+                self.action_map = actions
+                for method, name in actions.items():
+                    setattr(self, method, getattr(self, name))
+                response = await self.async_dispatch(request, action_name, *args, **kwargs)
+                if response is not None:
+                    return response
+            return await sync_to_async(sync_view)(request, *args, **kwargs)
+
+        view.cls = cls
+        view.initkwargs = initkwargs
+        view.actions = actions
+        view.csrf_exempt = True
+        return view
+
+    async def async_dispatch(self, request, action_name, *args, **kwargs):
+        """Run an async action, None when the request has to go to the sync view"""
+        self.args = args
+        self.kwargs = kwargs
+        self.action = action_name
+        self.headers = self.default_response_headers
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+        self.request = request = Request(
+            request,
+            parsers=self.get_parsers(),
+            authenticators=(),
+            negotiator=self.get_content_negotiator(),
+            parser_context=self.get_parser_context(request),
+        )
+        try:
+            request.accepted_renderer, request.accepted_media_type = self.perform_content_negotiation(request)
+        except exceptions.NotAcceptable:
+            return None
+        if request.accepted_renderer.format != 'json':
+            return None
+
+        try:
+            response = await getattr(self, f'async_{action_name}')(request)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        # Render here rather than in a thread like Django does for template responses
+        response = self.finalize_response(request, response, *args, **kwargs)
+        response.render()
+        return HttpResponse(response.content, status=response.status_code, headers=response.headers)
+
+    async def async_list(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        paginator = self.paginator
+        page_size = paginator.get_page_size(request) if paginator is not None else None
+        if not page_size:
+            return Response(self.get_serializer(await self.alist_objects(queryset), many=True).data)
+
+        django_paginator = paginator.django_paginator_class(queryset, page_size)
+        # Paginator.count is a cached property, fill it so that the paginator doesn't count synchronously
+        if isinstance(django_paginator, EstimatedCountPaginator):
+            await django_paginator.acount()
+        else:
+            django_paginator.count = await self.acount_objects(queryset)
+        page_number = paginator.get_page_number(request, django_paginator)
+        try:
+            page = django_paginator.page(page_number)
+        except InvalidPage as exc:
+            raise exceptions.NotFound(
+                paginator.invalid_page_message.format(page_number=page_number, message=str(exc))
+            )
+        paginator.request = request
+        paginator.page = page
+        objects = await self.alist_objects(page.object_list)
+        # Evaluated, the page can be measured without a synchronous query
+        page.object_list = objects
+        return paginator.get_paginated_response(self.get_serializer(objects, many=True).data)
+
+    async def async_retrieve(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            instance = await self.aget_object_by_id(self.kwargs[lookup_url_kwarg], queryset)
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        if instance is None:
+            raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+        self.check_object_permissions(request, instance)
+        return Response(self.get_serializer(instance).data)
+
+    async def async_search(self, request):
+        name = request.query_params.get('name', '')
+        if not name:
+            return Response(
+                {"error": "Please provide a 'name' parameter for search"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        objects = await self.asearch_objects(name, self.get_queryset())
+        return Response(self.get_serializer(objects, many=True).data)
+
+
+class CharacterViewSet(SparseFieldsetMixin, ExportMixin, BatchMixin, AsyncReadMixin, viewsets.ModelViewSet):
     """
     ViewSet for Characters
     """
@@ -24,8 +373,19 @@ class CharacterViewSet(viewsets.ModelViewSet):
     serializer_class = CharacterSerializer
     filter_backends = [filters.SearchFilter, DjangoFilterBackend]
     search_fields = ['name']
-    filterset_fields = ['name']
+    filterset_class = CharacterFilter
     permission_classes = [IsAuthenticatedOrReadOnly]
+    batch_serializer_class = CreateCharacterSerializer
+    
+    batch_create = staticmethod(CharacterDAO.bulk_create_characters)
+    batch_update = staticmethod(CharacterDAO.bulk_update_characters)
+    batch_delete = staticmethod(CharacterDAO.bulk_delete_characters)
+    batch_swapi_validator = 'validate_character_data'
+    
+    aget_object_by_id = staticmethod(CharacterDAO.aget_character_by_id)
+    alist_objects = staticmethod(CharacterDAO.alist_characters)
+    acount_objects = staticmethod(CharacterDAO.acount_characters)
+    asearch_objects = staticmethod(CharacterDAO.asearch_characters_by_name)
     
     @action(detail=False, methods=['post'], serializer_class=CreateCharacterSerializer)
     def create_character(self, request):
@@ -115,12 +475,74 @@ class CharacterViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        characters = CharacterDAO.search_characters_by_name(name)
-        serializer = CharacterSerializer(characters, many=True)
+        characters = self.shape_queryset(CharacterDAO.search_characters_by_name(name))
+        serializer = self.get_serializer(characters, many=True)
         return Response(serializer.data)
+    
+    def _get_character_id(self, value):
+        """Id of an existing character, Http404 otherwise"""
+        try:
+            character_id = int(value)
+        except (TypeError, ValueError):
+            raise Http404
+        if not CharacterDAO.get_character_names([character_id]):
+            raise Http404('No Character matches the given query.')
+        return character_id
+    
+    @action(detail=True, methods=['get'])
+    def neighbors(self, request, pk=None):
+        """
+        Co-stars of a character from the co-appearance graph, most shared films first.
+        ?limit=k only returns the top k co-stars.
+        """
+        character_id = self._get_character_id(pk)
+        limit = request.query_params.get('limit')
+        if limit is not None:
+            try:
+                limit = int(limit)
+                if limit < 1:
+                    raise ValueError
+            except ValueError:
+                return Response(
+                    {"error": "'limit' must be a positive integer"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
+        neighbors = get_graph().neighbors(character_id, limit)
+        names = CharacterDAO.get_character_names([other_id for other_id, _ in neighbors])
+        return Response({
+            'count': len(neighbors),
+            'results': [
+                {'id': other_id, 'name': names.get(other_id), 'shared_films': shared_films}
+                for other_id, shared_films in neighbors
+            ],
+        })
+    
+    @action(detail=True, methods=['get'])
+    def path(self, request, pk=None):
+        """
+        Shortest chain of co-stars from this character to the ?to=<id> one.
+        degrees and path are null when they are not connected.
+        """
+        character_id = self._get_character_id(pk)
+        if not request.query_params.get('to'):
+            return Response(
+                {"error": "Please provide a 'to' parameter with a character id"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        target_id = self._get_character_id(request.query_params['to'])
+        
+        path = get_graph().shortest_path(character_id, target_id)
+        if path is None:
+            return Response({'degrees': None, 'path': None})
+        names = CharacterDAO.get_character_names(path)
+        return Response({
+            'degrees': len(path) - 1,
+            'path': [{'id': step_id, 'name': names.get(step_id)} for step_id in path],
+        })
 
 
-class FilmViewSet(viewsets.ModelViewSet):
+class FilmViewSet(SparseFieldsetMixin, ExportMixin, BatchMixin, AsyncReadMixin, viewsets.ModelViewSet):
     """
     ViewSet for Films
     """
@@ -128,9 +550,19 @@ class FilmViewSet(viewsets.ModelViewSet):
     serializer_class = FilmSerializer
     filter_backends = [filters.SearchFilter, DjangoFilterBackend]
     search_fields = ['name']
-    filterset_fields = ['name']
+    filterset_class = FilmFilter
     permission_classes = [IsAuthenticatedOrReadOnly]
+    batch_serializer_class = FilmSerializer
     
+    batch_create = staticmethod(FilmDAO.bulk_create_films)
+    batch_update = staticmethod(FilmDAO.bulk_update_films)
+    batch_delete = staticmethod(FilmDAO.bulk_delete_films)
+    batch_swapi_validator = 'validate_film_data'
+    
+    aget_object_by_id = staticmethod(FilmDAO.aget_film_by_id)
+    alist_objects = staticmethod(FilmDAO.alist_films)
+    acount_objects = staticmethod(FilmDAO.acount_films)
+    asearch_objects = staticmethod(FilmDAO.asearch_films_by_name)
     
     
     def create(self, request, *args, **kwargs):
@@ -206,12 +638,12 @@ class FilmViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        films = FilmDAO.search_films_by_name(name)
-        serializer = FilmSerializer(films, many=True)
+        films = self.shape_queryset(FilmDAO.search_films_by_name(name))
+        serializer = self.get_serializer(films, many=True)
         return Response(serializer.data)
 
 
-class StarshipViewSet(viewsets.ModelViewSet):
+class StarshipViewSet(SparseFieldsetMixin, ExportMixin, BatchMixin, AsyncReadMixin, viewsets.ModelViewSet):
     """
     ViewSet for Starships
     """
@@ -219,8 +651,20 @@ class StarshipViewSet(viewsets.ModelViewSet):
     serializer_class = StarshipSerializer
     filter_backends = [filters.SearchFilter, DjangoFilterBackend]
     search_fields = ['name', 'model']
-    filterset_fields = ['name', 'model']
+    filterset_class = StarshipFilter
     permission_classes = [IsAuthenticatedOrReadOnly]
+    batch_serializer_class = CreateStarshipSerializer
+    
+    batch_create = staticmethod(StarshipDAO.bulk_create_starships)
+    batch_update = staticmethod(StarshipDAO.bulk_update_starships)
+    batch_delete = staticmethod(StarshipDAO.bulk_delete_starships)
+    batch_swapi_validator = 'validate_starship_data'
+    batch_swapi_fields = ('name', 'model')
+    
+    aget_object_by_id = staticmethod(StarshipDAO.aget_starship_by_id)
+    alist_objects = staticmethod(StarshipDAO.alist_starships)
+    acount_objects = staticmethod(StarshipDAO.acount_starships)
+    asearch_objects = staticmethod(StarshipDAO.asearch_starships_by_name)
     
     @action(detail=False, methods=['post'], serializer_class=CreateStarshipSerializer)
     def create_starship(self, request):
@@ -311,6 +755,216 @@ class StarshipViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        starships = StarshipDAO.search_starships_by_name(name)
-        serializer = StarshipSerializer(starships, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        starships = self.shape_queryset(StarshipDAO.search_starships_by_name(name))
+        serializer = self.get_serializer(starships, many=True)
+        return Response(serializer.data)
+
+
+class StatsViewSet(viewsets.GenericViewSet):
+    """
+    ViewSet for the aggregate statistics, computed in the database.
+    The per film and per starship class statistics come from materialized views
+    refreshed after the data population (see the refresh_stats command).
+    """
+    
+    def list(self, request):
+        """Totals and average relation sizes"""
+        return Response(StatsDAO.get_overview())
+    
+    @action(detail=False, methods=['get'])
+    def films(self, request):
+        """Characters, starships and pilots per film"""
+        return Response(list(StatsDAO.list_film_stats()))
+    
+    @action(detail=False, methods=['get'])
+    def pilots(self, request):
+        """Starships per pilot, most starships first, paginated"""
+        page = self.paginate_queryset(StatsDAO.list_pilot_stats())
+        return self.get_paginated_response(page)
+    
+    @action(detail=False, methods=['get'], url_path='starship-classes')
+    def starship_classes(self, request):
+        """Starship count, average crew, passengers, cost, length and hyperdrive rating per starship class"""
+        return Response(list(StatsDAO.list_starship_class_stats()))
+
+
+class SearchViewSet(viewsets.GenericViewSet):
+    """
+    ViewSet for the full-text search over the films, characters and starships, e.g.
+    /api/search/?q=death star&type=films,starships&limit=10. Results are ranked across
+    the models, with the matching words of their text highlighted with <mark> tags.
+    """
+    
+    MAX_LIMIT = 100
+    
+    def list(self, request):
+        """Best matches of the q query (websearch syntax: "phrases", OR, -word)"""
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            return Response(
+                {"error": "Please provide a 'q' parameter for search"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        names = [name.strip() for name in request.query_params.get('type', '').split(',') if name.strip()]
+        unknown = [name for name in names if name not in SearchDAO.MODELS]
+        if unknown:
+            return Response(
+                {"error": f"Unknown type {', '.join(unknown)}, use {', '.join(SearchDAO.MODELS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= self.MAX_LIMIT:
+            return Response(
+                {"error": f"'limit' must be an integer between 1 and {self.MAX_LIMIT}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({'query': text, 'results': SearchDAO.search(text, names, limit)})
+
+
+PRUNED_ERROR = "The changes after 'since' were pruned from the log, download the data again"
+
+
+class ChangesViewSet(viewsets.GenericViewSet):
+    """
+    ViewSet for the delta sync of the clients keeping a copy of the data, e.g.
+    /api/changes/?since=<cursor>&limit=500. Returns the films, characters and starships
+    created, updated or deleted since the cursor of the previous response, each one
+    once in its current state, the deleted ones as tombstones without data. Relation
+    changes show up as updates of the rows on both sides.
+    Without since, returns the cursor of the current state to start from after a full
+    download. since also takes an ISO 8601 timestamp, which may repeat a few changes
+    from before it. A since older than the pruned part of the log gets a 410: some
+    changes after it are gone, the client downloads the data again.
+    """
+    
+    MAX_LIMIT = 1000
+    SERIALIZERS = {'films': FilmSerializer, 'characters': CharacterSerializer, 'starships': StarshipSerializer}
+    
+    def list(self, request):
+        """Changes after the since cursor, oldest first"""
+        try:
+            limit = int(request.query_params.get('limit', 100))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= self.MAX_LIMIT:
+            return Response(
+                {"error": f"'limit' must be an integer between 1 and {self.MAX_LIMIT}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        alias = read_alias()
+        since = request.query_params.get('since', '').strip()
+        if not since:
+            position = ChangesDAO.current_position(alias)
+            return Response({'cursor': format_position(position), 'has_more': False, 'changes': []})
+        position = parse_position(since)
+        if position is None:
+            try:
+                timestamp = parse_datetime(since)
+            except ValueError:
+                timestamp = None
+            if timestamp is None:
+                return Response(
+                    {"error": "'since' must be a cursor returned by this endpoint or an ISO 8601 timestamp"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if timezone.is_naive(timestamp):
+                timestamp = timezone.make_aware(timestamp, dt_timezone.utc)
+            if ChangesDAO.is_pruned(alias, timestamp=timestamp):
+                return Response({"error": PRUNED_ERROR}, status=status.HTTP_410_GONE)
+            position = ChangesDAO.position_at(timestamp, alias)
+        elif ChangesDAO.is_pruned(alias, position=position):
+            return Response({"error": PRUNED_ERROR}, status=status.HTTP_410_GONE)
+        
+        entries, position, has_more = ChangesDAO.list_changes(position, limit, alias)
+        data = {}
+        for object_type, serializer_class in self.SERIALIZERS.items():
+            ids = [entry.object_id for entry in entries if entry.object_type == object_type and not entry.deleted]
+            if not ids:
+                continue
+            model = serializer_class.Meta.model
+            queryset = serializer_class.setup_eager_loading(model.objects.using(alias).filter(id__in=ids), None, [])
+            for row in serializer_class(queryset, many=True, expand=[]).data:
+                data[object_type, row['id']] = row
+        changes = []
+        for entry in entries:
+            change = {
+                'seq': format_position((entry.txid, entry.id)),
+                'type': entry.object_type,
+                'id': entry.object_id,
+                'deleted': entry.deleted,
+                'changed_at': entry.changed_at,
+            }
+            if not entry.deleted:
+                change['data'] = data.get((entry.object_type, entry.object_id))
+                if change['data'] is None:
+                    # Deleted since, its tombstone comes later in the log
+                    continue
+            changes.append(change)
+        return Response({'cursor': format_position(position), 'has_more': has_more, 'changes': changes})
+
+
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+
+def autocomplete_view(request):
+    """
+    Names of the films, characters and starships with a word starting with ?q=, e.g.
+    /api/autocomplete/?q=sky&type=characters&limit=10, answered from the in-memory index
+    of the process. A plain Django view: it is called on every keystroke and the DRF
+    request handling would cost more than the lookup itself.
+    """
+    if request.method != 'GET':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    text = request.GET.get('q', '')
+    types = [name.strip() for name in request.GET.get('type', '').split(',') if name.strip()]
+    unknown = [name for name in types if name not in AUTOCOMPLETE_TYPES]
+    if unknown:
+        return JsonResponse({"error": f"Unknown type {', '.join(unknown)}, use {', '.join(AUTOCOMPLETE_TYPES)}"},
+                            status=400)
+    try:
+        limit = int(request.GET.get('limit', 10))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= AUTOCOMPLETE_MAX_LIMIT:
+        return JsonResponse({"error": f"'limit' must be an integer between 1 and {AUTOCOMPLETE_MAX_LIMIT}"},
+                            status=400)
+    return JsonResponse(get_autocomplete_index().search(text, types, limit), safe=False)
+
+
+async def change_stream_view(request):
+    """
+    Server-Sent Events stream of the changes of the films, characters and starships,
+    e.g. /api/changes/stream/?type=characters, one `created`, `updated`, `related` or
+    `deleted` event per changed row. Resumes after the Last-Event-ID header or the
+    ?since= cursor, 410 when the log was pruned after it. A plain async Django view:
+    the connections stay open, which needs an ASGI server (see change_stream.py).
+    """
+    if request.method != 'GET':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"error": "The change stream is only served by the ASGI server"}, status=501)
+    types = [name.strip() for name in request.GET.get('type', '').split(',') if name.strip()]
+    unknown = [name for name in types if name not in ChangesViewSet.SERIALIZERS]
+    if unknown:
+        return JsonResponse(
+            {"error": f"Unknown type {', '.join(unknown)}, use {', '.join(ChangesViewSet.SERIALIZERS)}"}, status=400,
+        )
+    since = request.headers.get('Last-Event-ID') or request.GET.get('since')
+    position = None
+    if since:
+        position = parse_position(since)
+        if position is None:
+            return JsonResponse({"error": "'since' must be a cursor returned by the changes endpoints"}, status=400)
+    broker = get_change_broker()
+    if position is not None and await sync_to_async(ChangesDAO.is_pruned)(broker.using, position=position):
+        return JsonResponse({"error": PRUNED_ERROR}, status=410)
+    if broker.streams >= settings.CHANGE_STREAM_MAX_SUBSCRIBERS:
+        return JsonResponse({"error": "Too many open change streams, retry later"}, status=503)
+    response = StreamingHttpResponse(broker.stream(position, set(types) or None), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Not buffered by nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,168 @@
+"""
+Signed webhooks telling the WEBHOOK_URLS endpoints about the film, character and
+starship changes.
+
+The change log (see Change) is the outbox: its triggers write it in the transaction of
+every write, one INSERT per statement run by the database, so the API write path does
+not wait on the webhooks. deliver_webhooks_task, run every WEBHOOK_INTERVAL seconds by
+Celery beat, drains it per endpoint from the position stored in its WebhookCursor:
+batches of up to WEBHOOK_BATCH_SIZE log entries, coalesced to one event per row, are
+POSTed one at a time and the cursor only moves once the endpoint answered 2xx, so
+every change is delivered at least once, in order.
+
+A failed delivery is retried with an exponential backoff, or after the Retry-After of
+a 429/503 answer, without holding back the other endpoints. A task sends at most
+WEBHOOK_MAX_BATCHES batches per endpoint and queues the next task when some have
+more, so a backlog is drained at the pace of the endpoint.
+
+Each request carries X-Webhook-Id (the log position of its last entry, the same on
+retries), X-Webhook-Timestamp and X-Webhook-Signature: `sha256=` and the hex HMAC-SHA256
+of `<timestamp>.<body>` with WEBHOOK_SECRET.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import time
+from datetime import timedelta
+import requests
+from celery import shared_task
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.utils import timezone
+from .change_stream import format_position
+from .dao import ChangesDAO
+from .metrics import WEBHOOK_DELIVERIES, WEBHOOK_EVENTS
+from .models import Change, WebhookCursor
+
+logger = logging.getLogger(__name__)
+
+# Seconds before the first retry, doubled on every failure up to WEBHOOK_RETRY_MAX_DELAY
+RETRY_BASE_DELAY = 5
+
+
+def coalesce(entries):
+    """
+    One event per row, in the order of their last change: `deleted` when the row was
+    deleted, `created` when it was created by these entries, `related` when only its
+    relations changed, `updated` otherwise.
+    """
+    events = {}
+    for entry in entries:
+        key = (entry.object_type, entry.object_id)
+        previous = events.pop(key, None)
+        operation = entry.operation
+        if previous is not None and operation != Change.DELETED:
+            if previous['operation'] == Change.CREATED or operation == Change.RELATED:
+                operation = previous['operation']
+        events[key] = {
+            'type': entry.object_type,
+            'id': entry.object_id,
+            'operation': operation,
+            'changed_at': entry.changed_at.isoformat(),
+        }
+    return list(events.values())
+
+
+def sign(body, timestamp, secret):
+    """X-Webhook-Signature of a body sent at timestamp"""
+    message = f'{timestamp}.'.encode() + body
+    return 'sha256=' + hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def _retry_after(response):
+    """Seconds asked by a 429 or 503 answer, None without a usable Retry-After"""
+    if response is None or response.status_code not in (429, 503):
+        return None
+    try:
+        return max(0, int(response.headers.get('Retry-After', '')))
+    except ValueError:
+        return None
+
+
+def _post(url, webhook_id, events):
+    """POST a batch, returns (response or None, error message or None)"""
+    body = json.dumps({'id': webhook_id, 'events': events}).encode()
+    timestamp = str(int(time.time()))
+    headers = {
+        'Content-Type': 'application/json',
+        'X-Webhook-Id': webhook_id,
+        'X-Webhook-Timestamp': timestamp,
+        'X-Webhook-Signature': sign(body, timestamp, settings.WEBHOOK_SECRET),
+    }
+    try:
+        response = requests.post(url, data=body, headers=headers, timeout=settings.WEBHOOK_TIMEOUT)
+    except requests.exceptions.RequestException as e:
+        WEBHOOK_DELIVERIES.labels('error').inc()
+        return None, f'{type(e).__name__}: {e}'
+    WEBHOOK_DELIVERIES.labels(str(response.status_code)).inc()
+    if not 200 <= response.status_code < 300:
+        return response, f'HTTP {response.status_code}'
+    return response, None
+
+
+def _failed(cursor, response, error):
+    cursor.failures += 1
+    delay = _retry_after(response)
+    if delay is None:
+        delay = min(RETRY_BASE_DELAY * 2 ** (cursor.failures - 1), settings.WEBHOOK_RETRY_MAX_DELAY)
+    cursor.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+    cursor.last_error = error
+    cursor.save(update_fields=['failures', 'next_attempt_at', 'last_error', 'updated_at'])
+    logger.warning("Webhook %s failed (%s), attempt %d, retrying in %ds", cursor.url, error, cursor.failures, delay)
+
+
+def deliver_endpoint(url):
+    """
+    Send the pending changes to one endpoint, True when it still has more after
+    WEBHOOK_MAX_BATCHES batches. Skips the endpoint while another task delivers to it.
+    """
+    # A session lock: a transaction would hold back the change log horizon while it waits on the endpoint
+    with connection.cursor() as db:
+        db.execute('SELECT pg_try_advisory_lock(hashtextextended(%s, 0))', [url])
+        if not db.fetchone()[0]:
+            return False
+    try:
+        cursor = WebhookCursor.objects.filter(url=url).first()
+        if cursor is None:
+            # A new endpoint gets the changes from now on
+            txid, change_id = ChangesDAO.current_position(DEFAULT_DB_ALIAS)
+            cursor = WebhookCursor.objects.create(url=url, txid=txid, change_id=change_id)
+        if cursor.next_attempt_at is not None and cursor.next_attempt_at > timezone.now():
+            return False
+        if ChangesDAO.is_pruned(DEFAULT_DB_ALIAS, position=cursor.position):
+            logger.warning("Webhook %s is behind the pruned change log, some changes were not sent", url)
+        for _ in range(settings.WEBHOOK_MAX_BATCHES):
+            entries, position, has_more = ChangesDAO.list_changes(
+                cursor.position, settings.WEBHOOK_BATCH_SIZE, DEFAULT_DB_ALIAS, coalesce=False,
+            )
+            if entries:
+                events = coalesce(entries)
+                response, error = _post(url, format_position((entries[-1].txid, entries[-1].id)), events)
+                if error is not None:
+                    _failed(cursor, response, error)
+                    return False
+                WEBHOOK_EVENTS.inc(len(events))
+            if position != cursor.position or cursor.failures:
+                cursor.txid, cursor.change_id = position
+                cursor.failures, cursor.next_attempt_at, cursor.last_error = 0, None, ''
+                cursor.save()
+            if not has_more:
+                return False
+        return True
+    finally:
+        with connection.cursor() as db:
+            db.execute('SELECT pg_advisory_unlock(hashtextextended(%s, 0))', [url])
+
+
+@shared_task(ignore_result=True)
+def deliver_webhooks_task():
+    """Deliver the pending changes to the WEBHOOK_URLS endpoints, queues itself again while some have more"""
+    if not settings.WEBHOOK_URLS:
+        return
+    if not settings.WEBHOOK_SECRET:
+        logger.error("WEBHOOK_URLS is set without WEBHOOK_SECRET, the webhooks are not sent")
+        return
+    pending = [url for url in settings.WEBHOOK_URLS if deliver_endpoint(url)]
+    if pending:
+        deliver_webhooks_task.apply_async()
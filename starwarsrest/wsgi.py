@@ -13,4 +13,8 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'starwarsrest.settings')
 
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
+
+# Build the autocomplete index of this worker before it serves requests
+from starwarsrest.autocomplete import warm_up_autocomplete  # noqa: E402
+warm_up_autocomplete()